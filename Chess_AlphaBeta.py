@@ -0,0 +1,345 @@
+'''
+Alpha-beta search engine for the Board in Chess_MCTS.py.
+
+Negamax alpha-beta with iterative deepening and a quiescence search over
+captures. Moves are tried transposition table move first, then captures by
+MVV-LVA (most valuable victim, least valuable attacker), then the killer moves
+of the ply and finally quiet moves by their history score, so most cutoffs
+come from the first move tried. Leaves are scored by Chess_Eval.evaluate, which
+reads the sums the board keeps up to date, so scoring a node costs O(1).
+Scores are in centipawns for the side to move.
+
+The engine has the same search(board, limits) interface as MCTS. limits.playouts
+is read as a node budget, limits.depth caps the iterative deepening and
+limits.stop ends the search early.
+'''
+
+import time
+
+from Chess_Engine import SearchLimits, SearchResult
+from Chess_Eval import evaluate
+from Chess_Transposition import EXACT, LOWER_BOUND, UPPER_BOUND
+
+# Piece values for MVV-LVA move ordering
+PIECE_VALUES = {'Pawn': 100, 'Knight': 320, 'Bishop': 330, 'Rook': 500, 'Queen': 900, 'King': 20000}
+
+MATE = 100000
+# Scores beyond MATE_BOUND are mates, counted in plies from the root
+MATE_BOUND = MATE - 1000
+INFINITY = MATE + 1
+MAX_PLY = 64
+
+# Move ordering bands: the hash move, then captures, then killers, then quiet moves by history
+TT_MOVE_ORDER = 1 << 30
+CAPTURE_ORDER = 1 << 28
+KILLER_ORDER = 1 << 27
+
+
+class _SearchAborted(Exception):
+    '''
+    Raised inside the search when the node or time budget runs out.
+    '''
+
+
+def win_probability(score):
+    '''
+    Converts a centipawn score into an expected result from 0 to 1, the scale SearchResult.value uses.
+    '''
+    return 1 / (1 + 10 ** (-max(-MATE, min(MATE, score)) / 400))
+
+
+def _score_to_tt(score, ply):
+    # Mate scores are stored relative to the node so they stay right when reached at another ply
+    if score >= MATE_BOUND:
+        return score + ply
+    if score <= -MATE_BOUND:
+        return score - ply
+    return score
+
+
+def _score_from_tt(score, ply):
+    if score >= MATE_BOUND:
+        return score - ply
+    if score <= -MATE_BOUND:
+        return score + ply
+    return score
+
+
+class AlphaBeta:
+    def __init__(self, tt=None, max_depth=MAX_PLY, evaluate=evaluate, book=None, tablebase=None):
+        '''
+        tt - optional TranspositionTable for scores, bounds and best moves (use a separate table from MCTS)
+        max_depth - deepest iteration when limits.depth is not given
+        evaluate - function returning the static score of a board for the side to move
+        book - optional Chess_Book.OpeningBook; positions in it are answered with a book move without searching
+        tablebase - optional Chess_Tablebase.Tablebase; positions in it are scored exactly instead of searched
+        '''
+        self.tt = tt
+        self.max_depth = min(max_depth, MAX_PLY)
+        self.evaluate = evaluate
+        self.book = book
+        self.tablebase = tablebase
+        self.nodes = 0
+
+    def search(self, board, limits=None, info=None):
+        '''
+        Searches the position on board for the side to move and returns a SearchResult.
+        Deepens one ply at a time until the depth, node or time budget runs out. An iteration cut short
+        only replaces the previous best move if it had already proven a better one.
+        info - optional function called with the SearchResult so far after every completed iteration
+        '''
+        limits = limits or SearchLimits()
+        start_time = time.perf_counter()
+        self.deadline = limits.deadline(start_time)
+        self.node_limit = limits.playouts
+        self.limits = limits
+        self.nodes = 0
+        self.killers = [[None, None] for _ in range(MAX_PLY + 1)]
+        self.history = {}
+        max_depth = min(limits.depth or self.max_depth, self.max_depth)
+        if self.book is not None:
+            move = self.book.choose(board)
+            if move is not None:
+                return SearchResult(move, 0.5, 0, time.perf_counter() - start_time, {}, 0, 0)
+
+        moves = board.legal_moves()
+        if not moves:
+            score = -MATE if board.in_check() else 0
+            return SearchResult(None, win_probability(score), 0, time.perf_counter() - start_time, {}, 0, score)
+
+        moves = self.order_moves(board, moves, self.tt_move(board), 0)
+        best_move, best_score, completed = moves[0], 0, 0
+        made = len(board.undo_stack)
+        for depth in range(1, max_depth + 1):
+            # The first iteration always finishes so there is a searched move to return
+            self.abortable = depth > 1
+            self.iteration_best = None
+            try:
+                best_score, best_move = self.search_root(board, moves, depth)
+                completed = depth
+            except _SearchAborted:
+                while len(board.undo_stack) > made:
+                    board.unmake_move()
+                if self.iteration_best is not None:
+                    best_move, best_score = self.iteration_best
+                break
+
+            # Searches the best move first in the next iteration
+            moves.remove(best_move)
+            moves.insert(0, best_move)
+            if info is not None:
+                info(SearchResult(best_move, win_probability(best_score), self.nodes, time.perf_counter() - start_time,
+                                  {}, completed, best_score, self.principal_variation(board, best_move, depth)))
+            if abs(best_score) >= MATE_BOUND or limits.stopped():
+                break
+            # The next iteration takes several times as long as this one, so it is not started past half the time
+            now = time.perf_counter()
+            if self.deadline is not None and now - start_time > (self.deadline - start_time) / 2:
+                break
+            if self.node_limit is not None and self.nodes >= self.node_limit:
+                break
+
+        elapsed = time.perf_counter() - start_time
+        return SearchResult(best_move, win_probability(best_score), self.nodes, elapsed, {}, completed, best_score,
+                            self.principal_variation(board, best_move, completed))
+
+    def best_move(self, board, playouts=None, movetime=None, depth=None):
+        return self.search(board, SearchLimits(playouts, movetime, depth)).best_move
+
+    def search_root(self, board, moves, depth):
+        '''
+        Searches every root move to depth and returns (score, best move).
+        '''
+        alpha = -INFINITY
+        best_move = None
+        for index, move in enumerate(moves):
+            board.make_move(*move)
+            score = -self.negamax(board, depth - 1, -INFINITY, -alpha, 1)
+            board.unmake_move()
+            if score > alpha:
+                alpha = score
+                best_move = move
+                if index > 0:
+                    self.iteration_best = (move, score)
+        if self.tt is not None:
+            self.tt.store(board.hash_key, depth, alpha, EXACT, best_move)
+        return alpha, best_move
+
+    def negamax(self, board, depth, alpha, beta, ply):
+        '''
+        Returns the score of the position for the side to move, searched depth plies deep.
+        Scores outside (alpha, beta) are only bounds.
+        '''
+        if depth <= 0 or ply >= MAX_PLY:
+            return self.quiescence(board, alpha, beta, ply)
+        self.count_node()
+
+        # A position seen before on the way here is scored as a draw
+        if board.halfmove_clock >= 100 or board.repetitions() > 1:
+            return 0
+
+        if self.tablebase is not None:
+            known = self.tablebase.probe(board)
+            if known is not None:
+                winner, plies = known
+                if winner is None:
+                    return 0
+                # Mate scores count plies from the root, like the mates the search finds itself
+                return MATE - ply - plies if winner == board.current_turn else -MATE + ply + plies
+
+        original_alpha = alpha
+        tt_move = None
+        if self.tt is not None:
+            entry = self.tt.probe(board.hash_key)
+            if entry is not None:
+                entry_depth, entry_score, bound, tt_move = entry
+                if entry_depth >= depth:
+                    score = _score_from_tt(int(entry_score), ply)
+                    if (bound == EXACT or (bound == LOWER_BOUND and score >= beta)
+                            or (bound == UPPER_BOUND and score <= alpha)):
+                        return score
+
+        moves = board.legal_moves()
+        if not moves:
+            return -MATE + ply if board.in_check() else 0
+
+        best_score = -INFINITY
+        best_move = None
+        for move in self.order_moves(board, moves, tt_move, ply):
+            quiet = not self.is_capture(board, move) and move[2] is None
+            board.make_move(*move)
+            score = -self.negamax(board, depth - 1, -beta, -alpha, ply + 1)
+            board.unmake_move()
+            if score > best_score:
+                best_score = score
+                best_move = move
+                if score > alpha:
+                    alpha = score
+                    if alpha >= beta:
+                        if quiet:
+                            self.add_killer(move, ply)
+                            key = (board.current_turn, move[0], move[1])
+                            self.history[key] = self.history.get(key, 0) + depth * depth
+                        break
+
+        if self.tt is not None:
+            if best_score <= original_alpha:
+                bound = UPPER_BOUND
+            elif best_score >= beta:
+                bound = LOWER_BOUND
+            else:
+                bound = EXACT
+            self.tt.store(board.hash_key, depth, _score_to_tt(best_score, ply), bound, best_move)
+        return best_score
+
+    def quiescence(self, board, alpha, beta, ply):
+        '''
+        Searches captures (and promotions) only, until the position is quiet, so the
+        static evaluation is never taken in the middle of an exchange.
+        '''
+        self.count_node()
+        stand_pat = self.evaluate(board)
+        if stand_pat >= beta or ply >= MAX_PLY:
+            return stand_pat
+        if stand_pat > alpha:
+            alpha = stand_pat
+
+        captures = [move for move in board.pseudo_legal_moves()
+                    if self.is_capture(board, move) or move[2] is not None]
+        captures.sort(key=lambda move: self.capture_order(board, move), reverse=True)
+        for move in captures:
+            if not board.is_legal(move):
+                continue
+            board.make_move(*move)
+            score = -self.quiescence(board, -beta, -alpha, ply + 1)
+            board.unmake_move()
+            if score >= beta:
+                return score
+            if score > alpha:
+                alpha = score
+        return alpha
+
+    def count_node(self):
+        self.nodes += 1
+        if not self.abortable:
+            return
+        if self.node_limit is not None and self.nodes > self.node_limit:
+            raise _SearchAborted()
+        # The clock and the stop event are only read every 1024 nodes
+        if not self.nodes & 1023:
+            if self.deadline is not None and time.perf_counter() >= self.deadline:
+                raise _SearchAborted()
+            if self.limits.stopped():
+                raise _SearchAborted()
+
+    @staticmethod
+    def is_capture(board, move):
+        start, end, _ = move
+        if board.board[end[0]][end[1]] is not None:
+            return True
+        return end == board.en_passant_target and start[1] != end[1] and board.board[start[0]][start[1]].piece_type == 'Pawn'
+
+    @staticmethod
+    def capture_order(board, move):
+        '''
+        MVV-LVA: the most valuable victim first, and among equal victims the least valuable attacker.
+        '''
+        start, end, promotion = move
+        victim = board.board[end[0]][end[1]]
+        attacker = board.board[start[0]][start[1]]
+        # En passant takes a pawn that is not on the end square
+        score = PIECE_VALUES[victim.piece_type] * 10 if victim is not None else PIECE_VALUES['Pawn'] * 10
+        if promotion is not None:
+            score += PIECE_VALUES[promotion] * 10
+        return score - PIECE_VALUES[attacker.piece_type] // 10
+
+    def principal_variation(self, board, best_move, depth):
+        '''
+        Returns the expected line: best_move followed by the hash moves of the positions it leads to.
+        '''
+        line = [best_move]
+        if self.tt is None or best_move is None:
+            return line
+        board.make_move(*best_move)
+        while len(line) < depth:
+            move = self.tt_move(board)
+            # A hash collision could return a move from another position, so it is checked
+            if move is None or move not in board.legal_moves():
+                break
+            line.append(move)
+            board.make_move(*move)
+        for _ in line:
+            board.unmake_move()
+        return line
+
+    def tt_move(self, board):
+        if self.tt is None:
+            return None
+        entry = self.tt.probe(board.hash_key)
+        return None if entry is None else entry[3]
+
+    def add_killer(self, move, ply):
+        killers = self.killers[ply]
+        if killers[0] != move:
+            killers[1] = killers[0]
+            killers[0] = move
+
+    def order_moves(self, board, moves, tt_move, ply):
+        '''
+        Returns moves sorted with the hash move first, then captures by MVV-LVA, killers and quiet moves by history.
+        '''
+        killers = self.killers[ply]
+        color = board.current_turn
+
+        def order(move):
+            if move == tt_move:
+                return TT_MOVE_ORDER
+            if self.is_capture(board, move) or move[2] is not None:
+                return CAPTURE_ORDER + self.capture_order(board, move)
+            if move == killers[0]:
+                return KILLER_ORDER + 1
+            if move == killers[1]:
+                return KILLER_ORDER
+            return self.history.get((color, move[0], move[1]), 0)
+
+        return sorted(moves, key=order, reverse=True)
@@ -0,0 +1,158 @@
+'''
+Headless batch analysis of position files.
+
+Positions are read lazily from an EPD (or FEN per line) file, searched on a
+pool of worker processes with a per-position playout or time budget, and
+written out as one JSON object per line. Only a bounded number of positions
+is in flight at once, so memory use stays flat however long the input is.
+
+Usage:
+    python Chess_Batch.py positions.epd --playouts 2000 > results.jsonl
+    python Chess_Batch.py positions.epd --movetime 500 --workers 4 --unordered --output results.jsonl
+'''
+
+import argparse
+import json
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from Chess_Engine import MCTS, SearchLimits
+from Chess_MCTS import Board, move_to_uci, read_epd
+
+
+def _analyse(index, fen, position_id, playouts, movetime, engine_options, seed):
+    '''
+    Worker task: searches one position and returns its result record.
+    '''
+    board = Board.from_fen(fen, compact=True)
+    engine = MCTS(seed=seed, **engine_options)
+    result = engine.search(board, SearchLimits(playouts=playouts, movetime=movetime))
+    return {
+        'index': index,
+        'id': position_id,
+        'fen': fen,
+        'best_move': None if result.best_move is None else move_to_uci(result.best_move),
+        'score': round(result.value, 4),
+        'nodes': result.playouts,
+        'time': round(result.elapsed, 4),
+    }
+
+
+class BatchStats:
+    '''
+    Running totals for a batch: positions searched, nodes (playouts) and wall clock time.
+    '''
+
+    def __init__(self):
+        self.start_time = time.perf_counter()
+        self.positions = 0
+        self.nodes = 0
+        self.search_time = 0.0
+
+    def add(self, record):
+        self.positions += 1
+        self.nodes += record['nodes']
+        self.search_time += record['time']
+
+    @property
+    def elapsed(self):
+        return time.perf_counter() - self.start_time
+
+    def summary(self):
+        elapsed = self.elapsed
+        return (f'{self.positions} positions, {self.nodes} nodes in {elapsed:.2f}s '
+                f'({self.positions / elapsed if elapsed > 0 else 0:.2f} positions/s, '
+                f'{self.nodes / elapsed if elapsed > 0 else 0:,.0f} nodes/s)')
+
+
+class BatchAnalyser:
+    def __init__(self, workers=None, limits=None, ordered=True, max_pending=None, seed=None, **engine_options):
+        '''
+        workers - number of worker processes (defaults to the number of CPUs)
+        limits - SearchLimits applied to every position
+        ordered - yield results in input order; otherwise as soon as each one finishes
+        max_pending - most positions submitted but not yet yielded (defaults to 4 per worker)
+        engine_options - passed on to every MCTS engine (exploration, rollout_policy, max_rollout_depth)
+        '''
+        self.workers = workers or os.cpu_count() or 1
+        self.limits = limits or SearchLimits()
+        self.ordered = ordered
+        self.max_pending = max_pending or 4 * self.workers
+        self.seed = seed
+        self.engine_options = engine_options
+        self.stats = BatchStats()
+
+    def submit(self, executor, index, board, operations):
+        seed = None if self.seed is None else self.seed + index
+        return executor.submit(_analyse, index, board.to_fen(), operations.get('id'),
+                               self.limits.playouts, self.limits.movetime, self.engine_options, seed)
+
+    def analyse(self, positions):
+        '''
+        Searches every (board, operations) pair from positions (such as read_epd) and yields the result records.
+        '''
+        self.stats = BatchStats()
+        positions = iter(positions)
+        with ProcessPoolExecutor(max_workers=self.workers) as executor:
+            pending = deque() if self.ordered else set()
+            index = 0
+            exhausted = False
+            while True:
+                # Keeps the pool fed without reading further ahead than max_pending
+                while not exhausted and len(pending) < self.max_pending:
+                    entry = next(positions, None)
+                    if entry is None:
+                        exhausted = True
+                        break
+                    future = self.submit(executor, index, *entry)
+                    if self.ordered:
+                        pending.append(future)
+                    else:
+                        pending.add(future)
+                    index += 1
+                if not pending:
+                    break
+
+                if self.ordered:
+                    finished = [pending.popleft()]
+                else:
+                    finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    record = future.result()
+                    self.stats.add(record)
+                    yield record
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Search every position of an EPD file and write JSONL results.')
+    parser.add_argument('input', help='EPD or FEN-per-line file')
+    parser.add_argument('--output', help='JSONL file to write (defaults to standard output)')
+    parser.add_argument('--workers', type=int, help='worker processes (defaults to the number of CPUs)')
+    parser.add_argument('--playouts', type=int, help='playouts per position')
+    parser.add_argument('--movetime', type=int, help='search time per position in milliseconds')
+    parser.add_argument('--unordered', action='store_true', help='write results as they finish instead of in input order')
+    parser.add_argument('--rollout-policy', default='random', choices=['random', 'heuristic', 'vector'],
+                        help="'vector' plays batches of simplified rollouts with NumPy")
+    parser.add_argument('--seed', type=int)
+    args = parser.parse_args(argv)
+
+    analyser = BatchAnalyser(workers=args.workers, limits=SearchLimits(args.playouts, args.movetime),
+                             ordered=not args.unordered, seed=args.seed, rollout_policy=args.rollout_policy)
+    output = open(args.output, 'w') if args.output else sys.stdout
+    try:
+        for record in analyser.analyse(read_epd(args.input)):
+            output.write(json.dumps(record) + '\n')
+            if analyser.stats.positions % 100 == 0:
+                print(analyser.stats.summary(), file=sys.stderr)
+    finally:
+        if output is not sys.stdout:
+            output.close()
+    print(analyser.stats.summary(), file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
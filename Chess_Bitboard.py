@@ -0,0 +1,297 @@
+'''
+Bitboard move generation.
+
+Each piece type and color is stored as a 64-bit integer with one bit per square.
+Squares are numbered from a1 = 0 to h8 = 63, so a Board position (row, col)
+maps to square (7 - row) * 8 + col.
+
+Knight, king and pawn attacks come from precomputed tables and sliding attacks
+use kindergarten style lookups: the occupancy of the line through a square is
+collapsed into a 6-bit index which selects a precomputed attack set.
+'''
+
+FULL = 0xFFFFFFFFFFFFFFFF
+A_FILE = 0x0101010101010101
+B_FILE = 0x0202020202020202
+C2H7_DIAGONAL = 0x0080402010080400
+
+PIECE_TYPES = ('Pawn', 'Knight', 'Bishop', 'Rook', 'Queen', 'King')
+
+
+def square_index(position):
+    '''
+    Converts a board position (row, col) into a bitboard square index.
+    '''
+    row, col = position
+    return (7 - row) * 8 + col
+
+
+def index_to_position(square):
+    '''
+    Converts a bitboard square index back into a board position (row, col).
+    '''
+    return (7 - (square >> 3), square & 7)
+
+
+def _step_attacks(square, steps):
+    '''
+    Returns the bitboard of squares reached from square by each (delta_rank, delta_file) step.
+    '''
+    rank, file = square >> 3, square & 7
+    attacks = 0
+    for delta_rank, delta_file in steps:
+        new_rank, new_file = rank + delta_rank, file + delta_file
+        if 0 <= new_rank < 8 and 0 <= new_file < 8:
+            attacks |= 1 << (new_rank * 8 + new_file)
+    return attacks
+
+
+def _ray_attacks(square, occupied, directions):
+    '''
+    Slow reference for sliding attacks, only used to fill the lookup tables.
+    '''
+    rank, file = square >> 3, square & 7
+    attacks = 0
+    for delta_rank, delta_file in directions:
+        new_rank, new_file = rank + delta_rank, file + delta_file
+        while 0 <= new_rank < 8 and 0 <= new_file < 8:
+            bit = 1 << (new_rank * 8 + new_file)
+            attacks |= bit
+            if occupied & bit:
+                break
+            new_rank += delta_rank
+            new_file += delta_file
+    return attacks
+
+
+def _line_mask(square, directions):
+    '''
+    Returns the squares on the lines through square, excluding square itself and the board edges.
+    The edge squares never block anything beyond them, so they are left out of the lookup index.
+    '''
+    rank, file = square >> 3, square & 7
+    mask = 0
+    for delta_rank, delta_file in directions:
+        new_rank, new_file = rank + delta_rank, file + delta_file
+        while 0 <= new_rank + delta_rank < 8 and 0 <= new_file + delta_file < 8:
+            mask |= 1 << (new_rank * 8 + new_file)
+            new_rank += delta_rank
+            new_file += delta_file
+    return mask
+
+
+def _subsets(mask):
+    '''
+    Yields every subset of the bits in mask.
+    '''
+    subset = 0
+    while True:
+        yield subset
+        subset = (subset - mask) & mask
+        if subset == 0:
+            break
+
+
+KNIGHT_ATTACKS = [_step_attacks(square, [(2, 1), (2, -1), (-2, 1), (-2, -1), (1, 2), (1, -2), (-1, 2), (-1, -2)])
+                  for square in range(64)]
+KING_ATTACKS = [_step_attacks(square, [(-1, -1), (-1, 0), (-1, 1), (0, -1), (0, 1), (1, -1), (1, 0), (1, 1)])
+                for square in range(64)]
+PAWN_ATTACKS = {
+    'white': [_step_attacks(square, [(1, -1), (1, 1)]) for square in range(64)],
+    'black': [_step_attacks(square, [(-1, -1), (-1, 1)]) for square in range(64)],
+}
+
+# Masks of the inner squares on each line through a square
+RANK_MASKS = [_line_mask(square, [(0, 1), (0, -1)]) for square in range(64)]
+FILE_MASKS = [_line_mask(square, [(1, 0), (-1, 0)]) for square in range(64)]
+DIAGONAL_MASKS = [_line_mask(square, [(1, 1), (-1, -1)]) for square in range(64)]
+ANTI_DIAGONAL_MASKS = [_line_mask(square, [(1, -1), (-1, 1)]) for square in range(64)]
+
+
+def _rank_index(occupied, square):
+    return ((occupied & RANK_MASKS[square]) >> ((square & 56) + 1)) & 63
+
+
+def _file_index(occupied, square):
+    # Moves the file onto the a-file, then the c2-h7 multiplication gathers its six inner bits into the top byte
+    occupied = A_FILE & ((occupied & FILE_MASKS[square]) >> (square & 7))
+    return ((occupied * C2H7_DIAGONAL) & FULL) >> 58
+
+
+def _diagonal_index(occupied, mask):
+    # A diagonal has at most one square per file, so the b-file multiplication stacks them into the top byte
+    return (((occupied & mask) * B_FILE) & FULL) >> 58
+
+
+def _build_line_table(masks, directions, index):
+    '''
+    Builds table[square][occupancy_index] = attacks along one kind of line.
+    '''
+    table = []
+    for square in range(64):
+        attacks = [0] * 64
+        seen = set()
+        for occupied in _subsets(masks[square]):
+            key = index(occupied, square)
+            # Each occupancy of the inner squares must get its own index
+            assert key not in seen
+            seen.add(key)
+            attacks[key] = _ray_attacks(square, occupied, directions)
+        table.append(attacks)
+    return table
+
+
+RANK_ATTACKS = _build_line_table(RANK_MASKS, [(0, 1), (0, -1)], _rank_index)
+FILE_ATTACKS = _build_line_table(FILE_MASKS, [(1, 0), (-1, 0)], _file_index)
+DIAGONAL_ATTACKS = _build_line_table(DIAGONAL_MASKS, [(1, 1), (-1, -1)],
+                                     lambda occupied, square: _diagonal_index(occupied, DIAGONAL_MASKS[square]))
+ANTI_DIAGONAL_ATTACKS = _build_line_table(ANTI_DIAGONAL_MASKS, [(1, -1), (-1, 1)],
+                                          lambda occupied, square: _diagonal_index(occupied, ANTI_DIAGONAL_MASKS[square]))
+
+
+def rook_attacks(square, occupied):
+    return (RANK_ATTACKS[square][_rank_index(occupied, square)]
+            | FILE_ATTACKS[square][_file_index(occupied, square)])
+
+
+def bishop_attacks(square, occupied):
+    return (DIAGONAL_ATTACKS[square][_diagonal_index(occupied, DIAGONAL_MASKS[square])]
+            | ANTI_DIAGONAL_ATTACKS[square][_diagonal_index(occupied, ANTI_DIAGONAL_MASKS[square])])
+
+
+def queen_attacks(square, occupied):
+    return rook_attacks(square, occupied) | bishop_attacks(square, occupied)
+
+
+class BitboardPosition:
+    '''
+    A position stored as one bitboard per piece type and color.
+
+    pieces - {color: {piece_type: bitboard}}
+    unmoved - bitboard of pawns, rooks and kings that still have their first move
+    en_passant - square index a pawn can capture onto en passant, or None
+    side - color to move
+    '''
+
+    def __init__(self, pieces=None, unmoved=0, en_passant=None, side='white'):
+        if pieces is None:
+            pieces = {color: {piece_type: 0 for piece_type in PIECE_TYPES} for color in ('white', 'black')}
+        self.pieces = pieces
+        self.unmoved = unmoved
+        self.en_passant = en_passant
+        self.side = side
+
+    @classmethod
+    def from_board(cls, board):
+        '''
+        Builds the bitboards for a Board (or anything indexable as board[row][col]).
+        '''
+        position = cls(side=getattr(board, 'current_turn', 'white'))
+        target = getattr(board, 'en_passant_target', None)
+        if target is not None:
+            position.en_passant = square_index(target)
+        for row in range(8):
+            for col in range(8):
+                piece = board[row][col]
+                if piece is None:
+                    continue
+                bit = 1 << square_index((row, col))
+                position.pieces[piece.color][piece.piece_type] |= bit
+                if getattr(piece, 'first_move', False):
+                    position.unmoved |= bit
+        return position
+
+    def occupancy(self, color):
+        pieces = self.pieces[color]
+        return (pieces['Pawn'] | pieces['Knight'] | pieces['Bishop']
+                | pieces['Rook'] | pieces['Queen'] | pieces['King'])
+
+
+# Board position (row, col) of every square index
+POSITIONS = [index_to_position(square) for square in range(64)]
+
+
+def _add_moves(moves, start, targets):
+    start_position = POSITIONS[start]
+    while targets:
+        bit = targets & -targets
+        targets ^= bit
+        moves.append((start_position, POSITIONS[bit.bit_length() - 1]))
+
+
+def generate_moves(position):
+    '''
+    Returns the moves for the side to move as a list of (start, end) board positions.
+
+    These are the same moves the per-piece possible_moves methods produce: castling only checks
+    that the squares between king and rook are empty, and moves leaving the king in check are included.
+    position can be a BitboardPosition or a Board.
+    '''
+    if not isinstance(position, BitboardPosition):
+        position = BitboardPosition.from_board(position)
+
+    us = position.side
+    them = 'black' if us == 'white' else 'white'
+    pieces = position.pieces[us]
+    own = position.occupancy(us)
+    enemy = position.occupancy(them)
+    occupied = own | enemy
+    empty = ~occupied & FULL
+    moves = []
+
+    # Pawns
+    pawn_attacks = PAWN_ATTACKS[us]
+    forward = 8 if us == 'white' else -8
+    bitboard = pieces['Pawn']
+    while bitboard:
+        bit = bitboard & -bitboard
+        bitboard ^= bit
+        square = bit.bit_length() - 1
+        targets = pawn_attacks[square] & enemy
+        if position.en_passant is not None:
+            targets |= pawn_attacks[square] & (1 << position.en_passant) & empty
+        one_step = square + forward
+        if 0 <= one_step < 64 and empty >> one_step & 1:
+            targets |= 1 << one_step
+            two_step = one_step + forward
+            if bit & position.unmoved and 0 <= two_step < 64 and empty >> two_step & 1:
+                targets |= 1 << two_step
+        _add_moves(moves, square, targets)
+
+    # Knights
+    bitboard = pieces['Knight']
+    while bitboard:
+        bit = bitboard & -bitboard
+        bitboard ^= bit
+        square = bit.bit_length() - 1
+        _add_moves(moves, square, KNIGHT_ATTACKS[square] & ~own)
+
+    # Sliding pieces
+    for piece_type, attacks in (('Bishop', bishop_attacks), ('Rook', rook_attacks), ('Queen', queen_attacks)):
+        bitboard = pieces[piece_type]
+        while bitboard:
+            bit = bitboard & -bitboard
+            bitboard ^= bit
+            square = bit.bit_length() - 1
+            _add_moves(moves, square, attacks(square, occupied) & ~own)
+
+    # King, including castling while the king and rook are both unmoved
+    bitboard = pieces['King']
+    while bitboard:
+        bit = bitboard & -bitboard
+        bitboard ^= bit
+        square = bit.bit_length() - 1
+        targets = KING_ATTACKS[square] & ~own
+        if bit & position.unmoved:
+            rank_start = square & 56
+            file = square & 7
+            rooks = pieces['Rook'] & position.unmoved
+            # Kingside: the two squares towards the h-file must be empty
+            if file + 2 < 8 and not occupied & (0b11 << (square + 1)) and rooks >> (rank_start + 7) & 1:
+                targets |= 1 << (square + 2)
+            # Queenside: the three squares towards the a-file must be empty
+            if file - 3 >= 0 and not occupied & (0b111 << (square - 3)) and rooks >> rank_start & 1:
+                targets |= 1 << (square - 2)
+        _add_moves(moves, square, targets)
+
+    return moves
@@ -0,0 +1,276 @@
+'''
+Opening book: a sorted table of (position hash, move, weight) entries on disk.
+
+The book file is an 8 byte header followed by 12 byte entries (64-bit
+Board.hash_key, 16-bit encode_move code, 16-bit weight), sorted by key.
+OpeningBook opens it with mmap and finds a position by binary search, so a
+lookup reads a few pages of the file and every process using the same book
+shares one copy in the page cache.
+
+Books are built from PGN games, EPD positions (their bm moves) and self-play
+game files. Each move played from a position adds to its weight: 2 when the
+side that played it went on to win, 1 for a draw or an unknown result and 0
+for a loss.
+
+Usage:
+    python Chess_Book.py build games.pgn selfplay.bin --output book.bin --plies 20
+    python Chess_Book.py probe book.bin --fen "rnbqkbnr/pppppppp/8/8/4P3/8/PPPP1PPP/RNBQKBNR b KQkq - 0 1"
+'''
+
+import argparse
+import mmap
+import os
+import random
+import re
+import struct
+import sys
+
+from Chess_MCTS import Board, decode_move, encode_move, move_from_san, move_to_san, read_epd
+from Chess_SelfPlay import BLACK_WINS, DRAW, WHITE_WINS, read_games
+
+MAGIC = b'CBOK'
+VERSION = 1
+# Magic, version and 3 reserved bytes
+HEADER_SIZE = 8
+ENTRY = struct.Struct('<QHH')
+KEY = struct.Struct('<Q')
+MAX_WEIGHT = 0xFFFF
+
+PGN_RESULTS = {'1-0': WHITE_WINS, '0-1': BLACK_WINS, '1/2-1/2': DRAW, '*': None}
+
+
+class OpeningBook:
+    def __init__(self, path):
+        '''
+        Opens a book file built by write_book. Lookups read it through mmap, nothing is loaded up front.
+        '''
+        self.path = path
+        self.file = open(path, 'rb')
+        size = os.fstat(self.file.fileno()).st_size
+        header = self.file.read(HEADER_SIZE)
+        if size < HEADER_SIZE or header[:len(MAGIC)] != MAGIC or header[len(MAGIC)] != VERSION:
+            self.file.close()
+            raise ValueError(f'Not an opening book file: {path}')
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.count = (size - HEADER_SIZE) // ENTRY.size
+
+    def __len__(self):
+        return self.count
+
+    # Worker processes get the path and map the file themselves
+    def __getstate__(self):
+        return self.path
+
+    def __setstate__(self, path):
+        self.__init__(path)
+
+    def close(self):
+        self.data.close()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exception):
+        self.close()
+
+    def key_at(self, index):
+        return KEY.unpack_from(self.data, HEADER_SIZE + index * ENTRY.size)[0]
+
+    def entries(self, key):
+        '''
+        Returns [(move, weight)] stored for a position hash, highest weight first.
+        '''
+        # Binary search for the first entry with this key
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            if self.key_at(middle) < key:
+                low = middle + 1
+            else:
+                high = middle
+        found = []
+        for index in range(low, self.count):
+            entry_key, code, weight = ENTRY.unpack_from(self.data, HEADER_SIZE + index * ENTRY.size)
+            if entry_key != key:
+                break
+            found.append((decode_move(code), weight))
+        return found
+
+    def moves(self, board):
+        '''
+        Returns [(move, weight)] for the position on board, keeping only moves that are legal there.
+        '''
+        found = self.entries(board.hash_key)
+        if not found:
+            return found
+        legal = board.legal_moves()
+        return [(move, weight) for move, weight in found if move in legal]
+
+    def choose(self, board, rng=None):
+        '''
+        Picks a book move for the position on board at random in proportion to the weights, or returns None.
+        '''
+        moves = [(move, weight) for move, weight in self.moves(board) if weight > 0]
+        if not moves:
+            return None
+        rng = rng or random
+        pick = rng.randrange(sum(weight for _, weight in moves))
+        for move, weight in moves:
+            pick -= weight
+            if pick < 0:
+                return move
+
+
+def write_book(path, weights):
+    '''
+    Writes a book file from {(hash key, move code): weight}. Moves with no weight are left out, and weights are
+    scaled down if the largest does not fit in 16 bits.
+    '''
+    largest = max(weights.values(), default=0)
+    scale = min(1.0, MAX_WEIGHT / largest) if largest else 1.0
+    entries = sorted(((key, code, max(1, int(weight * scale))) for (key, code), weight in weights.items() if weight > 0),
+                     key=lambda entry: (entry[0], -entry[2], entry[1]))
+    with open(path, 'wb') as file:
+        file.write(MAGIC + bytes((VERSION, 0, 0, 0)))
+        for entry in entries:
+            file.write(ENTRY.pack(*entry))
+    return len(entries)
+
+
+def read_pgn(source, max_plies=None):
+    '''
+    Lazily yields (result, moves) for every game in a PGN file, with the moves as (start, end, promotion) tuples.
+    Comments, variations and annotations are skipped; a game stops at its first move that can not be read,
+    or after max_plies moves.
+    '''
+    with open(source) as lines:
+        tags = {}
+        movetext = []
+        for line in lines:
+            line = line.strip()
+            if line.startswith('['):
+                # A tag after movetext starts the next game
+                if movetext:
+                    yield _pgn_game(tags, movetext, max_plies)
+                    tags, movetext = {}, []
+                match = re.match(r'\[(\w+)\s+"(.*)"\]', line)
+                if match:
+                    tags[match.group(1)] = match.group(2)
+            elif line and not line.startswith('%'):
+                # A ; comment runs to the end of the line
+                movetext.append(line.split(';')[0])
+        if movetext:
+            yield _pgn_game(tags, movetext, max_plies)
+
+
+def _pgn_game(tags, movetext, max_plies):
+    text = re.sub(r'\{[^}]*\}', ' ', ' '.join(movetext))
+    # Nested variations are removed from the inside out
+    while '(' in text:
+        stripped = re.sub(r'\([^()]*\)', ' ', text)
+        if stripped == text:
+            break
+        text = stripped
+    result = PGN_RESULTS.get(tags.get('Result', '*'))
+    # Games from another start position can not be added to a book of the normal opening
+    if 'FEN' in tags:
+        return result, []
+    board = Board(compact=True)
+    moves = []
+    for token in text.split():
+        if max_plies is not None and len(moves) >= max_plies:
+            break
+        token = re.sub(r'^\d+\.+', '', token)
+        if not token or token.startswith('$'):
+            continue
+        if token in PGN_RESULTS:
+            result = PGN_RESULTS[token]
+            break
+        move = move_from_san(board, token)
+        if move is None:
+            break
+        board.make_move(*move)
+        moves.append(move)
+    return result, moves
+
+
+def _result_points(result, color):
+    if result is None or result == DRAW:
+        return 1
+    winner = 'white' if result == WHITE_WINS else 'black'
+    return 2 if winner == color else 0
+
+
+def add_game(weights, result, moves, max_plies):
+    '''
+    Adds the first max_plies moves of a game from the starting position to the weights.
+    '''
+    board = Board(compact=True)
+    for move in moves[:max_plies]:
+        entry = (board.hash_key, encode_move(move))
+        weights[entry] = weights.get(entry, 0) + _result_points(result, board.current_turn)
+        board.make_move(*move)
+
+
+def add_positions(weights, source):
+    '''
+    Adds the bm (best move) operations of every position in an EPD file to the weights.
+    '''
+    for board, operations in read_epd(source, compact=True):
+        for text in operations.get('bm', '').split():
+            move = move_from_san(board, text)
+            if move is not None:
+                entry = (board.hash_key, encode_move(move))
+                weights[entry] = weights.get(entry, 0) + 1
+
+
+def build_book(sources, output, max_plies=20):
+    '''
+    Builds a book file from PGN (.pgn), EPD (.epd or .fen) and self-play (.bin) files.
+    Returns the number of entries written.
+    '''
+    weights = {}
+    for source in sources:
+        extension = os.path.splitext(source)[1].lower()
+        if extension in ('.epd', '.fen'):
+            add_positions(weights, source)
+        elif extension == '.bin':
+            for result, moves in read_games(source):
+                add_game(weights, result, moves, max_plies)
+        else:
+            for result, moves in read_pgn(source, max_plies):
+                add_game(weights, result, moves, max_plies)
+    return write_book(output, weights)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Build or query an opening book.')
+    commands = parser.add_subparsers(dest='command', required=True)
+    build = commands.add_parser('build', help='build a book from PGN, EPD and self-play files')
+    build.add_argument('inputs', nargs='+')
+    build.add_argument('--output', default='book.bin')
+    build.add_argument('--plies', type=int, default=20, help='moves added from the start of each game')
+    probe = commands.add_parser('probe', help='list the book moves of a position')
+    probe.add_argument('book')
+    probe.add_argument('--fen', help='position to look up (defaults to the starting position)')
+    args = parser.parse_args(argv)
+
+    if args.command == 'build':
+        count = build_book(args.inputs, args.output, args.plies)
+        print(f'{count} entries written to {args.output} ({HEADER_SIZE + count * ENTRY.size} bytes)', file=sys.stderr)
+        return 0
+
+    board = Board.from_fen(args.fen, compact=True) if args.fen else Board(compact=True)
+    with OpeningBook(args.book) as book:
+        moves = book.moves(board)
+        total = sum(weight for _, weight in moves)
+        for move, weight in moves:
+            print(f'{move_to_san(board, move):8} {weight:6} {100 * weight / total:5.1f}%')
+        if not moves:
+            print('No book moves for this position.')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
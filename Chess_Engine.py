@@ -0,0 +1,611 @@
+'''
+Monte Carlo Tree Search engine for the Board in Chess_MCTS.py.
+
+Each playout walks down the tree with UCT selection, expands one new move,
+finishes the game with a random (or capture-first heuristic) rollout and
+backs the result up the path. All moves are made and taken back on the
+board that is passed in, so the board is unchanged once search returns.
+
+The tree is kept in parallel arrays (MCTSTree) at 28 bytes per node, so
+searches of ten million nodes fit in well under a gigabyte.
+'''
+
+import math
+import random
+import time
+from array import array
+from collections import deque
+
+from Chess_Eval import evaluate_white
+from Chess_MCTS import Board, decode_move, encode_move
+
+
+class SearchLimits:
+    '''
+    Budget for one search.
+
+    playouts - stop after this many playouts (for alpha-beta, this many nodes)
+    movetime - stop after this many milliseconds
+    depth - deepest iteration for alpha-beta; MCTS ignores it
+    stop - optional threading.Event; setting it from another thread ends the search early ("move now")
+    infinite - search until stop is set (or alpha-beta reaches its deepest iteration)
+    If none of playouts, movetime and depth is given, and infinite is not set, the search runs
+    DEFAULT_PLAYOUTS playouts.
+    '''
+    DEFAULT_PLAYOUTS = 1000
+
+    def __init__(self, playouts=None, movetime=None, depth=None, stop=None, infinite=False):
+        self.playouts = playouts
+        self.movetime = movetime
+        self.depth = depth
+        self.stop = stop
+        self.infinite = infinite
+        if playouts is None and movetime is None and depth is None and not infinite:
+            self.playouts = self.DEFAULT_PLAYOUTS
+
+    @classmethod
+    def from_clock(cls, remaining, increment=0, moves_to_go=None, depth=None):
+        '''
+        Time manager for games on a clock: splits the remaining milliseconds over the moves still to play
+        (30 when moves_to_go is not known), adds most of the increment and never uses more than half
+        of what is left.
+        '''
+        movetime = remaining / (moves_to_go or 30) + increment * 0.8
+        movetime = max(1, int(min(movetime, remaining / 2)))
+        return cls(movetime=movetime, depth=depth)
+
+    def deadline(self, start_time):
+        return None if self.movetime is None else start_time + self.movetime / 1000
+
+    def stopped(self):
+        return self.stop is not None and self.stop.is_set()
+
+    def exhausted(self, playouts, deadline):
+        if self.stopped():
+            return True
+        if self.playouts is not None and playouts >= self.playouts:
+            return True
+        if self.playouts is None and deadline is None and not self.infinite:
+            # Only a depth was given, which means nothing to MCTS
+            return playouts >= self.DEFAULT_PLAYOUTS
+        return deadline is not None and time.perf_counter() >= deadline
+
+
+class SearchResult:
+    '''
+    What a search found.
+
+    best_move - (start, end, promotion) tuple, or None when the side to move has no legal moves
+    value - expected score of best_move for the side to move, from 0 (loss) to 1 (win)
+    playouts - number of playouts run
+    elapsed - seconds spent searching
+    move_stats - {move: (visits, value_sum)} for every move searched at the root
+    depth - deepest completed iteration (alpha-beta only)
+    score - score of best_move in centipawns for the side to move (alpha-beta only)
+    pv - the line the engine expects, best_move first
+    '''
+
+    def __init__(self, best_move, value, playouts, elapsed, move_stats, depth=None, score=None, pv=None):
+        self.best_move = best_move
+        self.value = value
+        self.playouts = playouts
+        self.elapsed = elapsed
+        self.move_stats = move_stats
+        self.depth = depth
+        self.score = score
+        if pv is None:
+            pv = [] if best_move is None else [best_move]
+        self.pv = pv
+
+    @property
+    def playouts_per_second(self):
+        return self.playouts / self.elapsed if self.elapsed > 0 else 0.0
+
+
+class MCTSTree:
+    '''
+    Search tree stored as parallel arrays with one entry per node, instead of one object per node.
+
+    Node 0 is the root. A node's children are stored next to each other, from first_child[node]
+    to first_child[node] + child_count[node] - 1; first_child is -1 until the node is expanded.
+    For each node:
+        parent - index of the parent node (-1 for the root)
+        move - move that leads to the node from its parent, packed by encode_move
+        visits - playouts through the node
+        value - sum of playout results from the point of view of the side that played move
+        prior - how promising move looked when the node was created; unvisited children are tried highest prior first
+    root_player is the color that played the move into the root (the opponent of the side to move there).
+    '''
+    # parent (4) + first child (4) + child count (2) + move (2) + visits (4) + value (8) + prior (4)
+    NODE_BYTES = 28
+
+    def __init__(self, root_player=None):
+        self.root_player = root_player
+        self.parent = array('i', [-1])
+        self.first_child = array('i', [-1])
+        self.child_count = array('H', [0])
+        self.move = array('H', [0])
+        self.visits = array('I', [0])
+        self.value = array('d', [0.0])
+        self.prior = array('f', [1.0])
+
+    def __len__(self):
+        return len(self.parent)
+
+    def memory(self):
+        '''
+        Returns the bytes used by the node arrays.
+        '''
+        return len(self) * self.NODE_BYTES
+
+    def expand(self, node, moves, priors=None):
+        '''
+        Adds one child per packed move in moves (all unvisited) below node.
+        '''
+        count = len(moves)
+        self.first_child[node] = len(self)
+        self.child_count[node] = count
+        self.parent.extend(array('i', [node]) * count)
+        self.first_child.extend(array('i', [-1]) * count)
+        self.child_count.extend(array('H', [0]) * count)
+        self.move.extend(array('H', moves))
+        self.visits.extend(array('I', [0]) * count)
+        self.value.extend(array('d', [0.0]) * count)
+        if priors is None:
+            self.prior.extend(array('f', [1.0]) * count)
+        else:
+            self.prior.extend(array('f', priors))
+
+    def is_terminal(self, node):
+        '''
+        Returns True if node was expanded and had no legal moves.
+        '''
+        return self.first_child[node] >= 0 and not self.child_count[node]
+
+    def children(self, node):
+        first = self.first_child[node]
+        return range(first, first + self.child_count[node]) if first >= 0 else range(0)
+
+    def select_child(self, node, exploration, rng):
+        '''
+        Returns (child, unvisited). Unvisited children come first, highest prior first and at random among
+        equal priors; once every child has been visited the child with the highest UCT score is returned.
+        '''
+        visits = self.visits
+        value = self.value
+        prior = self.prior
+        unvisited = []
+        best_prior = -1.0
+        best = -1
+        best_score = -1.0
+        log_visits = None
+        for child in self.children(node):
+            child_visits = visits[child]
+            if not child_visits:
+                if prior[child] > best_prior:
+                    best_prior = prior[child]
+                    unvisited = [child]
+                elif prior[child] == best_prior:
+                    unvisited.append(child)
+                continue
+            if unvisited:
+                continue
+            if log_visits is None:
+                log_visits = math.log(visits[node])
+            score = value[child] / child_visits + exploration * math.sqrt(log_visits / child_visits)
+            if score > best_score:
+                best_score = score
+                best = child
+        if unvisited:
+            return unvisited[rng.randrange(len(unvisited))], True
+        return best, False
+
+    def find_child(self, node, move):
+        '''
+        Returns the child of node reached by the packed move, or None.
+        '''
+        for child in self.children(node):
+            if self.move[child] == move:
+                return child
+        return None
+
+    def principal_variation(self, max_length=12):
+        '''
+        Returns the packed moves of the line that follows the most visited child from the root.
+        '''
+        line = []
+        node = 0
+        while len(line) < max_length:
+            children = [child for child in self.children(node) if self.visits[child]]
+            if not children:
+                break
+            node = max(children, key=lambda child: self.visits[child])
+            line.append(self.move[node])
+        return line
+
+    def subtree(self, node, root_player):
+        '''
+        Returns a new tree holding node and everything below it, with node as the root.
+        Nodes are copied breadth first, so each node's children stay next to each other.
+        '''
+        tree = MCTSTree(root_player)
+        tree.visits[0] = self.visits[node]
+        tree.value[0] = self.value[node]
+        queue = deque([(node, 0)])
+        while queue:
+            old, new = queue.popleft()
+            first = self.first_child[old]
+            if first < 0:
+                continue
+            count = self.child_count[old]
+            tree.first_child[new] = len(tree)
+            tree.child_count[new] = count
+            new_first = len(tree)
+            tree.parent.extend(array('i', [new]) * count)
+            tree.first_child.extend(array('i', [-1]) * count)
+            tree.child_count.extend(array('H', [0]) * count)
+            tree.move.extend(self.move[first:first + count])
+            tree.visits.extend(self.visits[first:first + count])
+            tree.value.extend(self.value[first:first + count])
+            tree.prior.extend(self.prior[first:first + count])
+            queue.extend((first + offset, new_first + offset) for offset in range(count))
+        return tree
+
+
+class MCTS:
+    # Most visits a transposition table entry can add to a new node
+    TT_PRIOR_VISITS = 10
+    # Centipawns one side must be ahead by for an evaluated rollout to count as its win
+    EVALUATION_MARGIN = 200
+    # Prior given to captures and promotions by the heuristic policy (quiet moves get 1)
+    CAPTURE_PRIOR = 2.0
+    # Seconds between the progress reports search gives its info function
+    INFO_INTERVAL = 0.25
+
+    def __init__(self, exploration=1.4, rollout_policy='random', max_rollout_depth=80, seed=None, tt=None,
+                 rollout_evaluation=False, max_nodes=10000000, reuse_tree=False, book=None, tablebase=None,
+                 vector_batch=64):
+        '''
+        exploration - UCT exploration constant
+        rollout_policy - 'random' plays uniformly random legal moves,
+                         'heuristic' plays captures and promotions first (and expands them first),
+                         'vector' plays batches of simplified rollouts with NumPy (see Chess_Vector)
+        max_rollout_depth - rollouts still running after this many moves count as a draw
+        seed - seed for the random number generator, for repeatable searches
+        tt - optional TranspositionTable shared between positions reached by different move orders
+             (and between searches); new nodes start from the statistics stored for their position
+        rollout_evaluation - score rollouts that reach max_rollout_depth with the static evaluation instead of
+                             counting them as draws, so short rollouts (e.g. max_rollout_depth=8) still give a result
+        max_nodes - nodes are no longer added once the tree holds this many (MCTSTree.NODE_BYTES each);
+                    playouts carry on from the leaves of the tree
+        reuse_tree - keep the tree after a search and start the next search from the subtree of the
+                     position reached by the moves played since
+        book - optional Chess_Book.OpeningBook; positions in it are answered with a book move without searching
+        tablebase - optional Chess_Tablebase.Tablebase; rollouts reaching a position in it end with its result
+        vector_batch - leaves selected (with a virtual loss each) before one 'vector' rollout call plays them all;
+                       NumPy only pays off over many boards per call
+        '''
+        if rollout_policy not in ('random', 'heuristic', 'vector'):
+            raise ValueError(f'Unknown rollout policy: {rollout_policy}')
+        self.exploration = exploration
+        self.rollout_policy = rollout_policy
+        self.max_rollout_depth = max_rollout_depth
+        self.random = random.Random(seed)
+        self.tt = tt
+        self.rollout_evaluation = rollout_evaluation
+        self.max_nodes = max_nodes
+        self.reuse_tree = reuse_tree
+        self.book = book
+        self.tablebase = tablebase
+        self.vector_batch = vector_batch
+        self.tree = None
+        # Length of board.move_history and hash key of the position at the root of the kept tree
+        self.tree_plies = 0
+        self.tree_key = None
+
+    def search(self, board, limits=None, info=None):
+        '''
+        Searches the position on board for the side to move and returns a SearchResult.
+        info - optional function called with the SearchResult so far about every INFO_INTERVAL seconds
+        '''
+        limits = limits or SearchLimits()
+        start_time = time.perf_counter()
+        if self.book is not None:
+            move = self.book.choose(board, self.random)
+            if move is not None:
+                return SearchResult(move, 0.5, 0, time.perf_counter() - start_time, {})
+        deadline = limits.deadline(start_time)
+        tree = self.reused_tree(board) if self.reuse_tree else None
+        if tree is None:
+            tree = MCTSTree(board.opponent_color(board.current_turn))
+        playouts = 0
+        next_info = start_time + self.INFO_INTERVAL
+
+        while not limits.exhausted(playouts, deadline):
+            remaining = None if limits.playouts is None else limits.playouts - playouts
+            playouts += self.playout_step(board, tree, remaining)
+            # A position without legal moves has nothing to search
+            if tree.is_terminal(0):
+                break
+            if info is not None:
+                now = time.perf_counter()
+                if now >= next_info:
+                    info(self.result(tree, playouts, now - start_time))
+                    next_info = now + self.INFO_INTERVAL
+
+        if self.reuse_tree:
+            self.tree = tree
+            self.tree_plies = len(board.move_history)
+            self.tree_key = board.hash_key
+        return self.result(tree, playouts, time.perf_counter() - start_time)
+
+    def ponder(self, board, stop, ready=None):
+        '''
+        Searches the position on board until stop (a threading.Event) is set and keeps the tree, so the next
+        search starts from the subtree of the move the opponent actually plays.
+        Meant to run on a background thread while the opponent thinks: the playouts use a copy of board,
+        which is only read when pondering starts, and ready (an optional threading.Event) is set once it
+        has been read. Returns the number of playouts run.
+        '''
+        tree = self.reused_tree(board)
+        if tree is None:
+            tree = MCTSTree(board.opponent_color(board.current_turn))
+        plies, key = len(board.move_history), board.hash_key
+        scratch = Board.from_bytes(board.to_bytes(), board.compact)
+        if ready is not None:
+            ready.set()
+        playouts = 0
+        while not stop.is_set() and not tree.is_terminal(0):
+            playouts += self.playout_step(scratch, tree)
+        self.tree = tree
+        self.tree_plies = plies
+        self.tree_key = key
+        return playouts
+
+    def reused_tree(self, board):
+        '''
+        Returns the part of the kept tree below the position on board, or None if board did not come
+        from the kept root by moves in the tree.
+        '''
+        tree = self.tree
+        self.tree = None
+        if tree is None or len(board.move_history) < self.tree_plies:
+            return None
+        played = board.move_history[self.tree_plies:]
+        # The position the tree was searched from must be the one the played moves start from
+        root_key = board.undo_stack[self.tree_plies][board.UNDO_HASH] if played else board.hash_key
+        if root_key != self.tree_key:
+            return None
+        node = 0
+        for move in played:
+            node = tree.find_child(node, move & 0xFFFF)
+            if node is None:
+                return None
+        if node == 0:
+            return tree
+        return tree.subtree(node, board.opponent_color(board.current_turn))
+
+    def clear(self):
+        '''
+        Drops the kept tree.
+        '''
+        self.tree = None
+
+    @staticmethod
+    def result(tree, playouts, elapsed):
+        '''
+        Builds the SearchResult for a searched tree, picking the most visited root move.
+        '''
+        children = tree.children(0)
+        move_stats = {decode_move(tree.move[child]): (tree.visits[child], tree.value[child])
+                      for child in children if tree.visits[child]}
+        if not move_stats:
+            return SearchResult(None, 0.0, playouts, elapsed, move_stats)
+        best = max(children, key=lambda child: tree.visits[child])
+        return SearchResult(decode_move(tree.move[best]), tree.value[best] / tree.visits[best],
+                            playouts, elapsed, move_stats,
+                            pv=[decode_move(move) for move in tree.principal_variation()])
+
+    def best_move(self, board, playouts=None, movetime=None):
+        '''
+        Returns the best move for the side to move within the given budget.
+        '''
+        return self.search(board, SearchLimits(playouts, movetime)).best_move
+
+    def playout_step(self, board, tree, remaining=None):
+        '''
+        Runs one playout, or with the 'vector' policy a batch of up to vector_batch playouts (and at most
+        remaining) whose leaves are rolled out together. Returns the number of playouts run.
+        '''
+        if self.rollout_policy != 'vector':
+            self.playout(board, tree)
+            return 1
+        count = self.vector_batch if remaining is None else max(1, min(self.vector_batch, remaining))
+        leaves, encoded, decided = self.select_leaves(board, tree, count)
+        played = iter(self.rollouts(encoded))
+        for index, (path, keys) in enumerate(leaves):
+            winner = decided[index] if index in decided else next(played)
+            self.backpropagate(tree, path, keys, winner, visited=True)
+        return len(leaves)
+
+    def select_leaves(self, board, tree, count):
+        '''
+        Selects count paths for one batch of rollouts. Each selected path gets a virtual loss so one batch
+        spreads over different leaves.
+        Returns [(path, keys)], the to_bytes encoding of each leaf position that has to be played out,
+        and {index in the paths: winner} for the leaves whose result is already known (see leaf_result).
+        '''
+        leaves = []
+        encoded = []
+        decided = {}
+        for _ in range(count):
+            path, keys = self.select_and_expand(board, tree)
+            known = self.leaf_result(board)
+            if known is None:
+                encoded.append(board.to_bytes())
+            else:
+                decided[len(leaves)] = known[0]
+            for _ in range(len(path) - 1):
+                board.unmake_move()
+            # Virtual loss: counts the visit now so the next selection prefers other paths
+            for node in path:
+                tree.visits[node] += 1
+            leaves.append((path, keys))
+        return leaves, encoded, decided
+
+    def leaf_result(self, board):
+        '''
+        Returns (winner,) for a position whose result is known without a rollout, or None.
+        A side with no legal moves is checkmated if in check and stalemated otherwise, and tablebase
+        positions take the tablebase result. The simplified 'vector' rollouts can not tell these apart.
+        '''
+        if not board.legal_moves():
+            return (board.opponent_color(board.current_turn) if board.in_check() else None,)
+        if self.tablebase is not None:
+            known = self.tablebase.probe(board)
+            if known is not None:
+                return (known[0],)
+        return None
+
+    def playout(self, board, tree):
+        '''
+        Runs one selection, expansion, rollout and backpropagation step from the root of tree.
+        '''
+        path, keys = self.select_and_expand(board, tree)
+
+        # Simulation
+        winner = self.rollout(board)
+
+        for _ in range(len(path) - 1):
+            board.unmake_move()
+
+        self.backpropagate(tree, path, keys, winner)
+
+    def select_and_expand(self, board, tree):
+        '''
+        Walks down from the root with UCT, expanding the first node reached that has no children yet,
+        and stops on the first unvisited child. The moves are left made on board.
+        Returns the nodes on the path from the root and the hash key of each one's position.
+        '''
+        node = 0
+        path = [0]
+        keys = [board.hash_key]
+        while True:
+            if tree.first_child[node] < 0:
+                moves = board.legal_moves()
+                # A full tree stops growing and plays out from its leaves
+                if len(tree) + len(moves) > self.max_nodes:
+                    break
+                tree.expand(node, [encode_move(move) for move in moves], self.priors(board, moves))
+            if not tree.child_count[node]:
+                break
+            node, unvisited = tree.select_child(node, self.exploration, self.random)
+            board.make_move(*decode_move(tree.move[node]))
+            path.append(node)
+            keys.append(board.hash_key)
+            if unvisited:
+                if self.tt is not None:
+                    self.seed_from_tt(tree, node, board.hash_key)
+                break
+        return path, keys
+
+    def priors(self, board, moves):
+        '''
+        Returns the priors of new children, or None to give every move the same prior.
+        '''
+        if self.rollout_policy != 'heuristic':
+            return None
+        return [self.CAPTURE_PRIOR if board.board[end[0]][end[1]] is not None or promotion is not None else 1.0
+                for _, end, promotion in moves]
+
+    def seed_from_tt(self, tree, node, key):
+        '''
+        Starts a new node from the statistics stored for its position, scaled down to at most TT_PRIOR_VISITS visits.
+        '''
+        entry = self.tt.probe_mcts(key)
+        if entry is None or entry[0] <= 0:
+            return
+        visits, value = entry
+        prior = min(visits, self.TT_PRIOR_VISITS)
+        tree.visits[node] = prior
+        tree.value[node] = value / visits * prior
+
+    def backpropagate(self, tree, path, keys, winner, visited=False):
+        '''
+        Adds the result of a playout to the nodes on path.
+        visited - the visits were already counted (as a virtual loss) when the path was selected
+        '''
+        players = (tree.root_player, 'white' if tree.root_player == 'black' else 'black')
+        for depth, node in enumerate(path):
+            if not visited:
+                tree.visits[node] += 1
+            if winner is None:
+                tree.value[node] += 0.5
+            elif winner == players[depth & 1]:
+                tree.value[node] += 1.0
+            if self.tt is not None:
+                self.tt.store_mcts(keys[depth], tree.visits[node], tree.value[node])
+
+    def rollout(self, board):
+        '''
+        Plays rollout moves until the game ends or max_rollout_depth is reached.
+        Returns the winning color, or None for a draw. The board is restored afterwards.
+        '''
+        if self.rollout_policy == 'vector':
+            known = self.leaf_result(board)
+            return self.rollouts([board.to_bytes()])[0] if known is None else known[0]
+        made = 0
+        winner = None
+        for _ in range(self.max_rollout_depth):
+            if self.tablebase is not None:
+                known = self.tablebase.probe(board)
+                if known is not None:
+                    winner = known[0]
+                    break
+            move = self.rollout_move(board)
+            if move is None:
+                # No legal moves: checkmate if in check, otherwise stalemate
+                if board.in_check():
+                    winner = board.opponent_color(board.current_turn)
+                break
+            board.make_move(*move)
+            made += 1
+        else:
+            if self.rollout_evaluation:
+                score = evaluate_white(board)
+                if score >= self.EVALUATION_MARGIN:
+                    winner = 'white'
+                elif score <= -self.EVALUATION_MARGIN:
+                    winner = 'black'
+
+        for _ in range(made):
+            board.unmake_move()
+        return winner
+
+    def rollouts(self, encoded):
+        '''
+        Runs one rollout from each position, given in the Board.to_bytes encoding, and returns their winners.
+        The 'vector' policy plays them all at once as one NumPy batch straight from the encodings; the leaves
+        are expected to have been checked with leaf_result first.
+        '''
+        if self.rollout_policy == 'vector':
+            # NumPy is only needed for this policy
+            from Chess_Vector import batch_rollouts
+            margin = self.EVALUATION_MARGIN if self.rollout_evaluation else None
+            return batch_rollouts(encoded, self.max_rollout_depth, self.random.getrandbits(64), margin)
+        return [self.rollout(Board.from_bytes(data, compact=True)) for data in encoded]
+
+    def rollout_move(self, board):
+        '''
+        Picks a legal move for the rollout, or returns None when there is none.
+        Pseudo legal moves are tried in random order so only one usually needs the full legality check.
+        '''
+        moves = board.pseudo_legal_moves()
+        self.random.shuffle(moves)
+        if self.rollout_policy == 'heuristic':
+            # Stable sort keeps the shuffled order within captures/promotions and quiet moves
+            moves.sort(key=lambda move: board.board[move[1][0]][move[1][1]] is None and move[2] is None)
+        for move in moves:
+            if board.is_legal(move):
+                return move
+        return None
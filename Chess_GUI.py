@@ -1,114 +1,317 @@
+import argparse
+import os
+import queue
+import threading
+
 import pygame
 
-from Chess_MCTS import Game
+from Chess_Book import OpeningBook
+from Chess_Engine import MCTS, SearchLimits
+from Chess_MCTS import CHECKMATE, ONGOING, Game, move_to_uci
+
+parser = argparse.ArgumentParser(description='Play chess in a window.')
+parser.add_argument('--engine', choices=['white', 'black'], help='let the MCTS engine play this color')
+parser.add_argument('--playouts', type=int, help='playouts per engine move')
+parser.add_argument('--movetime', type=int, help='engine search time per move in milliseconds')
+parser.add_argument('--ponder', action='store_true', help='let the engine think on your time')
+parser.add_argument('--book', help='opening book file built by Chess_Book.py')
+args = parser.parse_args()
+
+# Piece images are the SVG files next to this script
+IMAGE_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+PIECE_LETTERS = {'king': 'K', 'queen': 'Q', 'rook': 'R', 'bishop': 'B', 'knight': 'N', 'pawn': 'P'}
+
+LIGHT_COLOR = (240, 217, 181)
+DARK_COLOR = (181, 136, 99)
+SELECTED_COLOR = (246, 246, 105)
+INFO_COLOR = (40, 40, 40)
+INFO_TEXT_COLOR = (230, 230, 230)
+# Height of the search information strip under the board
+INFO_HEIGHT = 28
 
 # Starts pygame
 pygame.init()
 
-# Sets window dimensions 
+# Sets window dimensions, the window can be resized
 window_size = 640
-square_size = window_size // 8
-window = pygame.display.set_mode((window_size, window_size))
+window = pygame.display.set_mode((window_size, window_size + INFO_HEIGHT), pygame.RESIZABLE)
 pygame.display.set_caption('Chess Game')
 clock = pygame.time.Clock()
 
-# Draws the board onto the screen
-def draw_board(surface):
-    light_color = (240, 217, 181)
-    dark_color = (181, 136, 99)
-    for row in range(8):
-        for col in range(8):
-            # Chooses color based on the sum of row and col
-            if (row + col) % 2 == 0:
-                color = light_color
-            else:
-                color = dark_color
-            rect = pygame.Rect(col * square_size, row * square_size, square_size, square_size)
-            pygame.draw.rect(surface, color, rect)
-
-# Loads pieces into the game
-piece_images = {
-    'white_king' : pygame.image.load('C:/Users/Stabu/OneDrive - University of Keele/Chess Game/Piece Images/monarchy/wK.svg'),
-    'white_queen' : pygame.image.load('C:/Users/Stabu/OneDrive - University of Keele/Chess Game/Piece Images/monarchy/wQ.svg'),
-    'white_knight' : pygame.image.load('C:/Users/Stabu/OneDrive - University of Keele/Chess Game/Piece Images/monarchy/wN.svg'),
-    'white_bishop' : pygame.image.load('C:/Users/Stabu/OneDrive - University of Keele/Chess Game/Piece Images/monarchy/wB.svg'),
-    'white_rook' : pygame.image.load('C:/Users/Stabu/OneDrive - University of Keele/Chess Game/Piece Images/monarchy/wR.svg'),
-    'white_pawn' : pygame.image.load('C:/Users/Stabu/OneDrive - University of Keele/Chess Game/Piece Images/monarchy/wP.svg'),
-    'black_king' : pygame.image.load('C:/Users/Stabu/OneDrive - University of Keele/Chess Game/Piece Images/monarchy/bK.svg'),
-    'black_queen' : pygame.image.load('C:/Users/Stabu/OneDrive - University of Keele/Chess Game/Piece Images/monarchy/bQ.svg'),
-    'black_knight' : pygame.image.load('C:/Users/Stabu/OneDrive - University of Keele/Chess Game/Piece Images/monarchy/bN.svg'),
-    'black_bishop' : pygame.image.load('C:/Users/Stabu/OneDrive - University of Keele/Chess Game/Piece Images/monarchy/bB.svg'),
-    'black_rook' : pygame.image.load('C:/Users/Stabu/OneDrive - University of Keele/Chess Game/Piece Images/monarchy/bR.svg'),
-    'black_pawn' : pygame.image.load('C:/Users/Stabu/OneDrive - University of Keele/Chess Game/Piece Images/monarchy/bP.svg'),
-
-    
-}
-
-def draw_pieces(surface, board):
-    for row in range(8):
-        for col in range(8):
-            piece = board[row][col]
-            if piece is not None:
-                key = f'{piece.color}_{piece.piece_type.lower()}'
-                img = piece_images.get(key)
-                if img: 
-                    # Scales images to fit squares 
-                    img = pygame.transform.scale(img, (square_size - 10, square_size - 10))
-
-                    surface.blit(img, (col * square_size , row * square_size))
-
-
-def get_board_position(mouse_pos):
-    x, y = mouse_pos 
-    col = x // square_size
-    row = y // square_size
-    return (row, col)
-
-game = Game()
 
+class BoardRenderer:
+    '''
+    Draws the board and pieces, redrawing only the squares that changed since the last frame.
+
+    The empty board is drawn once per window size into a background surface, and each piece image is
+    scaled once per window size, so a frame only blits the changed squares and returns their rects
+    for pygame.display.update.
+    '''
+
+    def __init__(self, size):
+        # Loads the full size images once, they are only scaled when the window size changes
+        self.images = {}
+        for color in ('white', 'black'):
+            for piece_type, letter in PIECE_LETTERS.items():
+                path = os.path.join(IMAGE_DIRECTORY, f'{color[0]}{letter}.svg')
+                self.images[f'{color}_{piece_type}'] = pygame.image.load(path)
+        self.resize(size)
+
+    def resize(self, size):
+        '''
+        Rebuilds the background and the scaled pieces for a board size in pixels, and forces a full redraw.
+        '''
+        self.square_size = max(size // 8, 1)
+        self.size = self.square_size * 8
+        self.background = pygame.Surface((self.size, self.size))
+        for row in range(8):
+            for col in range(8):
+                # Chooses color based on the sum of row and col
+                color = LIGHT_COLOR if (row + col) % 2 == 0 else DARK_COLOR
+                pygame.draw.rect(self.background, color, self.square_rect(row, col))
+        piece_size = max(self.square_size - 10, 1)
+        self.sprites = {key: pygame.transform.smoothscale(image, (piece_size, piece_size))
+                        for key, image in self.images.items()}
+        # None means no frame has been drawn at this size yet
+        self.drawn = None
+
+    def square_rect(self, row, col):
+        return pygame.Rect(col * self.square_size, row * self.square_size, self.square_size, self.square_size)
+
+    def square_at(self, position):
+        '''
+        Returns the (row, col) of the square under a pixel position, or None if it is off the board.
+        '''
+        x, y = position
+        if not (0 <= x < self.size and 0 <= y < self.size):
+            return None
+        return (y // self.square_size, x // self.square_size)
+
+    def draw(self, surface, board, selected=None):
+        '''
+        Draws the squares that changed since the last call and returns their rects.
+        '''
+        squares = [[None if piece is None else f'{piece.color}_{piece.piece_type.lower()}' for piece in row]
+                   for row in board]
+        dirty = []
+        for row in range(8):
+            for col in range(8):
+                state = (squares[row][col], (row, col) == selected)
+                if self.drawn is not None and self.drawn[row][col] == state:
+                    continue
+                rect = self.square_rect(row, col)
+                surface.blit(self.background, rect, rect)
+                if state[1]:
+                    pygame.draw.rect(surface, SELECTED_COLOR, rect, 4)
+                if state[0] is not None:
+                    surface.blit(self.sprites[state[0]], (rect.x + 5, rect.y + 5))
+                dirty.append(rect)
+        self.drawn = [[(squares[row][col], (row, col) == selected) for col in range(8)] for row in range(8)]
+        return dirty
+
+    def invalidate(self):
+        '''
+        Makes the next draw redraw every square, such as after something was drawn over the board.
+        '''
+        self.drawn = None
+
+
+class EngineWorker:
+    '''
+    Runs the engine's search on a background thread, so the window keeps drawing and taking input
+    while the engine thinks.
+
+    The thread hands its progress and its move to the main loop through a queue, as ('info', SearchResult)
+    and ('done', SearchResult) messages. While it searches it owns game.board, so the window draws
+    the copy of the squares taken when the search started.
+    '''
+
+    def __init__(self, game):
+        self.game = game
+        self.messages = queue.Queue()
+        self.thread = None
+        self.stop = None
+        self.squares = None
+
+    @property
+    def thinking(self):
+        return self.thread is not None
+
+    def start(self):
+        self.game.stop_pondering()
+        self.squares = [row[:] for row in self.game.board.board]
+        self.stop = threading.Event()
+        limits = self.game.limits
+        limits = SearchLimits(limits.playouts, limits.movetime, limits.depth, stop=self.stop)
+        self.thread = threading.Thread(target=self.run, args=(limits,), daemon=True)
+        self.thread.start()
+
+    def run(self, limits):
+        result = self.game.engine.search(self.game.board, limits,
+                                         info=lambda progress: self.messages.put(('info', progress)))
+        self.messages.put(('done', result))
+
+    def move_now(self):
+        '''
+        Ends the search early; the engine plays the best move found so far.
+        '''
+        if self.stop is not None:
+            self.stop.set()
+
+    def poll(self):
+        '''
+        Returns the messages sent since the last call, without waiting.
+        '''
+        messages = []
+        while True:
+            try:
+                messages.append(self.messages.get_nowait())
+            except queue.Empty:
+                break
+        if any(kind == 'done' for kind, _ in messages):
+            self.thread.join()
+            self.thread = None
+        return messages
+
+
+def search_info(result, thinking):
+    '''
+    Returns the text of the information strip for a search result.
+    '''
+    line = ' '.join(move_to_uci(move) for move in result.pv[:6])
+    if result.depth is not None:
+        counts = f'depth {result.depth}, {result.playouts} nodes, {result.playouts_per_second:.0f} nodes/s'
+    else:
+        counts = f'{result.playouts} playouts, {result.playouts_per_second:.0f}/s'
+    prefix = 'Thinking' if thinking else 'Played'
+    suffix = ' - M: move now' if thinking else ''
+    return f'{prefix}: {line} ({counts}){suffix}'
+
+
+# The engine keeps its tree between moves, so each search starts from what the last one found
+if args.engine:
+    book = OpeningBook(args.book) if args.book else None
+    game = Game(engine=MCTS(reuse_tree=True, book=book), engine_color=args.engine,
+                limits=SearchLimits(playouts=args.playouts, movetime=args.movetime), ponder=args.ponder)
+else:
+    game = Game()
+worker = EngineWorker(game)
+
+
+def start_turn():
+    '''
+    Starts the engine thinking if it is its turn, or pondering on the player's time otherwise.
+    Returns False once the game is over.
+    '''
+    if game.board.status() != ONGOING:
+        return False
+    if game.engine is not None and game.board.current_turn == game.engine_color:
+        worker.start()
+    else:
+        game.start_pondering()
+    return True
+
+
+renderer = BoardRenderer(window_size)
 selected_square = None
-game_over = False
+game_over = not start_turn()
+message_shown = False
+info_text = 'Thinking...' if worker.thinking else 'Your move'
+info_shown = None
 running = True
 
 while running:
+    for kind, result in worker.poll():
+        if kind == 'info':
+            info_text = search_info(result, True)
+            continue
+        info_text = search_info(result, False)
+        if result.best_move is None:
+            game_over = True
+            continue
+        game.board.move_piece(*result.best_move)
+        if not start_turn():
+            print(game.board.status().capitalize())
+            game_over = True
+
     for event in pygame.event.get():
         if event.type == pygame.QUIT:
             running = False
 
+        if event.type == pygame.VIDEORESIZE:
+            window = pygame.display.set_mode((event.w, event.h), pygame.RESIZABLE)
+            window.fill((0, 0, 0))
+            renderer.resize(min(event.w, event.h - INFO_HEIGHT))
+            message_shown = False
+            info_shown = None
+            continue
+
         # When game is over, app waits for mouse or button press to reset 
         if game_over:
             if event.type in (pygame.KEYDOWN, pygame.MOUSEBUTTONDOWN):
                 running = False
             continue
 
+        # The player can not move while the engine thinks, but can make it move now
+        if worker.thinking:
+            if event.type == pygame.KEYDOWN and event.key in (pygame.K_m, pygame.K_SPACE):
+                worker.move_now()
+            continue
+
         if event.type == pygame.MOUSEBUTTONDOWN:
-            board_pos = get_board_position(pygame.mouse.get_pos())
+            board_pos = renderer.square_at(event.pos)
+            if board_pos is None:
+                continue
             if selected_square is None:
                 selected_square = board_pos
             else:
                 start, end = selected_square, board_pos
+                selected_square = None
                 if game.board.move_piece(start, end):
                     print('Move executed')
 
-                    if game.board.is_checkmate(game.board.board, game.board.current_turn):
-                        print('Checkmate')
+                    if not start_turn():
+                        print(game.board.status().capitalize())
                         game_over = True
-                    
+                    elif worker.thinking:
+                        info_text = 'Thinking...'
                 else:
                     print('Invalid move')
-                selected_square = None
 
-    draw_board(window)
-    draw_pieces(window, game.board.board)
+    squares = worker.squares if worker.thinking else game.board.board
+    if renderer.drawn is None:
+        # A full redraw, after a resize
+        renderer.draw(window, squares, selected_square)
+        dirty = [window.get_rect()]
+    else:
+        dirty = renderer.draw(window, squares, selected_square)
+
+    # The information strip is only drawn again when its text changes
+    if info_text != info_shown:
+        info_rect = pygame.Rect(0, renderer.size, renderer.size, INFO_HEIGHT)
+        window.fill(INFO_COLOR, info_rect)
+        font = pygame.font.SysFont('Arial', INFO_HEIGHT * 2 // 3)
+        window.blit(font.render(info_text, True, INFO_TEXT_COLOR), (6, renderer.size + INFO_HEIGHT // 6))
+        dirty.append(info_rect)
+        info_shown = info_text
 
-    # If game over displays a game over message
-    if game_over:
-        font = pygame.font.SysFont('Arial', 32)
-        text_surface = font.render('Checkmate! Press any key to exit.', True, (0, 0, 0))
-        text_rect = text_surface.get_rect(center=(window_size//2, window_size//2))
+    # If game over displays a game over message, drawn once over the finished board
+    if game_over and not message_shown:
+        font = pygame.font.SysFont('Arial', max(renderer.size // 20, 12))
+        status = game.board.status()
+        message = 'Checkmate!' if status == CHECKMATE else f'Draw by {status}!'
+        text_surface = font.render(f'{message} Press any key to exit.', True, (0, 0, 0))
+        text_rect = text_surface.get_rect(center=(renderer.size // 2, renderer.size // 2))
         window.blit(text_surface, text_rect)
+        dirty.append(text_rect)
+        message_shown = True
 
-    pygame.display.flip()
+    if dirty:
+        pygame.display.update(dirty)
     clock.tick(60)
 
+worker.move_now()
+if worker.thinking:
+    worker.thread.join()
+game.stop_pondering()
 pygame.quit()
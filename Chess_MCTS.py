@@ -1,26 +1,101 @@
+import random
+import threading
+from array import array
+
+from Chess_Eval import ENDGAME_SQUARES, MIDDLEGAME_SQUARES, PHASE_WEIGHTS
+
+
 class Game:
-    def __init__(self):
-        self.board = Board()
+    def __init__(self, engine=None, engine_color='black', limits=None, ponder=False):
+        '''
+        engine - search engine (such as Chess_Engine.MCTS) that plays engine_color, or None for two human players
+        limits - search budget given to the engine on each move
+        ponder - let the engine keep searching on a background thread while the player thinks; this needs an
+                 engine that keeps its tree between moves (MCTS with reuse_tree=True), so its next search
+                 starts from the subtree of the move that was played
+        '''
+        self.board = Board(compact=True)
+        self.engine = engine
+        self.engine_color = engine_color
+        self.limits = limits
+        self.ponder = ponder and getattr(engine, 'reuse_tree', False)
+        self.ponder_thread = None
+        self.ponder_stop = None
 
     def start(self):
         while True:
             self.board.display_board()
             print("Current turn:", self.board.current_turn)
-            move_input = input("Enter your move (e.g., 'e2 e4'): ")
-            try:
-                start, end = self.parse_move(move_input)
-            except Exception as e:
-                print("Invalid input format. Please try again.")
-                continue
-
-            if self.board.move_piece(start, end):
-                print("Move executed")
+            if self.engine is not None and self.board.current_turn == self.engine_color:
+                if not self.engine_move():
+                    break
             else:
-                print("Invalid move, try again.")
+                self.start_pondering()
+                move_input = input("Enter your move (e.g., 'e2 e4'): ")
+                try:
+                    start, end = self.parse_move(move_input)
+                except Exception as e:
+                    print("Invalid input format. Please try again.")
+                    continue
+
+                if self.board.move_piece(start, end):
+                    print("Move executed")
+                else:
+                    print("Invalid move, try again.")
 
-            if self.board.is_checkmate(self.board, self.board.current_turn):
+            status = self.board.status()
+            if status == CHECKMATE:
                 print(f"Checkmate! {self.board.opponent_color(self.board.current_turn).capitalize()} wins!")
                 break  # Ends the game
+            if status != ONGOING:
+                print(f"Draw by {status}!")
+                break
+        self.stop_pondering()
+
+    def start_pondering(self):
+        '''
+        Starts the engine searching the current position on a background thread, if pondering is on.
+        Returns once the engine has copied the board, so the player's move can be made straight away.
+        '''
+        if not self.ponder or self.ponder_thread is not None or self.board.status() != ONGOING:
+            return
+        self.ponder_stop = threading.Event()
+        ready = threading.Event()
+        self.ponder_thread = threading.Thread(target=self.engine.ponder, args=(self.board, self.ponder_stop, ready),
+                                              daemon=True)
+        self.ponder_thread.start()
+        ready.wait()
+
+    def stop_pondering(self):
+        '''
+        Stops the background search and waits for it, leaving its tree with the engine.
+        '''
+        if self.ponder_thread is None:
+            return
+        self.ponder_stop.set()
+        self.ponder_thread.join()
+        self.ponder_thread = None
+
+    def engine_move(self):
+        '''
+        Lets the engine search and play its move. Returns False if it has no legal move.
+        '''
+        self.stop_pondering()
+        result = self.engine.search(self.board, self.limits)
+        if result.best_move is None:
+            print("The engine has no legal moves.")
+            return False
+        start, end, promotion = result.best_move
+        if not result.playouts:
+            print(f"Engine plays {self.index_to_algebraic(start)} {self.index_to_algebraic(end)} (book move)")
+        elif result.depth is not None:
+            print(f"Engine plays {self.index_to_algebraic(start)} {self.index_to_algebraic(end)} "
+                  f"(depth {result.depth}, score {result.score}, {result.playouts} nodes, {result.playouts_per_second:.0f} nodes/s)")
+        else:
+            print(f"Engine plays {self.index_to_algebraic(start)} {self.index_to_algebraic(end)} "
+                  f"({result.playouts} playouts, {result.playouts_per_second:.0f} playouts/s)")
+        self.board.move_piece(start, end, promotion)
+        return True
                 
     def parse_move(self, move_input):
         '''
@@ -42,18 +117,178 @@ class Game:
         row = 8 - int(pos_str[1])
         return (row, col)
 
+    def index_to_algebraic(self, position):
+        """
+        Convert board indices (row, col) back to a position string like 'e2'.
+        """
+        row, col = position
+        return 'abcdefgh'[col] + str(8 - row)
+
 class Board:
-    def __init__(self):
+    def __init__(self, compact=False, setup=True):
         # Initialize an 8x8 board as an instance variable
-        self.board = [[None for _ in range(8)] for _ in range(8)]
-        self.setup_board()
+        # setup=False leaves the board empty, for positions loaded from FEN or bytes
+        # In compact mode the squares are stored as integer piece codes in a flat array
+        self.compact = compact
+        if compact:
+            self.board = CompactBoard()
+        else:
+            self.board = [[None for _ in range(8)] for _ in range(8)]
+        # Every move played, packed into an int by encode_move with the MOVE_* flags added
+        self.move_history = []
+        # Holds what is needed to take back each move played with make_move
+        self.undo_stack = []
+        if setup:
+            self.setup_board()
         self.current_turn = 'white'
         self.en_passant_target = None
+        # Moves since the last capture or pawn move, and the move number shown in FEN
+        self.halfmove_clock = 0
+        self.fullmove_number = 1
         self.king_positions = {'white': None, 'black': None}
+        # Zobrist key of the position, updated incrementally by make_move
+        self.hash_key = self.compute_hash()
+        # Material and piece-square sums and game phase for Chess_Eval, also updated by make_move
+        self.middlegame, self.endgame, self.phase = self.compute_evaluation()
+        # Legal moves and status of the current position, computed when first asked for and cleared by every move
+        self.cached_moves = None
+        self.cached_status = None
 
     def __getitem__(self, index):
         return self.board[index]
 
+    def __reduce__(self):
+        # Pickles (for example when sending a board to a worker process) only the compact encoding
+        return (Board.from_bytes, (self.to_bytes(), self.compact))
+
+    def to_bytes(self):
+        '''
+        Encodes the position in 69 bytes: the 64 piece codes, the side to move, the en passant square (255 for none),
+        the halfmove clock (capped at 255) and the fullmove number.
+        Move history and the undo stack are not included.
+        '''
+        codes = array('b', [piece_to_code(self.board[row][col]) for row in range(8) for col in range(8)])
+        en_passant = 255 if self.en_passant_target is None else self.en_passant_target[0] * 8 + self.en_passant_target[1]
+        return (codes.tobytes() + bytes((self.current_turn == 'black', en_passant, min(self.halfmove_clock, 255)))
+                + self.fullmove_number.to_bytes(2, 'little'))
+
+    @classmethod
+    def from_bytes(cls, data, compact=False):
+        '''
+        Builds a board from the encoding returned by to_bytes.
+        '''
+        board = cls(compact=compact, setup=False)
+        codes = array('b')
+        codes.frombytes(data[:64])
+        board.place_codes(codes)
+        board.current_turn = 'black' if data[64] else 'white'
+        board.en_passant_target = None if data[65] == 255 else (data[65] // 8, data[65] % 8)
+        board.halfmove_clock = data[66]
+        board.fullmove_number = int.from_bytes(data[67:69], 'little')
+        board.hash_key = board.compute_hash()
+        board.middlegame, board.endgame, board.phase = board.compute_evaluation()
+        return board
+
+    def place_codes(self, codes):
+        '''
+        Fills the board from 64 piece codes in row order.
+        '''
+        self.cached_moves = None
+        self.cached_status = None
+        if self.compact:
+            self.board.squares[:] = array('b', codes)
+            return
+        for index, code in enumerate(codes):
+            self.board[index // 8][index % 8] = _make_piece(code) if code else None
+
+    @classmethod
+    def from_fen(cls, fen, compact=False):
+        '''
+        Builds a board from a FEN string. The halfmove clock and fullmove number may be left out (as in EPD).
+        Pawns on their starting row get their first move, and kings and rooks get it from the castling field.
+        '''
+        fields = fen.split()
+        if len(fields) < 4:
+            raise ValueError(f'Invalid FEN: {fen!r}')
+        placement, side, castling, en_passant = fields[:4]
+        if side not in ('w', 'b'):
+            raise ValueError(f'Invalid FEN side to move: {side!r}')
+
+        rows = placement.split('/')
+        if len(rows) != 8:
+            raise ValueError(f'Invalid FEN placement: {placement!r}')
+        codes = []
+        for row, rank in enumerate(rows):
+            for char in rank:
+                if char.isdigit():
+                    codes.extend([0] * int(char))
+                    continue
+                code = FEN_CODES.get(char.lower())
+                if code is None:
+                    raise ValueError(f'Invalid FEN piece: {char!r}')
+                if code == PAWN and row == (6 if char.isupper() else 1):
+                    code |= UNMOVED
+                codes.append(code if char.isupper() else -code)
+            if len(codes) != (row + 1) * 8:
+                raise ValueError(f'Invalid FEN rank: {rank!r}')
+
+        # Castling rights are kept as the first move flag of the king and rook
+        for right, letter in ((CASTLE_WHITE_KINGSIDE, 'K'), (CASTLE_WHITE_QUEENSIDE, 'Q'),
+                              (CASTLE_BLACK_KINGSIDE, 'k'), (CASTLE_BLACK_QUEENSIDE, 'q')):
+            if letter in castling:
+                sign = 1 if letter.isupper() else -1
+                (king_row, king_col), (rook_row, rook_col) = CASTLING_SQUARES[right]
+                king_code = codes[king_row * 8 + king_col] * sign
+                rook_code = codes[rook_row * 8 + rook_col] * sign
+                if king_code > 0 and king_code & ~UNMOVED == KING and rook_code > 0 and rook_code & ~UNMOVED == ROOK:
+                    codes[king_row * 8 + king_col] = (KING | UNMOVED) * sign
+                    codes[rook_row * 8 + rook_col] = (ROOK | UNMOVED) * sign
+
+        board = cls(compact=compact, setup=False)
+        board.place_codes(codes)
+        board.current_turn = 'white' if side == 'w' else 'black'
+        if en_passant != '-':
+            board.en_passant_target = (8 - int(en_passant[1]), 'abcdefgh'.index(en_passant[0]))
+        if len(fields) >= 6 and fields[4].isdigit() and fields[5].isdigit():
+            board.halfmove_clock = int(fields[4])
+            board.fullmove_number = int(fields[5])
+        board.hash_key = board.compute_hash()
+        board.middlegame, board.endgame, board.phase = board.compute_evaluation()
+        return board
+
+    def to_fen(self):
+        '''
+        Returns the FEN string of the position.
+        '''
+        rows = []
+        for row in range(8):
+            rank = ''
+            empty = 0
+            for col in range(8):
+                piece = self.board[row][col]
+                if piece is None:
+                    empty += 1
+                    continue
+                if empty:
+                    rank += str(empty)
+                    empty = 0
+                letter = FEN_LETTERS[piece.piece_type]
+                rank += letter.upper() if piece.color == 'white' else letter
+            if empty:
+                rank += str(empty)
+            rows.append(rank)
+
+        rights = self.castling_rights()
+        castling = ''.join(letter for right, letter in ((CASTLE_WHITE_KINGSIDE, 'K'), (CASTLE_WHITE_QUEENSIDE, 'Q'),
+                                                        (CASTLE_BLACK_KINGSIDE, 'k'), (CASTLE_BLACK_QUEENSIDE, 'q'))
+                           if rights & right)
+        if self.en_passant_target is None:
+            en_passant = '-'
+        else:
+            en_passant = 'abcdefgh'[self.en_passant_target[1]] + str(8 - self.en_passant_target[0])
+        return ' '.join(['/'.join(rows), 'w' if self.current_turn == 'white' else 'b', castling or '-',
+                         en_passant, str(self.halfmove_clock), str(self.fullmove_number)])
+
     def setup_board(self):
 
         # Places the Kings
@@ -118,14 +353,16 @@ class Board:
         row, col = position
         return self.board[row][col]
 
-    def move_piece(self, start, end):
+    def move_piece(self, start, end, promotion=None):
         """
         Execute a move from the start position to the end position.
         This method:
           - Validates the move.
           - Updates the board.
           - Switches the current turn.
+        promotion is the piece type a pawn reaching the last row becomes (a Queen by default).
         Returns True if the move was executed successfully, or False otherwise.
+        Whether the game has ended is left to the caller, through status().
         """
         # Retrieves the piece at the starting position 
         piece = self.get_piece(start)
@@ -138,92 +375,671 @@ class Board:
             print('It is not your turn!')
             return False
 
-        if piece.piece_type == 'King':
-            legal_moves = piece.possible_moves(self.board, start, castle=True)
-        elif piece.piece_type == 'Pawn':
-            legal_moves = piece.possible_moves(self.board, start, en_passant=self.en_passant_target)
-        else:
-            legal_moves = piece.possible_moves(self.board, start)
-
-        if end not in legal_moves:
+        if end not in self.piece_moves(start, piece):
             print("That move is not legal!")
             return False
-        
-        # Detects if this is a castaling move
-        if piece.piece_type == 'King' and abs(end[1] - start[1]) == 2:
-            row = start[0]
-            # Kingside castling
-            if end[1] > start[1]:
-                # The rook on the kingside should move one space to the right of where the king starts 
-                rook = self.board[row][7]
-                self.board[row][start[1] + 1] = rook
-                self.board[row][7] = None
 
-            else:
-                rook = self.board[row][0]
-                self.board[row][start[1] - 1] = rook
-                self.board[row][0] = None
+        opponent = self.opponent_color(self.current_turn)
 
-            if hasattr(rook, 'first_move'):
-                rook.first_move = False
+        # The king can not castle out of or through check
+        if piece.piece_type == 'King' and abs(end[1] - start[1]) == 2:
+            crossed = (start[0], (start[1] + end[1]) // 2)
+            if self.is_square_attacked(self.board, start, opponent) or self.is_square_attacked(self.board, crossed, opponent):
+                print('Move not allowed: King can not castle through check!')
+                return False
+
+        if piece.piece_type == 'Pawn' and end == self.en_passant_target:
+            print("En passant capture!")
+
+        # Makes the move on the board and takes it back if it leaves the king in check
+        self.make_move(start, end, promotion)
+        king_pos = self.find_king(self.board, piece.color)
+        if self.is_square_attacked(self.board, king_pos, opponent):
+            self.unmake_move()
+            print('Move not allowed: King would be in check!')
+            return False
+        return True
 
-        # Checks for en passant capture for pawns
+    def piece_moves(self, start, piece):
+        '''
+        Returns the possible moves of the piece on start, including castling and en passant.
+        These moves may still leave the king in check.
+        '''
+        if piece.piece_type == 'King':
+            return piece.possible_moves(self.board, start, castle=True)
         if piece.piece_type == 'Pawn':
-            if abs(end[1] - start[1]) == 1 and self.board[end[0]][end[1]] is None:
-                captured_row = start[0]
-                captured_col = end[1]
-                print("En passant capture!")
-                self.board[captured_row][captured_col] = None
-        # Executes the move
-        self.board[end[0]][end[1]] = piece
-
-        # Emptys the starting cell
+            en_passant = self.en_passant_target if piece.color == self.current_turn else None
+            return piece.possible_moves(self.board, start, en_passant=en_passant)
+        return piece.possible_moves(self.board, start)
+
+    # Position in each undo_stack entry of the hash key from before the move. An entry is
+    # (start, end, piece, first_move, captured, captured_position, castle, en_passant_target,
+    #  current_turn, hash_key, halfmove_clock, middlegame, endgame, phase)
+    UNDO_HASH = 9
+
+    def make_move(self, start, end, promotion=None):
+        '''
+        Plays a move in place without checking it is legal and pushes what is needed to take it back onto the undo stack.
+        Handles captures, castling, en passant and promotion (to a Queen unless promotion names another piece type).
+        '''
+        if self.compact:
+            return self.make_compact_move(start, end, promotion)
+        piece = self.board[start[0]][start[1]]
+        captured_position = end
+        castle = None
+
+        # En passant captures the pawn beside the start square rather than on the end square
+        if piece.piece_type == 'Pawn' and end == self.en_passant_target and start[1] != end[1]:
+            captured_position = (start[0], end[1])
+        captured = self.board[captured_position[0]][captured_position[1]]
+
+        # Castling also moves the rook next to the king
+        if piece.piece_type == 'King' and abs(end[1] - start[1]) == 2:
+            row = start[0]
+            if end[1] > start[1]:
+                rook_start, rook_end = (row, 7), (row, start[1] + 1)
+            else:
+                rook_start, rook_end = (row, 0), (row, start[1] - 1)
+            rook = self.board[row][rook_start[1]]
+            castle = (rook_start, rook_end, rook, rook.first_move)
+
+        self.undo_stack.append((start, end, piece, getattr(piece, 'first_move', None), captured,
+                                captured_position, castle, self.en_passant_target, self.current_turn,
+                                self.hash_key, self.halfmove_clock, self.middlegame, self.endgame, self.phase))
+
+        self.cached_moves = None
+        self.cached_status = None
+        if piece.piece_type == 'Pawn' or captured is not None:
+            self.halfmove_clock = 0
+        else:
+            self.halfmove_clock += 1
+        if piece.color == 'black':
+            self.fullmove_number += 1
+
+        # Removes the castling rights and en passant parts of the key before they change
+        key = self.hash_key ^ self.castling_en_passant_key()
+        start_square = start[0] * 8 + start[1]
+        end_square = end[0] * 8 + end[1]
+
+        if castle is not None:
+            self.board[row][rook_end[1]] = rook
+            self.board[row][rook_start[1]] = None
+            self.clear_first_move(rook_end)
+            rook_start_square = rook_start[0] * 8 + rook_start[1]
+            rook_end_square = rook_end[0] * 8 + rook_end[1]
+            rook_keys = ZOBRIST_PIECES[rook.color]['Rook']
+            key ^= rook_keys[rook_start_square] ^ rook_keys[rook_end_square]
+            middlegame = MIDDLEGAME_SQUARES[rook.color]['Rook']
+            endgame = ENDGAME_SQUARES[rook.color]['Rook']
+            self.middlegame += middlegame[rook_end_square] - middlegame[rook_start_square]
+            self.endgame += endgame[rook_end_square] - endgame[rook_start_square]
+
+        if captured is not None:
+            self.board[captured_position[0]][captured_position[1]] = None
+            captured_square = captured_position[0] * 8 + captured_position[1]
+            key ^= ZOBRIST_PIECES[captured.color][captured.piece_type][captured_square]
+            self.middlegame -= MIDDLEGAME_SQUARES[captured.color][captured.piece_type][captured_square]
+            self.endgame -= ENDGAME_SQUARES[captured.color][captured.piece_type][captured_square]
+            self.phase -= PHASE_WEIGHTS[captured.piece_type]
+
+        if piece.piece_type == 'Pawn' and end[0] in (0, 7):
+            placed = new_piece(promotion or 'Queen', piece.color)
+            self.phase += PHASE_WEIGHTS[placed.piece_type]
+        else:
+            placed = piece
+        self.board[end[0]][end[1]] = placed
         self.board[start[0]][start[1]] = None
-        piece.history.append((start, end))
-        if hasattr(piece, 'first_move'):
-            piece.first_move = False
+        flags = 0
+        if captured is not None:
+            flags |= MOVE_CAPTURE
+        if castle is not None:
+            flags |= MOVE_CASTLE
+        if captured_position != end:
+            flags |= MOVE_EN_PASSANT
+        if piece.piece_type == 'Pawn' and abs(end[0] - start[0]) == 2:
+            flags |= MOVE_DOUBLE_PUSH
+        self.record_move(encode_move((start, end, placed.piece_type if placed is not piece else None)) | flags, end)
+        key ^= ZOBRIST_PIECES[piece.color][piece.piece_type][start_square]
+        key ^= ZOBRIST_PIECES[placed.color][placed.piece_type][end_square]
+        self.middlegame += (MIDDLEGAME_SQUARES[placed.color][placed.piece_type][end_square]
+                            - MIDDLEGAME_SQUARES[piece.color][piece.piece_type][start_square])
+        self.endgame += (ENDGAME_SQUARES[placed.color][placed.piece_type][end_square]
+                         - ENDGAME_SQUARES[piece.color][piece.piece_type][start_square])
 
         if piece.piece_type == 'Pawn' and abs(end[0] - start[0]) == 2:
-            self.en_passant_target = ((start[0] + end[0] // 2), start[1])
+            self.en_passant_target = ((start[0] + end[0]) // 2, start[1])
         else:
             self.en_passant_target = None
 
-        # The below creates a copy of the board to ensure the the next move does not lead to the king being in check 
-        temp_board = self.copy_board_from(self.board)
-        temp_board[end[0]][end[1]] = piece
-        temp_board[start[0]][start[1]] = None
+        self.current_turn = self.opponent_color(piece.color)
+        self.hash_key = key ^ ZOBRIST_BLACK_TO_MOVE ^ self.castling_en_passant_key()
+
+    def unmake_move(self):
+        '''
+        Takes back the last move played with make_move.
+        '''
+        if self.compact:
+            return self.unmake_compact_move()
+        (start, end, piece, first_move, captured, captured_position,
+         castle, en_passant_target, current_turn, hash_key, halfmove_clock,
+         middlegame, endgame, phase) = self.undo_stack.pop()
+        self.cached_moves = None
+        self.cached_status = None
+
+        self.move_history.pop()
+        if first_move is not None:
+            piece.first_move = first_move
+
+        self.board[end[0]][end[1]] = None
+        self.board[captured_position[0]][captured_position[1]] = captured
+        self.board[start[0]][start[1]] = piece
+
+        if castle is not None:
+            rook_start, rook_end, rook, rook_first_move = castle
+            rook.first_move = rook_first_move
+            self.board[rook_start[0]][rook_start[1]] = rook
+            self.board[rook_end[0]][rook_end[1]] = None
+
+        self.en_passant_target = en_passant_target
+        self.current_turn = current_turn
+        self.hash_key = hash_key
+        self.middlegame, self.endgame, self.phase = middlegame, endgame, phase
+        self.halfmove_clock = halfmove_clock
+        if piece.color == 'black':
+            self.fullmove_number -= 1
+
+    def make_compact_move(self, start, end, promotion=None):
+        '''
+        make_move for the compact board, reading and writing the piece codes in the array directly.
+        The undo entry has the same layout, with square indices and piece codes in place of positions and pieces.
+        '''
+        squares = self.board.squares
+        start_square = start[0] * 8 + start[1]
+        end_square = end[0] * 8 + end[1]
+        code = squares[start_square]
+        sign = 1 if code > 0 else -1
+        piece = CODE_PIECES[code]
+        is_pawn = piece.piece_type == 'Pawn'
+        captured_square = end_square
+        castle = None
+
+        if is_pawn and end == self.en_passant_target and start[1] != end[1]:
+            captured_square = start_square - start[1] + end[1]
+        captured_code = squares[captured_square]
 
+        if piece.piece_type == 'King' and abs(end[1] - start[1]) == 2:
+            if end[1] > start[1]:
+                rook_start, rook_end = start_square - start[1] + 7, start_square + 1
+            else:
+                rook_start, rook_end = start_square - start[1], start_square - 1
+            castle = (rook_start, rook_end, squares[rook_start], None)
 
-        king_pos = self.find_king(temp_board, self.current_turn)
+        self.undo_stack.append((start_square, end_square, code, None, captured_code, captured_square, castle,
+                                self.en_passant_target, self.current_turn, self.hash_key, self.halfmove_clock,
+                                self.middlegame, self.endgame, self.phase))
 
-        opponent = 'black' if self.current_turn == 'white' else 'white'
-        if self.is_square_attacked(temp_board, king_pos, opponent):
-            print('Move not allowed: King would be in check!')
-            return False
+        self.cached_moves = None
+        self.cached_status = None
+        if is_pawn or captured_code:
+            self.halfmove_clock = 0
         else:
+            self.halfmove_clock += 1
+        if sign < 0:
+            self.fullmove_number += 1
+
+        key = self.hash_key ^ self.castling_en_passant_key()
+
+        if castle is not None:
+            squares[rook_end] = sign * ROOK
+            squares[rook_start] = 0
+            rook_keys = ZOBRIST_PIECES[piece.color]['Rook']
+            key ^= rook_keys[rook_start] ^ rook_keys[rook_end]
+            middlegame = MIDDLEGAME_SQUARES[piece.color]['Rook']
+            endgame = ENDGAME_SQUARES[piece.color]['Rook']
+            self.middlegame += middlegame[rook_end] - middlegame[rook_start]
+            self.endgame += endgame[rook_end] - endgame[rook_start]
+
+        if captured_code:
+            squares[captured_square] = 0
+            captured = CODE_PIECES[captured_code]
+            key ^= ZOBRIST_PIECES[captured.color][captured.piece_type][captured_square]
+            self.middlegame -= MIDDLEGAME_SQUARES[captured.color][captured.piece_type][captured_square]
+            self.endgame -= ENDGAME_SQUARES[captured.color][captured.piece_type][captured_square]
+            self.phase -= PHASE_WEIGHTS[captured.piece_type]
+
+        promoted = is_pawn and end[0] in (0, 7)
+        if promoted:
+            placed_code = sign * PIECE_CODES[promotion or 'Queen']
+        else:
+            # The piece has now moved, so its code loses the first move flag
+            placed_code = sign * (code * sign & ~UNMOVED)
+        placed = CODE_PIECES[placed_code]
+        if promoted:
+            self.phase += PHASE_WEIGHTS[placed.piece_type]
+        squares[end_square] = placed_code
+        squares[start_square] = 0
+
+        flags = 0
+        if captured_code:
+            flags |= MOVE_CAPTURE
+        if castle is not None:
+            flags |= MOVE_CASTLE
+        if captured_square != end_square:
+            flags |= MOVE_EN_PASSANT
+        if is_pawn and abs(end[0] - start[0]) == 2:
+            flags |= MOVE_DOUBLE_PUSH
+        self.move_history.append(encode_move((start, end, placed.piece_type if promoted else None)) | flags)
+        key ^= ZOBRIST_PIECES[piece.color][piece.piece_type][start_square]
+        key ^= ZOBRIST_PIECES[placed.color][placed.piece_type][end_square]
+        self.middlegame += (MIDDLEGAME_SQUARES[placed.color][placed.piece_type][end_square]
+                            - MIDDLEGAME_SQUARES[piece.color][piece.piece_type][start_square])
+        self.endgame += (ENDGAME_SQUARES[placed.color][placed.piece_type][end_square]
+                         - ENDGAME_SQUARES[piece.color][piece.piece_type][start_square])
+
+        if is_pawn and abs(end[0] - start[0]) == 2:
+            self.en_passant_target = ((start[0] + end[0]) // 2, start[1])
+        else:
+            self.en_passant_target = None
+
+        self.current_turn = 'white' if sign < 0 else 'black'
+        self.hash_key = key ^ ZOBRIST_BLACK_TO_MOVE ^ self.castling_en_passant_key()
+
+    def unmake_compact_move(self):
+        '''
+        unmake_move for the compact board.
+        '''
+        (start, end, code, _, captured, captured_square,
+         castle, en_passant_target, current_turn, hash_key, halfmove_clock,
+         middlegame, endgame, phase) = self.undo_stack.pop()
+        self.cached_moves = None
+        self.cached_status = None
+        self.move_history.pop()
+
+        squares = self.board.squares
+        squares[end] = 0
+        squares[captured_square] = captured
+        squares[start] = code
+        if castle is not None:
+            rook_start, rook_end, rook, _ = castle
+            squares[rook_start] = rook
+            squares[rook_end] = 0
+
+        self.en_passant_target = en_passant_target
+        self.current_turn = current_turn
+        self.hash_key = hash_key
+        self.middlegame, self.endgame, self.phase = middlegame, endgame, phase
+        self.halfmove_clock = halfmove_clock
+        if code < 0:
+            self.fullmove_number -= 1
+
+    def castling_rights(self, board=None):
+        '''
+        Returns the castling rights as a 4-bit mask of CASTLE_WHITE_KINGSIDE, CASTLE_WHITE_QUEENSIDE,
+        CASTLE_BLACK_KINGSIDE and CASTLE_BLACK_QUEENSIDE. A right is kept while the king and that rook have not moved.
+        '''
+        board = self.board if board is None else board
+        rights = 0
+        if isinstance(board, CompactBoard):
+            squares = board.squares
+            for sign, row, kingside, queenside in ((1, 7, CASTLE_WHITE_KINGSIDE, CASTLE_WHITE_QUEENSIDE),
+                                                   (-1, 0, CASTLE_BLACK_KINGSIDE, CASTLE_BLACK_QUEENSIDE)):
+                if squares[row * 8 + 4] == sign * (KING | UNMOVED):
+                    if squares[row * 8 + 7] == sign * (ROOK | UNMOVED):
+                        rights |= kingside
+                    if squares[row * 8] == sign * (ROOK | UNMOVED):
+                        rights |= queenside
+            return rights
+        for row, kingside, queenside in ((7, CASTLE_WHITE_KINGSIDE, CASTLE_WHITE_QUEENSIDE),
+                                         (0, CASTLE_BLACK_KINGSIDE, CASTLE_BLACK_QUEENSIDE)):
+            king = board[row][4]
+            if king is None or king.piece_type != 'King' or not king.first_move:
+                continue
+            for col, right in ((7, kingside), (0, queenside)):
+                rook = board[row][col]
+                if rook is not None and rook.piece_type == 'Rook' and rook.color == king.color and rook.first_move:
+                    rights |= right
+        return rights
+
+    def castling_en_passant_key(self):
+        '''
+        Returns the part of the Zobrist key for the castling rights and the en passant file.
+        The en passant file only counts when a pawn of the side to move could actually capture there.
+        '''
+        key = ZOBRIST_CASTLING[self.castling_rights()]
+        if self.en_passant_target is not None:
+            row, col = self.en_passant_target
+            # The capturing pawns stand on the same row as the pawn that just moved two squares
+            pawn_row = row + 1 if self.current_turn == 'white' else row - 1
+            if self.compact:
+                sign = 1 if self.current_turn == 'white' else -1
+                squares = self.board.squares
+                for pawn_col in (col - 1, col + 1):
+                    if 0 <= pawn_col < 8 and squares[pawn_row * 8 + pawn_col] * sign & ~UNMOVED == PAWN:
+                        key ^= ZOBRIST_EN_PASSANT[col]
+                        break
+                return key
+            for pawn_col in (col - 1, col + 1):
+                if 0 <= pawn_col < 8:
+                    pawn = self.board[pawn_row][pawn_col]
+                    if pawn is not None and pawn.piece_type == 'Pawn' and pawn.color == self.current_turn:
+                        key ^= ZOBRIST_EN_PASSANT[col]
+                        break
+        return key
+
+    def compute_hash(self):
+        '''
+        Computes the Zobrist key of the position from scratch.
+        Call this after changing the board directly instead of through make_move.
+        '''
+        key = 0
+        for row in range(8):
+            for col in range(8):
+                piece = self.board[row][col]
+                if piece is not None:
+                    key ^= ZOBRIST_PIECES[piece.color][piece.piece_type][row * 8 + col]
+        if self.current_turn == 'black':
+            key ^= ZOBRIST_BLACK_TO_MOVE
+        return key ^ self.castling_en_passant_key()
+
+    def compute_evaluation(self):
+        '''
+        Computes the middlegame and endgame material and piece-square sums and the game phase from scratch,
+        for Chess_Eval.evaluate. Call this after changing the board directly instead of through make_move.
+        '''
+        middlegame = endgame = phase = 0
+        for row in range(8):
+            for col in range(8):
+                piece = self.board[row][col]
+                if piece is not None:
+                    middlegame += MIDDLEGAME_SQUARES[piece.color][piece.piece_type][row * 8 + col]
+                    endgame += ENDGAME_SQUARES[piece.color][piece.piece_type][row * 8 + col]
+                    phase += PHASE_WEIGHTS[piece.piece_type]
+        return middlegame, endgame, phase
+
+    def pseudo_legal_moves(self, color=None):
+        '''
+        Returns every move of color (the side to move by default) as (start, end, promotion) tuples
+        without checking whether it leaves the king in check.
+        '''
+        color = color or self.current_turn
+        if self.compact:
+            return self.compact_pseudo_legal_moves(color)
+        moves = []
+        for row in range(8):
+            for col in range(8):
+                piece = self.board[row][col]
+                if piece is None or piece.color != color:
+                    continue
+                start = (row, col)
+                for end in self.piece_moves(start, piece):
+                    if piece.piece_type == 'Pawn' and end[0] in (0, 7):
+                        for promotion in PROMOTION_TYPES:
+                            moves.append((start, end, promotion))
+                    else:
+                        moves.append((start, end, None))
+        return moves
+
+    def compact_pseudo_legal_moves(self, color):
+        '''
+        pseudo_legal_moves for the compact board, generated from the piece codes by CompactBoard.piece_targets.
+        '''
+        sign = 1 if color == 'white' else -1
+        en_passant = self.compact_en_passant(color)
+        board = self.board
+        moves = []
+        for start, code in enumerate(board.squares):
+            if code * sign <= 0:
+                continue
+            start_position = SQUARE_POSITIONS[start]
+            promoting = code * sign & ~UNMOVED == PAWN
+            for end in board.piece_targets(start, en_passant):
+                if promoting and (end < 8 or end >= 56):
+                    for promotion in PROMOTION_TYPES:
+                        moves.append((start_position, SQUARE_POSITIONS[end], promotion))
+                else:
+                    moves.append((start_position, SQUARE_POSITIONS[end], None))
+        return moves
+
+    def compact_en_passant(self, color):
+        '''
+        Returns the square index a pawn of color can capture en passant onto, or None.
+        '''
+        if self.en_passant_target is None or color != self.current_turn:
+            return None
+        return self.en_passant_target[0] * 8 + self.en_passant_target[1]
+
+    def is_legal(self, move):
+        '''
+        Returns True if a pseudo legal (start, end, promotion) move does not leave the mover's king in check.
+        The move is made and taken back on this board.
+        '''
+        start, end = move[0], move[1]
+        if self.compact:
+            return self.board.is_legal(start[0] * 8 + start[1], end[0] * 8 + end[1], self.compact_en_passant(self.current_turn))
+        piece = self.board[start[0]][start[1]]
+        opponent = self.opponent_color(piece.color)
 
-            # Below executes the move
-            # Places piece on at the destination 
-            self.board[end[0]][end[1]] = piece
+        # The king can not castle out of or through check
+        if piece.piece_type == 'King' and abs(end[1] - start[1]) == 2:
+            crossed = (start[0], (start[1] + end[1]) // 2)
+            if self.is_square_attacked(self.board, start, opponent) or self.is_square_attacked(self.board, crossed, opponent):
+                return False
+
+        self.make_move(start, end)
+        legal = not self.is_square_attacked(self.board, self.find_king(self.board, piece.color), opponent)
+        self.unmake_move()
+        return legal
 
-            # Empty's the starting cell
-            self.board[start[0]][start[1]] = None
+    def generate_legal_moves(self, color=None):
+        '''
+        Yields every legal move of color (the side to move by default) as a (start, end, promotion) tuple.
+        Each candidate is made and taken back on this board to check it does not leave the king in check.
+        '''
+        legal = None
+        previous = None
+        for move in self.pseudo_legal_moves(color):
+            # The promotions of one pawn move share the same legality
+            if move[:2] != previous:
+                previous = move[:2]
+                legal = self.is_legal(move)
+            if legal:
+                yield move
+
+    def in_check(self, color=None):
+        '''
+        Returns True if the king of color (the side to move by default) is attacked.
+        '''
+        color = color or self.current_turn
+        king_pos = self.find_king(self.board, color)
+        return king_pos is not None and self.is_square_attacked(self.board, king_pos, self.opponent_color(color))
 
-            # Updates the piece's history (or other flags such as first move)
-            piece.history.append((start, end))
+    def legal_moves(self, color=None):
+        '''
+        Returns a list of every legal move of color (the side to move by default) as (start, end, promotion) tuples.
+        The moves of the side to move are generated once per position; each call returns a fresh copy of the list.
+        '''
+        color = color or self.current_turn
+        if color != self.current_turn:
+            return self.compute_legal_moves(color)
+        if self.cached_moves is None:
+            self.cached_moves = self.compute_legal_moves(color)
+        return list(self.cached_moves)
+
+    def compute_legal_moves(self, color):
+        '''
+        Generates every legal move of color.
+
+        The checking pieces and pinned pieces are found once, then ordinary moves are filtered with them:
+        in check a move must capture the checker or block the check, and a pinned piece must stay on its pin ray.
+        Only king moves and en passant captures are made on the board to test them.
+        '''
+        color = color or self.current_turn
+        if self.compact:
+            return self.compute_compact_legal_moves(color)
+        king_pos = self.find_king(self.board, color)
+        if king_pos is None:
+            return list(self.generate_legal_moves(color))
+
+        checkers, block, pins = self.checks_and_pins(king_pos, color)
+        moves = []
+        for row in range(8):
+            for col in range(8):
+                piece = self.board[row][col]
+                if piece is None or piece.color != color:
+                    continue
+                start = (row, col)
+                is_king = piece.piece_type == 'King'
+                # In double check only the king can move
+                if len(checkers) > 1 and not is_king:
+                    continue
+                is_pawn = piece.piece_type == 'Pawn'
+                pin = pins.get(start)
+                for end in self.piece_moves(start, piece):
+                    if is_king or is_pawn and end == self.en_passant_target and end[1] != col:
+                        if not self.is_legal((start, end)):
+                            continue
+                    elif block is not None and end not in block or pin is not None and end not in pin:
+                        continue
+
+                    if is_pawn and end[0] in (0, 7):
+                        for promotion in PROMOTION_TYPES:
+                            moves.append((start, end, promotion))
+                    else:
+                        moves.append((start, end, None))
+        return moves
+
+    def compute_compact_legal_moves(self, color):
+        '''
+        compute_legal_moves for the compact board. The same check and pin filtering runs on square indices
+        and piece codes, and king moves and en passant captures are tested on the array without make_move.
+        '''
+        board = self.board
+        squares = board.squares
+        sign = 1 if color == 'white' else -1
+        king = board.find_index(sign * KING)
+        if king is None:
+            return list(self.generate_legal_moves(color))
+
+        checkers, block, pins = board.checks_and_pins(king, sign)
+        en_passant = self.compact_en_passant(color)
+        moves = []
+        for start, code in enumerate(squares):
+            if code * sign <= 0:
+                continue
+            piece_type = code * sign & ~UNMOVED
+            start_position = SQUARE_POSITIONS[start]
+            if piece_type == KING:
+                # The king is lifted off its square so it does not block attacks along its own ray
+                squares[start] = 0
+                for end in board.piece_targets(start, castle=not checkers, code=code):
+                    if abs(end - start) == 2 and board.attacked((start + end) // 2, -sign):
+                        continue
+                    if not board.attacked(end, -sign):
+                        moves.append((start_position, SQUARE_POSITIONS[end], None))
+                squares[start] = code
+                continue
+            # In double check only the king can move
+            if len(checkers) > 1:
+                continue
+            pin = pins.get(start)
+            is_pawn = piece_type == PAWN
+            for end in board.piece_targets(start, en_passant):
+                if is_pawn and end == en_passant:
+                    if not board.is_legal(start, end, en_passant):
+                        continue
+                elif block is not None and end not in block or pin is not None and end not in pin:
+                    continue
+
+                if is_pawn and (end < 8 or end >= 56):
+                    for promotion in PROMOTION_TYPES:
+                        moves.append((start_position, SQUARE_POSITIONS[end], promotion))
+                else:
+                    moves.append((start_position, SQUARE_POSITIONS[end], None))
+        return moves
+
+    def checks_and_pins(self, king_pos, color):
+        '''
+        Looks outward from the king of color for checking and pinning enemy pieces.
+
+        Returns (checkers, block, pins):
+            checkers - positions of the enemy pieces giving check
+            block - set of squares a non-king move must land on to stop a single check
+                    (the checker and the squares between it and the king), or None when not in check
+            pins - {position of a pinned piece: set of squares it may still move to along the pin ray}
+        '''
+        king_row, king_col = king_pos
+        checkers = []
+        block = None
+        pins = {}
+
+        for delta_row, delta_col in QUEEN_DIRECTIONS:
+            sliders = ('Rook', 'Queen') if delta_row == 0 or delta_col == 0 else ('Bishop', 'Queen')
+            ray = set()
+            own = None
+            row, col = king_row + delta_row, king_col + delta_col
+            while 0 <= row < 8 and 0 <= col < 8:
+                ray.add((row, col))
+                piece = self.board[row][col]
+                if piece is not None:
+                    if piece.color == color:
+                        # A second own piece on the ray means nothing is pinned
+                        if own is not None:
+                            break
+                        own = (row, col)
+                    else:
+                        if piece.piece_type in sliders:
+                            if own is None:
+                                checkers.append((row, col))
+                                block = ray
+                            else:
+                                pins[own] = ray
+                        break
+                row += delta_row
+                col += delta_col
+
+        # Knight and pawn checks can only be stopped by capturing the checker
+        pawn_row = king_row + (-1 if color == 'white' else 1)
+        for delta_row, delta_col in KNIGHT_OFFSETS:
+            row, col = king_row + delta_row, king_col + delta_col
+            if 0 <= row < 8 and 0 <= col < 8:
+                piece = self.board[row][col]
+                if piece is not None and piece.color != color and piece.piece_type == 'Knight':
+                    checkers.append((row, col))
+                    block = {(row, col)}
+        for col in (king_col - 1, king_col + 1):
+            if 0 <= pawn_row < 8 and 0 <= col < 8:
+                piece = self.board[pawn_row][col]
+                if piece is not None and piece.color != color and piece.piece_type == 'Pawn':
+                    checkers.append((pawn_row, col))
+                    block = {(pawn_row, col)}
+
+        if len(checkers) > 1:
+            block = set()
+        return checkers, block, pins
+
+    def record_move(self, move, end):
+        '''
+        Adds a packed move to the move history and clears the first move flag of the piece that has just moved to end.
+        '''
+        self.move_history.append(move)
+        self.clear_first_move(end)
+
+    def clear_first_move(self, position):
+        '''
+        Marks the piece on position as having moved.
+        '''
+        if self.compact:
+            # Compact pieces are shared between squares, so the first move flag
+            # is part of the piece code on the square
+            self.board.clear_first_move(position)
+        else:
+            piece = self.board[position[0]][position[1]]
             if hasattr(piece, 'first_move'):
                 piece.first_move = False
 
-            # Checks for checkmate after move
-            if self.is_checkmate(self.board, self.current_turn):
-                print(f"Checkmate! {self.opponent_color(self.current_turn).capitalize()} wins!")
-                return True  # You can add logic to end the game here.
-
-            # Switches turns
-            self.current_turn = 'black' if self.current_turn == 'white' else 'white'
-            return True
-        
     def copy_board_from(self, board):
+        if isinstance(board, CompactBoard):
+            return board.copy()
         new_board = [[board[row][col] for col in range(8)] for row in range(8)]
         return new_board
     
@@ -236,33 +1052,62 @@ class Board:
         '''
         Returns True if the given square is attacled by any piece of attacker_color.
         '''
+        if isinstance(board, CompactBoard):
+            return board.attacked(square[0] * 8 + square[1], 1 if attacker_color == 'white' else -1)
+        return bool(self.square_attackers(board, square, attacker_color, first_only=True))
 
-        for row in range(8):
-            for col in range(8):
-                piece = board[row][col]
-                if piece is not None and piece.color == attacker_color:
-                    # For pawns, the attack moves.
-                    if piece.piece_type == 'Pawn':
-                        # Calculates the pawn attack squares
-                        pawn_attacks = []
-                        for delta in (-1,1):
-                            attack_row = row + piece.direction
-                            attack_col = col + delta
-                            if 0 <= attack_row < 8 and 0 <= attack_col < 8:
-                                pawn_attacks.append((attack_row, attack_col))
-                        if square in pawn_attacks:
-                            return True
-                    else:
-                        # Use the pieces's possible_moves method
-                        moves = piece.possible_moves(board, (row, col))
-                        if square in moves:
-                            return True
-        return False
+    def square_attackers(self, board, square, attacker_color, first_only=False):
+        '''
+        Returns the positions of the pieces of attacker_color that attack square.
+
+        Rather than generating every enemy move, this looks outward from square: knight jumps, king steps,
+        the two pawn diagonals, and the eight sliding rays, each stopping at the first piece it meets.
+        first_only - stop at the first attacker found
+        '''
+        if isinstance(board, CompactBoard):
+            return board.attackers(square, attacker_color, first_only)
+
+        row, col = square
+        index = row * 8 + col
+        attackers = []
+
+        # Pawns of attacker_color that could capture onto square stand one row behind it
+        pawn_row = row + 1 if attacker_color == 'white' else row - 1
+        if 0 <= pawn_row < 8:
+            for pawn_col in (col - 1, col + 1):
+                if 0 <= pawn_col < 8:
+                    piece = board[pawn_row][pawn_col]
+                    if piece is not None and piece.piece_type == 'Pawn' and piece.color == attacker_color:
+                        attackers.append((pawn_row, pawn_col))
+                        if first_only:
+                            return attackers
+
+        for targets, piece_type in ((KNIGHT_TARGETS[index], 'Knight'), (KING_TARGETS[index], 'King')):
+            for target_row, target_col in targets:
+                piece = board[target_row][target_col]
+                if piece is not None and piece.piece_type == piece_type and piece.color == attacker_color:
+                    attackers.append((target_row, target_col))
+                    if first_only:
+                        return attackers
+
+        for direction, ray in enumerate(RAYS[index]):
+            sliders = ('Rook', 'Queen') if direction < 4 else ('Bishop', 'Queen')
+            for ray_row, ray_col in ray:
+                piece = board[ray_row][ray_col]
+                if piece is not None:
+                    if piece.color == attacker_color and piece.piece_type in sliders:
+                        attackers.append((ray_row, ray_col))
+                        if first_only:
+                            return attackers
+                    break
+        return attackers
     
     def find_king(self, board, color):
         '''
         Finds and returns the position (row, col) of the king of the given color.
         '''
+        if isinstance(board, CompactBoard):
+            return board.find_code(KING if color == 'white' else -KING)
         for row in range(8):
             for col in range(8):
                 piece = board[row][col]
@@ -274,30 +1119,95 @@ class Board:
         """
         Check if making a move from start to end would leave the current_turn's king in check.
         """ 
-        # Creates a deep copy of the board
-        temp_board = self.copy_board()
-        piece = temp_board[start[0]][start[1]]
-        temp_board[end[0]][end[1]] = piece
-        temp_board[start[0]][start[1]] = None
-        king_pos = self.find_king(temp_board, current_turn)
+        # Plays the move on this board and takes it back afterwards
+        self.make_move(start, end)
+        king_pos = self.find_king(self.board, current_turn)
         # Determines the opponent's color
         attacker_color = 'black' if current_turn == 'white' else 'white'
-        return not self.is_square_attacked(temp_board, king_pos, attacker_color) 
+        valid = not self.is_square_attacked(self.board, king_pos, attacker_color)
+        self.unmake_move()
+        return valid
     
     def copy_board(self):
         """
         Creates a deep copy of the board state.
         """
+        if self.compact:
+            return self.board.copy()
         new_board = [[self.board[row][col] for col in range(8)] for row in range(8)]
         return new_board
     
+    def status(self):
+        '''
+        Returns the state of the game in the current position: ONGOING, CHECKMATE, STALEMATE, or the draw
+        reason FIFTY_MOVES, REPETITION or INSUFFICIENT_MATERIAL. It is worked out once per position and kept
+        until the next move.
+        '''
+        if self.cached_status is None:
+            if not self.legal_moves():
+                self.cached_status = CHECKMATE if self.in_check() else STALEMATE
+            elif self.insufficient_material():
+                self.cached_status = INSUFFICIENT_MATERIAL
+            elif self.halfmove_clock >= 100:
+                self.cached_status = FIFTY_MOVES
+            elif self.repetitions() >= 3:
+                self.cached_status = REPETITION
+            else:
+                self.cached_status = ONGOING
+        return self.cached_status
+
+    def winner(self):
+        '''
+        Returns the color that won, or None while the game goes on or when it is drawn.
+        '''
+        return self.opponent_color(self.current_turn) if self.status() == CHECKMATE else None
+
+    def repetitions(self):
+        '''
+        Returns how many times the current position has occurred, counting this time.
+        undo_stack holds the hash key from before each move, so the position k plies ago is undo_stack[-k][UNDO_HASH].
+        Only positions since the last capture or pawn move can repeat.
+        '''
+        count = 1
+        stack = self.undo_stack
+        for plies_ago in range(4, min(self.halfmove_clock, len(stack)) + 1, 2):
+            if stack[-plies_ago][self.UNDO_HASH] == self.hash_key:
+                count += 1
+        return count
+
+    def insufficient_material(self):
+        '''
+        Returns True if neither side can checkmate: king against king, against king and one minor piece,
+        or king and bishop against king and bishop with the bishops on squares of the same color.
+        '''
+        # A rook, a queen or three minor pieces add up to a phase above 2
+        if self.phase > 2:
+            return False
+        minors = []
+        for row in range(8):
+            for col in range(8):
+                piece = self.board[row][col]
+                if piece is None or piece.piece_type == 'King':
+                    continue
+                if piece.piece_type not in ('Knight', 'Bishop'):
+                    return False
+                minors.append((piece, (row + col) % 2))
+        if len(minors) <= 1:
+            return True
+        (first, first_shade), (second, second_shade) = minors
+        return (first.piece_type == second.piece_type == 'Bishop' and first.color != second.color
+                and first_shade == second_shade)
+
     def is_checkmate(self, board, current_color):
         """
         Returns True if the current player (current_color) is checkmated.
-        board: the current board state.
+        board: the current board state (the squares of this Board).
         current_color: 'white' or 'black'.
         """
 
+        if board is self.board and current_color == self.current_turn:
+            return self.status() == CHECKMATE
+
         # Finds the kings position 
         king_pos = self.find_king(board, current_color)
         if king_pos is None:
@@ -309,64 +1219,298 @@ class Board:
         if not self.is_square_attacked(board, king_pos, opponent_color):
             return False
         
-        # Generates all legal moves for a player.
-        legal_moves_found = False
-        for row in range(8):
-            for col in range(8):
-                piece = board[row][col]
-                if piece is not None and piece.color == current_color:
-                    moves = piece.possible_moves(board, (row, col))
-                    for move in moves:
-                        # Creates a copy of the board and simulates moves
-                        temp_board = self.copy_board_from(self.board)
-                        self.simulate_move(temp_board, (row, col), move) 
-
-                        # Finds king new position if it has moved
-                        new_king_pos = self.find_king(temp_board, current_color)
-
-                        # If the king is not attacked in the simulation, then a legal move exisit 
-                        if not self.is_square_attacked(temp_board, new_king_pos, opponent_color):
-                            legal_moves_found = True
-                            break
-                    if legal_moves_found:
-                        break
-            if legal_moves_found:
-                break
-        # If no legal moves saves the king, then its checkmate 
-        return not legal_moves_found
+        # If any legal move exists the king can escape the check
+        return not self.legal_moves(current_color)
 
 
     def simulate_move(self, board, start, end):
         """
         Execute a move on the given board (which is a copy) for simulation purposes.
         This should move the piece from start to end and update the board accordingly.
+        Returns the Zobrist key of the simulated position, updated from this board's hash_key.
         """
         piece = board[start[0]][start[1]]
+        captured = board[end[0]][end[1]]
+        rights = self.castling_rights(board)
+
+        key = self.hash_key ^ self.castling_en_passant_key() ^ ZOBRIST_BLACK_TO_MOVE
+        key ^= ZOBRIST_PIECES[piece.color][piece.piece_type][start[0] * 8 + start[1]]
+        key ^= ZOBRIST_PIECES[piece.color][piece.piece_type][end[0] * 8 + end[1]]
+        if captured is not None:
+            key ^= ZOBRIST_PIECES[captured.color][captured.piece_type][end[0] * 8 + end[1]]
+
         board[end[0]][end[1]] = piece
         board[start[0]][start[1]] = None
 
+        # A simulated king or rook move gives up castling, even though the piece keeps its first move flag
+        if piece.piece_type in ('King', 'Rook') or captured is not None and captured.piece_type == 'Rook':
+            for right, squares in CASTLING_SQUARES.items():
+                if start in squares or end in squares:
+                    rights &= ~right
+
         if piece.piece_type == 'King':
             self.king_positions[piece.color] = end
+        return key ^ ZOBRIST_CASTLING[rights]
+
+
+# Directions a queen slides in (rook directions first, then bishop directions) and a knight's jumps
+QUEEN_DIRECTIONS = ((-1, 0), (1, 0), (0, -1), (0, 1), (-1, -1), (-1, 1), (1, -1), (1, 1))
+KNIGHT_OFFSETS = ((2, 1), (2, -1), (-2, 1), (-2, -1), (1, 2), (1, -2), (-1, 2), (-1, -2))
+
+
+def _ray(row, col, delta_row, delta_col):
+    squares = []
+    row, col = row + delta_row, col + delta_col
+    while 0 <= row < 8 and 0 <= col < 8:
+        squares.append((row, col))
+        row, col = row + delta_row, col + delta_col
+    return tuple(squares)
+
+
+def _steps(row, col, offsets):
+    return tuple((row + delta_row, col + delta_col) for delta_row, delta_col in offsets
+                 if 0 <= row + delta_row < 8 and 0 <= col + delta_col < 8)
+
+
+# Precomputed squares around every square (indexed by row * 8 + col) for attack detection:
+# the eight sliding rays in QUEEN_DIRECTIONS order, and the knight and king steps.
+RAYS = [tuple(_ray(index // 8, index % 8, delta_row, delta_col) for delta_row, delta_col in QUEEN_DIRECTIONS)
+        for index in range(64)]
+KNIGHT_TARGETS = [_steps(index // 8, index % 8, KNIGHT_OFFSETS) for index in range(64)]
+KING_TARGETS = [_steps(index // 8, index % 8, QUEEN_DIRECTIONS) for index in range(64)]
+
+# The same tables as flat square indices, for the compact board
+RAY_INDICES = [tuple(tuple(row * 8 + col for row, col in ray) for ray in rays) for rays in RAYS]
+KNIGHT_TARGET_INDICES = [tuple(row * 8 + col for row, col in targets) for targets in KNIGHT_TARGETS]
+KING_TARGET_INDICES = [tuple(row * 8 + col for row, col in targets) for targets in KING_TARGETS]
+
+# Piece types a pawn can promote to
+PROMOTION_TYPES = ('Queen', 'Rook', 'Bishop', 'Knight')
+
+
+def encode_move(move):
+    '''
+    Packs a (start, end, promotion) move into 16 bits: 6 bits start square, 6 bits end square
+    and 3 bits promotion (0 for none). A move never starts and ends on a8, so 0 can stand for no move.
+    '''
+    start, end, promotion = move
+    code = (start[0] * 8 + start[1]) | (end[0] * 8 + end[1]) << 6
+    if promotion is not None:
+        code |= (PROMOTION_TYPES.index(promotion) + 1) << 12
+    return code
+
+
+def decode_move(code):
+    '''
+    Unpacks a move made by encode_move (with or without MOVE_* flags) back into a (start, end, promotion) tuple.
+    '''
+    promotion = code >> 12 & 7
+    return (SQUARE_POSITIONS[code & 63], SQUARE_POSITIONS[code >> 6 & 63],
+            PROMOTION_TYPES[promotion - 1] if promotion else None)
+
+
+# Flags make_move adds above the 16 bits of encode_move for the moves in Board.move_history
+MOVE_CAPTURE = 1 << 16
+MOVE_CASTLE = 1 << 17
+MOVE_EN_PASSANT = 1 << 18
+MOVE_DOUBLE_PUSH = 1 << 19
+
+# One shared (row, col) tuple per square index
+SQUARE_POSITIONS = [(square // 8, square % 8) for square in range(64)]
+
+
+# Letters used for promotions in coordinate notation such as 'e7e8q'
+PROMOTION_LETTERS = {'Queen': 'q', 'Rook': 'r', 'Bishop': 'b', 'Knight': 'n'}
+
+
+def move_to_uci(move):
+    '''
+    Formats a (start, end, promotion) move in coordinate notation, e.g. 'e2e4' or 'e7e8q'.
+    '''
+    start, end, promotion = move
+    text = 'abcdefgh'[start[1]] + str(8 - start[0]) + 'abcdefgh'[end[1]] + str(8 - end[0])
+    return text + PROMOTION_LETTERS[promotion] if promotion else text
+
+
+def move_from_uci(text):
+    '''
+    Parses coordinate notation such as 'e2e4' or 'e7e8q' into a (start, end, promotion) move.
+    '''
+    start = (8 - int(text[1]), 'abcdefgh'.index(text[0]))
+    end = (8 - int(text[3]), 'abcdefgh'.index(text[2]))
+    promotion = None
+    if len(text) > 4:
+        promotion = {letter: piece_type for piece_type, letter in PROMOTION_LETTERS.items()}[text[4].lower()]
+    return (start, end, promotion)
+
+
+def move_to_san(board, move):
+    '''
+    Formats a legal move for the side to move on board in standard algebraic notation, e.g. 'Nbd7', 'exd5', 'e8=Q+' or 'O-O'.
+    '''
+    start, end, promotion = move
+    piece = board.board[start[0]][start[1]]
+    square = 'abcdefgh'[end[1]] + str(8 - end[0])
+    if piece.piece_type == 'King' and abs(end[1] - start[1]) == 2:
+        text = 'O-O' if end[1] > start[1] else 'O-O-O'
+    elif piece.piece_type == 'Pawn':
+        text = square
+        if start[1] != end[1]:
+            text = 'abcdefgh'[start[1]] + 'x' + square
+        if end[0] in (0, 7):
+            text += '=' + FEN_LETTERS[promotion or 'Queen'].upper()
+    else:
+        # Names the start file, rank or both when another piece of the same type can reach the same square
+        others = [other_start for other_start, other_end, _ in board.legal_moves()
+                  if other_end == end and other_start != start
+                  and board.board[other_start[0]][other_start[1]].piece_type == piece.piece_type]
+        text = FEN_LETTERS[piece.piece_type].upper()
+        if others:
+            if all(other[1] != start[1] for other in others):
+                text += 'abcdefgh'[start[1]]
+            elif all(other[0] != start[0] for other in others):
+                text += str(8 - start[0])
+            else:
+                text += 'abcdefgh'[start[1]] + str(8 - start[0])
+        if board.board[end[0]][end[1]] is not None:
+            text += 'x'
+        text += square
+
+    board.make_move(start, end, promotion)
+    if board.in_check():
+        text += '#' if not board.legal_moves() else '+'
+    board.unmake_move()
+    return text
+
+
+def move_from_san(board, text):
+    '''
+    Parses a move in standard algebraic notation (such as 'Nf3', 'exd5', 'e8=Q' or 'O-O') for the side to move on board.
+    Check marks and annotations are optional. Returns the (start, end, promotion) move, or None if no legal move matches.
+    '''
+    text = text.rstrip('+#!?').replace('0', 'O')
+    moves = board.legal_moves()
+    # Only the moves to the named square are formatted, except for castling, which names no square
+    square = text.split('=')[0][-2:]
+    if not text.startswith('O') and len(square) == 2 and square[0] in 'abcdefgh' and square[1] in '12345678':
+        end = (8 - int(square[1]), 'abcdefgh'.index(square[0]))
+        moves = [move for move in moves if move[1] == end]
+    for move in moves:
+        if move_to_san(board, move).rstrip('+#') == text:
+            return move
+    return None
+
+
+# Letters for each piece type in FEN (upper case for white)
+FEN_LETTERS = {'Pawn': 'p', 'Knight': 'n', 'Bishop': 'b', 'Rook': 'r', 'Queen': 'q', 'King': 'k'}
+
+
+def read_epd(source, compact=False):
+    '''
+    Lazily yields (board, operations) for every position in an EPD (or FEN per line) file.
+
+    source - a path, or any iterable of lines such as an open file
+    operations - dict of the EPD operations after the four position fields, e.g. {'bm': 'Nf3', 'id': 'test 1'}
+    Lines are read one at a time, so files of any length use constant memory. Blank lines and lines starting
+    with '#' are skipped.
+    '''
+    if isinstance(source, str):
+        with open(source) as lines:
+            yield from read_epd(lines, compact)
+        return
+
+    for line in source:
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+        fields = line.split(None, 4)
+        operations = {}
+        rest = fields[4] if len(fields) > 4 else ''
+        fen = ' '.join(fields[:4])
+        # Plain FEN lines end with the halfmove clock and fullmove number instead of operations
+        counters = rest.split()
+        if len(counters) == 2 and all(counter.isdigit() for counter in counters):
+            fen += ' ' + rest
+        else:
+            for operation in rest.split(';'):
+                operation = operation.strip()
+                if operation:
+                    opcode, _, operand = operation.partition(' ')
+                    operations[opcode] = operand.strip().strip('"')
+        board = Board.from_fen(fen, compact)
+        if operations.get('hmvc', '').isdigit():
+            board.halfmove_clock = int(operations['hmvc'])
+        if operations.get('fmvn', '').isdigit():
+            board.fullmove_number = int(operations['fmvn'])
+        yield board, operations
+
+
+# Results of Board.status()
+ONGOING = 'ongoing'
+CHECKMATE = 'checkmate'
+STALEMATE = 'stalemate'
+FIFTY_MOVES = 'fifty-move rule'
+REPETITION = 'threefold repetition'
+INSUFFICIENT_MATERIAL = 'insufficient material'
+
+# Castling rights bits and the king and rook squares each one depends on
+CASTLE_WHITE_KINGSIDE, CASTLE_WHITE_QUEENSIDE, CASTLE_BLACK_KINGSIDE, CASTLE_BLACK_QUEENSIDE = 1, 2, 4, 8
+CASTLING_SQUARES = {
+    CASTLE_WHITE_KINGSIDE: ((7, 4), (7, 7)),
+    CASTLE_WHITE_QUEENSIDE: ((7, 4), (7, 0)),
+    CASTLE_BLACK_KINGSIDE: ((0, 4), (0, 7)),
+    CASTLE_BLACK_QUEENSIDE: ((0, 4), (0, 0)),
+}
+
+# Zobrist keys. A fixed seed keeps hash keys the same between runs and processes.
+_zobrist_random = random.Random(0x5EED)
+ZOBRIST_PIECES = {
+    color: {piece_type: [_zobrist_random.getrandbits(64) for _ in range(64)]
+            for piece_type in ('Pawn', 'Knight', 'Bishop', 'Rook', 'Queen', 'King')}
+    for color in ('white', 'black')
+}
+ZOBRIST_BLACK_TO_MOVE = _zobrist_random.getrandbits(64)
+ZOBRIST_EN_PASSANT = [_zobrist_random.getrandbits(64) for _ in range(8)]
+ZOBRIST_CASTLING = [0] * 16
+for _right in (CASTLE_WHITE_KINGSIDE, CASTLE_WHITE_QUEENSIDE, CASTLE_BLACK_KINGSIDE, CASTLE_BLACK_QUEENSIDE):
+    _key = _zobrist_random.getrandbits(64)
+    for _rights in range(16):
+        if _rights & _right:
+            ZOBRIST_CASTLING[_rights] ^= _key
+
+
+def new_piece(piece_type, color):
+    '''
+    Creates a piece that has already moved, such as a pawn's promotion.
+    '''
+    if piece_type == 'Pawn':
+        return Pawn(color, direction=-1 if color == 'white' else 1, first_move=False)
+    if piece_type in ('Rook', 'King'):
+        return {'Rook': Rook, 'King': King}[piece_type](color, first_move=False)
+    return {'Queen': Queen, 'Bishop': Bishop, 'Knight': Knight}[piece_type](color)
 
 
 class Piece:
-    def __init__(self, piece_type, color, history=None):
+    # Pieces only hold these attributes, with no per-instance __dict__; moves are recorded once in Board.move_history
+    __slots__ = ('piece_type', 'color')
+
+    def __init__(self, piece_type, color):
         '''
         Initaliase a chess piece
 
         piece_type - Type of chess piece (e.g., 'King', 'Queen', 'Rook', etc.)
         color - White or Black
-        history - list of moves made by the piece 
         '''
 
         self.piece_type = piece_type
         self.color = color.lower()
-        self.history = history if history is not None else []
 
 
 class Pawn(Piece):
+    __slots__ = ('direction', 'first_move')
+
     def __init__(self, color, direction, first_move=True):
-        super().__init__(piece_type='Pawn', color=color, history=[])
+        super().__init__(piece_type='Pawn', color=color)
         self.direction = direction # 1 or -1 based on board position 
         self.first_move = first_move
 
@@ -419,6 +1563,8 @@ class Pawn(Piece):
         return moves
 
 class King(Piece):
+    __slots__ = ('first_move',)
+
     def __init__(self, color, first_move=True):
         super().__init__(piece_type='King', color=color)
         self.first_move = first_move
@@ -473,19 +1619,21 @@ class King(Piece):
             if col + 2 < 8 and board[row][col+1] is None and board[row][col+2] is None:
                 # Check that the rook on the kingside exists and hasn't moved.
                 rook = board[row][7]
-                if rook is not None and rook.piece_type == 'Rook' and rook.first_move:
+                if rook is not None and rook.piece_type == 'Rook' and rook.color == self.color and rook.first_move:
                     moves.append((row, col+2))
             # --- Queenside Castling ---
             # For queenside castling, squares (row, col-1), (row, col-2) and (row, col-3) must be empty.
             if col - 3 >= 0 and board[row][col-1] is None and board[row][col-2] is None and board[row][col-3] is None:
                 # Check that the rook on the queenside exists and hasn't moved.
                 rook = board[row][0]
-                if rook is not None and rook.piece_type == 'Rook' and rook.first_move:
+                if rook is not None and rook.piece_type == 'Rook' and rook.color == self.color and rook.first_move:
                     moves.append((row, col-2))
                     
         return moves
 
 class Queen(Piece):
+    __slots__ = ()
+
     def __init__(self, color):
         super().__init__(piece_type = 'Queen', color = color)
     
@@ -543,6 +1691,8 @@ class Queen(Piece):
         return moves
 
 class Bishop(Piece):
+    __slots__ = ()
+
     def __init__(self, color):
         super().__init__(piece_type = 'Bishop', color = color)
         """
@@ -589,6 +1739,8 @@ class Bishop(Piece):
         return moves
                     
 class Rook(Piece):
+    __slots__ = ('first_move',)
+
     def __init__(self, color, first_move=True):
         super().__init__(piece_type='Rook', color=color)
         self.first_move = first_move
@@ -623,6 +1775,8 @@ class Rook(Piece):
 
 
 class Knight(Piece):
+    __slots__ = ()
+
     def __init__(self, color):
         super().__init__(piece_type='Knight', color=color)
 
@@ -644,7 +1798,385 @@ class Knight(Piece):
 
         return moves
 
+# Integer piece codes used by the compact board.
+# White pieces are positive, black pieces are negative and 0 is an empty square.
+PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING = 1, 2, 3, 4, 5, 6
+
+# Added to the code of a pawn, rook or king that has not moved yet
+UNMOVED = 8
+
+PIECE_CODES = {
+    'Pawn' : PAWN,
+    'Knight' : KNIGHT,
+    'Bishop' : BISHOP,
+    'Rook' : ROOK,
+    'Queen' : QUEEN,
+    'King' : KING,
+}
+
+# Piece code of each FEN letter
+FEN_CODES = {FEN_LETTERS[piece_type]: code for piece_type, code in PIECE_CODES.items()}
+
+
+def piece_to_code(piece):
+    '''
+    Returns the integer code of a piece (0 for an empty square).
+    '''
+    if piece is None:
+        return 0
+    code = PIECE_CODES[piece.piece_type]
+    if getattr(piece, 'first_move', False):
+        code |= UNMOVED
+    return code if piece.color == 'white' else -code
+
+
+def _make_piece(code):
+    '''
+    Builds the piece object that represents the given non-zero code.
+    '''
+    color = 'white' if code > 0 else 'black'
+    piece_type = abs(code) & ~UNMOVED
+    first_move = bool(abs(code) & UNMOVED)
+    if piece_type == PAWN:
+        return Pawn(color, direction=-1 if color == 'white' else 1, first_move=first_move)
+    if piece_type == ROOK:
+        return Rook(color, first_move=first_move)
+    if piece_type == KING:
+        return King(color, first_move=first_move)
+    return {KNIGHT: Knight, BISHOP: Bishop, QUEEN: Queen}[piece_type](color)
+
+
+# One shared piece object per code. The list is indexed directly by the code,
+# so negative (black) codes use Python's negative indexing from the end.
+CODE_PIECES = [None] * 32
+for _code in range(1, 16):
+    if (_code & ~UNMOVED) in PIECE_CODES.values():
+        CODE_PIECES[_code] = _make_piece(_code)
+        CODE_PIECES[-_code] = _make_piece(-_code)
+
+
+class CompactBoard:
+    '''
+    An 8x8 board stored as a flat array of 64 signed byte piece codes.
+
+    Indexing with board[row][col] returns the shared piece object for the code on that square,
+    and assigning a piece object stores its code, so the piece classes work on it unchanged.
+    '''
+    __slots__ = ('squares',)
+
+    def __init__(self, squares=None):
+        self.squares = array('b', bytes(64)) if squares is None else array('b', squares)
+
+    def __getitem__(self, row):
+        return CompactRow(self.squares, row * 8)
+
+    def __len__(self):
+        return 8
+
+    def __iter__(self):
+        for row in range(8):
+            yield CompactRow(self.squares, row * 8)
+
+    def copy(self):
+        return CompactBoard(self.squares)
+
+    def find_code(self, code):
+        '''
+        Returns the position (row, col) of the first square holding code, ignoring the first move flag.
+        '''
+        for value in (code, code + UNMOVED if code > 0 else code - UNMOVED):
+            if value in self.squares:
+                index = self.squares.index(value)
+                return (index // 8, index % 8)
+        return None
+
+    def find_index(self, code):
+        '''
+        Returns the index of the first square holding code, ignoring the first move flag.
+        '''
+        squares = self.squares
+        if code in squares:
+            return squares.index(code)
+        code += UNMOVED if code > 0 else -UNMOVED
+        return squares.index(code) if code in squares else None
+
+    def is_attacked(self, square, attacker_color):
+        '''
+        Returns True if square is attacked by any piece of attacker_color.
+        '''
+        return self.attacked(square[0] * 8 + square[1], 1 if attacker_color == 'white' else -1)
+
+    def attacked(self, index, sign):
+        '''
+        Returns True if the square index is attacked by the side sign (1 for white, -1 for black).
+        The same outward search as attackers, without building positions.
+        '''
+        squares = self.squares
+        col = index & 7
+        pawn = index + 8 * sign
+        if 0 <= pawn < 64:
+            if col > 0 and squares[pawn - 1] * sign & ~UNMOVED == PAWN:
+                return True
+            if col < 7 and squares[pawn + 1] * sign & ~UNMOVED == PAWN:
+                return True
+        for target in KNIGHT_TARGET_INDICES[index]:
+            if squares[target] * sign == KNIGHT:
+                return True
+        for target in KING_TARGET_INDICES[index]:
+            if squares[target] * sign & ~UNMOVED == KING:
+                return True
+        rays = RAY_INDICES[index]
+        for direction in range(8):
+            slider = ROOK if direction < 4 else BISHOP
+            for target in rays[direction]:
+                code = squares[target]
+                if code:
+                    code = code * sign & ~UNMOVED
+                    if code == slider or code == QUEEN:
+                        return True
+                    break
+        return False
+
+    def piece_targets(self, index, en_passant=None, castle=True, code=None):
+        '''
+        Returns the square indices the piece on index can move to, the same moves as the piece classes'
+        possible_moves but read straight from the codes. These moves may still leave the king in check.
+        en_passant - index of the square a pawn may capture en passant onto, or None
+        code - the piece code, when it has been lifted off the board
+        '''
+        squares = self.squares
+        if code is None:
+            code = squares[index]
+        sign = 1 if code > 0 else -1
+        piece_type = code * sign & ~UNMOVED
+        targets = []
+
+        if piece_type == PAWN:
+            # White pawns move towards row 0
+            forward = index - 8 * sign
+            if 0 <= forward < 64:
+                if not squares[forward]:
+                    targets.append(forward)
+                    double = forward - 8 * sign
+                    if code * sign & UNMOVED and 0 <= double < 64 and not squares[double]:
+                        targets.append(double)
+                col = index & 7
+                if col > 0 and (squares[forward - 1] * sign < 0 or forward - 1 == en_passant):
+                    targets.append(forward - 1)
+                if col < 7 and (squares[forward + 1] * sign < 0 or forward + 1 == en_passant):
+                    targets.append(forward + 1)
+            return targets
+
+        if piece_type == KNIGHT or piece_type == KING:
+            for target in (KNIGHT_TARGET_INDICES if piece_type == KNIGHT else KING_TARGET_INDICES)[index]:
+                if squares[target] * sign <= 0:
+                    targets.append(target)
+            if piece_type == KING and castle and code * sign & UNMOVED:
+                col = index & 7
+                if (col + 2 < 8 and not squares[index + 1] and not squares[index + 2]
+                        and squares[index - col + 7] == sign * (ROOK | UNMOVED)):
+                    targets.append(index + 2)
+                if (col - 3 >= 0 and not squares[index - 1] and not squares[index - 2] and not squares[index - 3]
+                        and squares[index - col] == sign * (ROOK | UNMOVED)):
+                    targets.append(index - 2)
+            return targets
+
+        rays = RAY_INDICES[index]
+        directions = range(4) if piece_type == ROOK else range(4, 8) if piece_type == BISHOP else range(8)
+        for direction in directions:
+            for target in rays[direction]:
+                other = squares[target] * sign
+                if other <= 0:
+                    targets.append(target)
+                if other:
+                    break
+        return targets
+
+    def is_legal(self, start, end, en_passant=None):
+        '''
+        Returns True if the pseudo legal move from index start to index end does not leave the mover's king in check.
+        The move is tried on the array and taken back; castling also may not start in or pass through check.
+        '''
+        squares = self.squares
+        code = squares[start]
+        sign = 1 if code > 0 else -1
+        piece_type = code * sign & ~UNMOVED
+        if piece_type == KING and abs(end - start) == 2:
+            if self.attacked(start, -sign) or self.attacked((start + end) // 2, -sign):
+                return False
+        captured_square = end
+        if piece_type == PAWN and end == en_passant and (end - start) & 7:
+            captured_square = start - (start & 7) + (end & 7)
+        captured = squares[captured_square]
+        squares[captured_square] = 0
+        squares[end] = code
+        squares[start] = 0
+        king = end if piece_type == KING else self.find_index(sign * KING)
+        legal = not self.attacked(king, -sign)
+        squares[start] = code
+        squares[end] = 0
+        squares[captured_square] = captured
+        return legal
+
+    def checks_and_pins(self, king, sign):
+        '''
+        Board.checks_and_pins on square indices for the king on index king of the side sign.
+        Returns (checkers, block, pins) with square indices in place of positions.
+        '''
+        squares = self.squares
+        checkers = []
+        block = None
+        pins = {}
+
+        for direction, ray in enumerate(RAY_INDICES[king]):
+            slider = ROOK if direction < 4 else BISHOP
+            own = None
+            for step, target in enumerate(ray):
+                code = squares[target] * sign
+                if code:
+                    if code > 0:
+                        # A second own piece on the ray means nothing is pinned
+                        if own is not None:
+                            break
+                        own = target
+                    else:
+                        code = -code & ~UNMOVED
+                        if code == slider or code == QUEEN:
+                            if own is None:
+                                checkers.append(target)
+                                block = set(ray[:step + 1])
+                            else:
+                                pins[own] = set(ray[:step + 1])
+                        break
+
+        # Knight and pawn checks can only be stopped by capturing the checker
+        for target in KNIGHT_TARGET_INDICES[king]:
+            if squares[target] * sign == -KNIGHT:
+                checkers.append(target)
+                block = {target}
+        pawn = king - 8 * sign
+        col = king & 7
+        if 0 <= pawn < 64:
+            for target, on_board in ((pawn - 1, col > 0), (pawn + 1, col < 7)):
+                if on_board and -squares[target] * sign & ~UNMOVED == PAWN:
+                    checkers.append(target)
+                    block = {target}
+
+        if len(checkers) > 1:
+            block = set()
+        return checkers, block, pins
+
+    def attackers(self, square, attacker_color, first_only=False):
+        '''
+        Returns the positions of the pieces of attacker_color that attack square,
+        looking outward from square over the piece codes (see Board.square_attackers).
+        '''
+        row, col = square
+        index = row * 8 + col
+        sign = 1 if attacker_color == 'white' else -1
+        squares = self.squares
+        found = []
+
+        pawn_row = row + sign
+        if 0 <= pawn_row < 8:
+            for pawn_col in (col - 1, col + 1):
+                if 0 <= pawn_col < 8:
+                    code = squares[pawn_row * 8 + pawn_col] * sign
+                    if code > 0 and code & ~UNMOVED == PAWN:
+                        found.append((pawn_row, pawn_col))
+                        if first_only:
+                            return found
+
+        for targets, piece_type in ((KNIGHT_TARGET_INDICES[index], KNIGHT), (KING_TARGET_INDICES[index], KING)):
+            for target in targets:
+                code = squares[target] * sign
+                if code > 0 and code & ~UNMOVED == piece_type:
+                    found.append((target // 8, target % 8))
+                    if first_only:
+                        return found
+
+        for direction, ray in enumerate(RAY_INDICES[index]):
+            slider = ROOK if direction < 4 else BISHOP
+            for target in ray:
+                code = squares[target]
+                if code:
+                    code *= sign
+                    if code > 0 and (code & ~UNMOVED) in (slider, QUEEN):
+                        found.append((target // 8, target % 8))
+                        if first_only:
+                            return found
+                    break
+        return found
+
+    def clear_first_move(self, position):
+        row, col = position
+        index = row * 8 + col
+        code = self.squares[index]
+        if code > 0:
+            self.squares[index] = code & ~UNMOVED
+        elif code < 0:
+            self.squares[index] = -(-code & ~UNMOVED)
+
+
+class CompactRow:
+    '''
+    A view of one row of a CompactBoard.
+    '''
+    __slots__ = ('squares', 'offset')
+
+    def __init__(self, squares, offset):
+        self.squares = squares
+        self.offset = offset
+
+    def __getitem__(self, col):
+        return CODE_PIECES[self.squares[self.offset + col]]
+
+    def __setitem__(self, col, piece):
+        self.squares[self.offset + col] = piece_to_code(piece)
+
+    def __len__(self):
+        return 8
+
+    def __iter__(self):
+        for col in range(8):
+            yield CODE_PIECES[self.squares[self.offset + col]]
+
+
 if __name__ == '__main__':
-    game = Game()
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Play chess in the terminal.')
+    parser.add_argument('--engine', choices=['white', 'black'], help='let the engine play this color')
+    parser.add_argument('--search', default='mcts', choices=['mcts', 'alphabeta'], help='which engine to play against')
+    parser.add_argument('--playouts', type=int, help='playouts (or alpha-beta nodes) per engine move')
+    parser.add_argument('--movetime', type=int, help='milliseconds per engine move')
+    parser.add_argument('--depth', type=int, help='deepest alpha-beta iteration')
+    parser.add_argument('--ponder', action='store_true', help='let the MCTS engine think on your time')
+    parser.add_argument('--book', help='opening book file built by Chess_Book.py')
+    parser.add_argument('--tablebases', help='folder of endgame tables generated by Chess_Tablebase.py')
+    args = parser.parse_args()
+
+    engine = None
+    limits = None
+    if args.engine:
+        from Chess_Engine import MCTS, SearchLimits
+        book = None
+        if args.book:
+            from Chess_Book import OpeningBook
+            book = OpeningBook(args.book)
+        tablebase = None
+        if args.tablebases:
+            from Chess_Tablebase import Tablebase
+            tablebase = Tablebase(args.tablebases)
+        if args.search == 'alphabeta':
+            from Chess_AlphaBeta import AlphaBeta
+            from Chess_Transposition import TranspositionTable
+            engine = AlphaBeta(tt=TranspositionTable(), book=book, tablebase=tablebase)
+        else:
+            # Keeps the tree between moves, so each search starts from what the last one found
+            engine = MCTS(reuse_tree=True, book=book, tablebase=tablebase)
+        limits = SearchLimits(playouts=args.playouts, movetime=args.movetime, depth=args.depth)
+
+    game = Game(engine=engine, engine_color=args.engine or 'black', limits=limits, ponder=args.ponder)
     game.start()
 
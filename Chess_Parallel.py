@@ -0,0 +1,158 @@
+'''
+Runs MCTS search across a pool of worker processes.
+
+Root parallelization searches independent trees in every worker and merges
+the root moves by visit count. Leaf parallelization keeps one tree in this
+process and sends batches of leaf positions to the workers for rollouts.
+
+Boards are sent to the workers as Board.to_bytes() encodings rather than as
+pickled Piece objects.
+'''
+
+import math
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from Chess_Engine import MCTS, MCTSTree, SearchLimits, SearchResult
+from Chess_MCTS import Board
+
+
+def _root_search(data, playouts, movetime, engine_options, seed):
+    '''
+    Worker task for root parallelization: searches one tree and returns its root statistics.
+    '''
+    board = Board.from_bytes(data, compact=True)
+    engine = MCTS(seed=seed, **engine_options)
+    result = engine.search(board, SearchLimits(playouts=playouts, movetime=movetime))
+    return result.move_stats, result.playouts
+
+
+def _rollouts(leaves, engine_options, seed):
+    '''
+    Worker task for leaf parallelization: runs one rollout from each encoded leaf position.
+    '''
+    engine = MCTS(seed=seed, **engine_options)
+    return engine.rollouts(leaves)
+
+
+class ParallelMCTS:
+    def __init__(self, workers=None, mode='root', leaf_batch=None, seed=None, **engine_options):
+        '''
+        workers - number of worker processes (defaults to the number of CPUs)
+        mode - 'root' for independent trees merged by visit counts, 'leaf' for batched rollouts from one tree
+        leaf_batch - leaves sent to the pool per batch in leaf mode (defaults to 4 per worker)
+        engine_options - passed on to every MCTS engine (exploration, rollout_policy, max_rollout_depth);
+                         with rollout_policy='vector' each worker plays its chunk of leaves as one NumPy batch,
+                         so a large leaf_batch (hundreds of leaves) costs few calls
+        '''
+        if mode not in ('root', 'leaf'):
+            raise ValueError(f'Unknown parallel mode: {mode}')
+        self.workers = workers or os.cpu_count() or 1
+        self.mode = mode
+        self.leaf_batch = leaf_batch or 4 * self.workers
+        self.seed = seed
+        self.engine_options = engine_options
+        self.executor = None
+        self.searches = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        '''
+        Shuts down the worker processes.
+        '''
+        if self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
+
+    def pool(self):
+        # The pool is started on first use and kept for later searches
+        if self.executor is None:
+            self.executor = ProcessPoolExecutor(max_workers=self.workers)
+        return self.executor
+
+    def next_seed(self, offset):
+        if self.seed is None:
+            return None
+        return self.seed + self.searches * 1000003 + offset
+
+    def search(self, board, limits=None):
+        '''
+        Searches the position on board for the side to move and returns a SearchResult.
+        '''
+        limits = limits or SearchLimits()
+        self.searches += 1
+        if self.mode == 'root':
+            return self.root_search(board, limits)
+        return self.leaf_search(board, limits)
+
+    def best_move(self, board, playouts=None, movetime=None):
+        return self.search(board, SearchLimits(playouts, movetime)).best_move
+
+    def root_search(self, board, limits):
+        '''
+        Searches one tree per worker, sharing the playout budget, and adds up their root statistics.
+        '''
+        start_time = time.perf_counter()
+        data = board.to_bytes()
+        playouts = None if limits.playouts is None else math.ceil(limits.playouts / self.workers)
+        futures = [self.pool().submit(_root_search, data, playouts, limits.movetime,
+                                      self.engine_options, self.next_seed(worker))
+                   for worker in range(self.workers)]
+
+        move_stats = {}
+        total_playouts = 0
+        for future in futures:
+            stats, worker_playouts = future.result()
+            total_playouts += worker_playouts
+            for move, (visits, value) in stats.items():
+                merged_visits, merged_value = move_stats.get(move, (0, 0.0))
+                move_stats[move] = (merged_visits + visits, merged_value + value)
+
+        elapsed = time.perf_counter() - start_time
+        if not move_stats:
+            return SearchResult(None, 0.0, total_playouts, elapsed, move_stats)
+        best_move = max(move_stats, key=lambda move: move_stats[move][0])
+        visits, value = move_stats[best_move]
+        return SearchResult(best_move, value / visits, total_playouts, elapsed, move_stats)
+
+    def leaf_search(self, board, limits):
+        '''
+        Grows one tree here and evaluates batches of new leaves on the workers.
+        Each selected path gets a virtual loss so one batch spreads over different leaves.
+        '''
+        engine = MCTS(seed=self.next_seed(0), **self.engine_options)
+        start_time = time.perf_counter()
+        deadline = limits.deadline(start_time)
+        tree = MCTSTree(board.opponent_color(board.current_turn))
+        playouts = 0
+
+        while not limits.exhausted(playouts, deadline):
+            batch_size = self.leaf_batch
+            if limits.playouts is not None:
+                batch_size = min(batch_size, limits.playouts - playouts)
+
+            leaves, encoded, decided = engine.select_leaves(board, tree, batch_size)
+
+            # Splits the leaves still to be played out into one chunk per worker
+            chunk_size = max(1, math.ceil(len(encoded) / self.workers))
+            futures = [self.pool().submit(_rollouts, encoded[index:index + chunk_size],
+                                          self.engine_options, self.next_seed(index + 1))
+                       for index in range(0, len(encoded), chunk_size)]
+            played = iter([winner for future in futures for winner in future.result()])
+
+            for index, (path, keys) in enumerate(leaves):
+                winner = decided[index] if index in decided else next(played)
+                engine.backpropagate(tree, path, keys, winner, visited=True)
+            playouts += len(leaves)
+
+            # A position without legal moves has nothing to search
+            if tree.is_terminal(0):
+                break
+
+        return MCTS.result(tree, playouts, time.perf_counter() - start_time)
@@ -0,0 +1,210 @@
+'''
+Perft: counts the leaf nodes of the legal move tree to a fixed depth.
+
+Comparing the counts with the published values for standard test positions
+catches move generation bugs (castling, en passant, promotion, pins), and
+the nodes per second figure tracks move generation speed.
+
+Usage:
+    python Chess_Perft.py --position kiwipete --depth 3
+    python Chess_Perft.py --position start --depth 2 --divide
+    python Chess_Perft.py --check            (all positions against the known counts)
+    python Chess_Perft.py --benchmark        (list board against compact board speed)
+    python Chess_Perft.py --bitboard         (mailbox against bitboard move generator speed)
+'''
+
+import argparse
+import sys
+import time
+
+from Chess_Bitboard import BitboardPosition, generate_moves
+from Chess_MCTS import Board, move_to_uci
+
+# Standard test positions as (FEN, known node counts for depth 1, 2, 3, ...)
+POSITIONS = {
+    'start': ('rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1',
+              [20, 400, 8902, 197281, 4865609]),
+    'kiwipete': ('r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1',
+                 [48, 2039, 97862, 4085603]),
+    'position3': ('8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1',
+                  [14, 191, 2812, 43238, 674624]),
+    'position4': ('r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1',
+                  [6, 264, 9467, 422333]),
+    'position5': ('rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8',
+                  [44, 1486, 62379, 2103487]),
+    'position6': ('r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10',
+                  [46, 2079, 89890, 3894594]),
+}
+
+# Deepest level --check runs for each position, keeping the whole check to a few seconds
+CHECK_DEPTHS = {'start': 3, 'kiwipete': 3, 'position3': 4, 'position4': 3, 'position5': 3, 'position6': 3}
+
+
+def perft(board, depth):
+    '''
+    Returns the number of leaf nodes of the legal move tree of board to depth.
+    The last level is counted from the length of the legal move list without making the moves.
+    '''
+    if depth == 0:
+        return 1
+    moves = board.legal_moves()
+    if depth == 1:
+        return len(moves)
+    nodes = 0
+    for move in moves:
+        board.make_move(*move)
+        nodes += perft(board, depth - 1)
+        board.unmake_move()
+    return nodes
+
+
+def divide(board, depth):
+    '''
+    Returns {move: leaf nodes below it} for every legal root move, for finding which move a wrong count comes from.
+    '''
+    counts = {}
+    for move in board.legal_moves():
+        board.make_move(*move)
+        counts[move] = perft(board, depth - 1)
+        board.unmake_move()
+    return counts
+
+
+def timed_perft(board, depth):
+    '''
+    Returns (nodes, seconds, nodes per second).
+    '''
+    start = time.perf_counter()
+    nodes = perft(board, depth)
+    elapsed = time.perf_counter() - start
+    return nodes, elapsed, nodes / elapsed if elapsed > 0 else 0.0
+
+
+def check(positions=None, compact=False):
+    '''
+    Runs every position to its CHECK_DEPTHS depth and compares with the known counts.
+    Returns True if all of them match.
+    '''
+    passed = True
+    for name in positions or POSITIONS:
+        fen, expected = POSITIONS[name]
+        for depth in range(1, CHECK_DEPTHS.get(name, 2) + 1):
+            nodes, elapsed, nps = timed_perft(Board.from_fen(fen, compact), depth)
+            ok = nodes == expected[depth - 1]
+            passed = passed and ok
+            print(f"{name:10} depth {depth}: {nodes:>9} nodes {'ok' if ok else 'FAILED, expected ' + str(expected[depth - 1])}"
+                  f"  ({elapsed:.2f}s, {nps:,.0f} nodes/s)")
+    return passed
+
+
+def benchmark(depth=3, positions=None):
+    '''
+    Times perft to depth on every position with the list board and with the compact array board,
+    and prints the nodes per second of each. Returns the compact speed as a multiple of the list speed.
+    '''
+    totals = {False: [0, 0.0], True: [0, 0.0]}
+    for name in positions or POSITIONS:
+        fen = POSITIONS[name][0]
+        rates = {}
+        for compact in (False, True):
+            nodes, elapsed, rates[compact] = timed_perft(Board.from_fen(fen, compact), depth)
+            totals[compact][0] += nodes
+            totals[compact][1] += elapsed
+        print(f'{name:10} depth {depth}: {nodes:>9} nodes  list {rates[False]:>9,.0f} nodes/s'
+              f'  compact {rates[True]:>9,.0f} nodes/s  ({rates[True] / rates[False]:.2f}x)')
+    list_rate = totals[False][0] / totals[False][1]
+    compact_rate = totals[True][0] / totals[True][1]
+    print(f"{'total':10}          {totals[False][0]:>9} nodes  list {list_rate:>9,.0f} nodes/s"
+          f'  compact {compact_rate:>9,.0f} nodes/s  ({compact_rate / list_rate:.2f}x)')
+    return compact_rate / list_rate
+
+
+def _compare_generators(board, depth, timings):
+    '''
+    Generates the pseudo legal moves of board with both generators, adding their times to timings
+    [nodes, mailbox seconds, bitboard seconds], then does the same below every legal move to depth.
+    Returns True if the generators gave the same moves in every position.
+    '''
+    position = BitboardPosition.from_board(board)
+    start = time.perf_counter()
+    mailbox = board.pseudo_legal_moves()
+    middle = time.perf_counter()
+    bitboard = generate_moves(position)
+    end = time.perf_counter()
+    timings[0] += 1
+    timings[1] += middle - start
+    timings[2] += end - middle
+    # The bitboard generator gives each promotion once, without the piece type
+    agreed = {move[:2] for move in mailbox} == set(bitboard)
+    if depth > 1:
+        for move in board.legal_moves():
+            board.make_move(*move)
+            agreed = _compare_generators(board, depth - 1, timings) and agreed
+            board.unmake_move()
+    return agreed
+
+
+def bitboard_benchmark(depth=3, positions=None, compact=False):
+    '''
+    Times the pseudo legal move generation of every position in the legal move tree to depth, once with
+    the mailbox generator (Board.pseudo_legal_moves) and once with Chess_Bitboard.generate_moves, and prints
+    the positions generated per second by each. Building the bitboards from the board is not timed.
+    Returns True if both generators gave the same moves everywhere.
+    '''
+    passed = True
+    for name in positions or POSITIONS:
+        timings = [0, 0.0, 0.0]
+        agreed = _compare_generators(Board.from_fen(POSITIONS[name][0], compact), depth, timings)
+        passed = passed and agreed
+        nodes, mailbox, bitboard = timings
+        print(f"{name:10} depth {depth}: {nodes:>7} positions  mailbox {nodes / mailbox:>7,.0f} nodes/s"
+              f"  bitboard {nodes / bitboard:>7,.0f} nodes/s  ({mailbox / bitboard:.2f}x)"
+              f"  {'ok' if agreed else 'MOVES DIFFER'}")
+    return passed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Count move generation leaf nodes (perft).')
+    parser.add_argument('--position', default='start', choices=sorted(POSITIONS), help='named test position')
+    parser.add_argument('--fen', help='FEN of the position to count instead of a named one')
+    parser.add_argument('--depth', type=int, default=3)
+    parser.add_argument('--divide', action='store_true', help='print the node count below each root move')
+    parser.add_argument('--check', action='store_true', help='compare all named positions with their known counts')
+    parser.add_argument('--compact', action='store_true', help='use the compact array board')
+    parser.add_argument('--benchmark', action='store_true', help='compare list and compact board speed on all named positions')
+    parser.add_argument('--bitboard', action='store_true',
+                        help='compare the mailbox and bitboard move generators on all named positions')
+    args = parser.parse_args(argv)
+
+    if args.check:
+        return 0 if check(compact=args.compact) else 1
+    if args.benchmark:
+        benchmark(args.depth)
+        return 0
+    if args.bitboard:
+        return 0 if bitboard_benchmark(args.depth, compact=args.compact) else 1
+
+    fen = args.fen or POSITIONS[args.position][0]
+    board = Board.from_fen(fen, args.compact)
+    start = time.perf_counter()
+    if args.divide:
+        counts = divide(board, args.depth)
+        for move in sorted(counts, key=move_to_uci):
+            print(f'{move_to_uci(move)}: {counts[move]}')
+        nodes = sum(counts.values())
+    else:
+        nodes = perft(board, args.depth)
+    elapsed = time.perf_counter() - start
+
+    print(f'Nodes: {nodes}')
+    print(f'Time: {elapsed:.3f}s ({nodes / elapsed if elapsed > 0 else 0:,.0f} nodes/s)')
+    if not args.fen:
+        expected = POSITIONS[args.position][1]
+        if args.depth <= len(expected) and nodes != expected[args.depth - 1]:
+            print(f'Expected {expected[args.depth - 1]} nodes')
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,215 @@
+'''
+Engine against engine self-play across a pool of worker processes.
+
+Games are written in a packed binary format: a 5 byte file header, then for
+every game a 3 byte record header (result, number of plies) followed by each
+move as a 16-bit encode_move code. A 40 move game takes 163 bytes. The games
+can also be exported as PGN.
+
+Usage:
+    python Chess_SelfPlay.py --games 100 --playouts 200 --output games.bin
+    python Chess_SelfPlay.py --games 10 --playouts 200 --output games.bin --pgn games.pgn
+    python Chess_SelfPlay.py --read games.bin --pgn games.pgn      (convert an existing file)
+'''
+
+import argparse
+import os
+import random
+import struct
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from Chess_Engine import MCTS, SearchLimits
+from Chess_MCTS import ONGOING, Board, decode_move, encode_move, move_to_san
+
+MAGIC = b'CSPG'
+VERSION = 1
+GAME_HEADER = struct.Struct('<BH')
+
+# Game results as stored in the binary format, and as written in PGN
+DRAW, WHITE_WINS, BLACK_WINS = 0, 1, 2
+PGN_RESULTS = {DRAW: '1/2-1/2', WHITE_WINS: '1-0', BLACK_WINS: '0-1'}
+
+
+def play_game(engine, limits, random_plies=0, max_plies=400, rng=None):
+    '''
+    Plays one game from the starting position with engine choosing the moves for both sides.
+    The first random_plies moves are picked uniformly at random so games do not all repeat the same opening.
+    Returns (result, moves, reason); games reaching max_plies are adjudicated as draws.
+    '''
+    rng = rng or random.Random()
+    board = Board(compact=True)
+    moves = []
+    while True:
+        status = board.status()
+        if status != ONGOING:
+            winner = board.winner()
+            result = DRAW if winner is None else (WHITE_WINS if winner == 'white' else BLACK_WINS)
+            return result, moves, status
+        if len(moves) >= max_plies:
+            return DRAW, moves, 'move limit'
+        if len(moves) < random_plies:
+            move = rng.choice(board.legal_moves())
+        else:
+            move = engine.search(board, limits).best_move
+        board.make_move(*move)
+        moves.append(move)
+
+
+def _play(playouts, movetime, random_plies, max_plies, engine_options, seed):
+    '''
+    Worker task: plays one game and returns it packed, with the termination reason.
+    '''
+    engine = MCTS(seed=seed, **engine_options)
+    result, moves, reason = play_game(engine, SearchLimits(playouts, movetime), random_plies, max_plies,
+                                      random.Random(seed))
+    return pack_game(result, moves), reason
+
+
+def pack_game(result, moves):
+    '''
+    Packs a game into its binary record: result, ply count and one 16-bit code per move.
+    '''
+    return GAME_HEADER.pack(result, len(moves)) + struct.pack(f'<{len(moves)}H', *map(encode_move, moves))
+
+
+def read_games(source):
+    '''
+    Lazily yields (result, moves) for every game in a binary self-play file.
+    '''
+    with open(source, 'rb') as file:
+        header = file.read(len(MAGIC) + 1)
+        if header[:len(MAGIC)] != MAGIC or header[-1] != VERSION:
+            raise ValueError(f'Not a self-play game file: {source}')
+        while True:
+            record = file.read(GAME_HEADER.size)
+            if not record:
+                return
+            result, plies = GAME_HEADER.unpack(record)
+            codes = struct.unpack(f'<{plies}H', file.read(2 * plies))
+            yield result, [decode_move(code) for code in codes]
+
+
+def game_to_pgn(result, moves, round_number=1, event='Self-play'):
+    '''
+    Returns the PGN text of a game played from the starting position.
+    '''
+    board = Board(compact=True)
+    tokens = []
+    for ply, move in enumerate(moves):
+        if ply % 2 == 0:
+            tokens.append(f'{ply // 2 + 1}.')
+        tokens.append(move_to_san(board, move))
+        board.make_move(*move)
+    tokens.append(PGN_RESULTS[result])
+
+    lines = []
+    line = ''
+    # PGN movetext lines are kept under 80 characters
+    for token in tokens:
+        if line and len(line) + 1 + len(token) > 79:
+            lines.append(line)
+            line = token
+        else:
+            line = f'{line} {token}' if line else token
+    lines.append(line)
+
+    tags = [('Event', event), ('Site', '?'), ('Date', time.strftime('%Y.%m.%d')), ('Round', str(round_number)),
+            ('White', 'MCTS'), ('Black', 'MCTS'), ('Result', PGN_RESULTS[result])]
+    return ''.join(f'[{name} "{value}"]\n' for name, value in tags) + '\n' + '\n'.join(lines) + '\n\n'
+
+
+class SelfPlay:
+    def __init__(self, workers=None, limits=None, random_plies=0, max_plies=400, seed=None, **engine_options):
+        '''
+        workers - number of worker processes (defaults to the number of CPUs)
+        limits - SearchLimits for every engine move
+        random_plies - opening plies played at random before the engine takes over
+        max_plies - games still running after this many plies are adjudicated as draws
+        engine_options - passed on to every MCTS engine (exploration, rollout_policy, max_rollout_depth)
+        '''
+        self.workers = workers or os.cpu_count() or 1
+        self.limits = limits or SearchLimits()
+        self.random_plies = random_plies
+        self.max_plies = max_plies
+        self.seed = seed
+        self.engine_options = engine_options
+
+    def run(self, games):
+        '''
+        Plays games games and yields (packed game, reason) for each as soon as it finishes.
+        '''
+        with ProcessPoolExecutor(max_workers=self.workers) as executor:
+            pending = set()
+            submitted = 0
+            while submitted < games or pending:
+                # Only a couple of games per worker are queued at once
+                while submitted < games and len(pending) < 2 * self.workers:
+                    seed = None if self.seed is None else self.seed + submitted
+                    pending.add(executor.submit(_play, self.limits.playouts, self.limits.movetime,
+                                                self.random_plies, self.max_plies, self.engine_options, seed))
+                    submitted += 1
+                finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    yield future.result()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Generate engine against engine games.')
+    parser.add_argument('--games', type=int, default=10)
+    parser.add_argument('--workers', type=int, help='worker processes (defaults to the number of CPUs)')
+    parser.add_argument('--playouts', type=int, help='playouts per move')
+    parser.add_argument('--movetime', type=int, help='search time per move in milliseconds')
+    parser.add_argument('--random-plies', type=int, default=4, help='opening plies played at random')
+    parser.add_argument('--max-plies', type=int, default=400, help='adjudicate a draw after this many plies')
+    parser.add_argument('--rollout-policy', default='random', choices=['random', 'heuristic', 'vector'],
+                        help="'vector' plays batches of simplified rollouts with NumPy")
+    parser.add_argument('--seed', type=int)
+    parser.add_argument('--output', default='selfplay.bin', help='binary game file to write')
+    parser.add_argument('--pgn', help='also write the games as PGN')
+    parser.add_argument('--read', help='convert an existing binary game file instead of playing')
+    args = parser.parse_args(argv)
+
+    if args.read:
+        if not args.pgn:
+            parser.error('--read needs --pgn')
+        with open(args.pgn, 'w') as pgn:
+            for number, (result, moves) in enumerate(read_games(args.read), 1):
+                pgn.write(game_to_pgn(result, moves, number))
+        return 0
+
+    runner = SelfPlay(workers=args.workers, limits=SearchLimits(args.playouts, args.movetime),
+                      random_plies=args.random_plies, max_plies=args.max_plies, seed=args.seed,
+                      rollout_policy=args.rollout_policy)
+    start_time = time.perf_counter()
+    results = {DRAW: 0, WHITE_WINS: 0, BLACK_WINS: 0}
+    total_bytes = 0
+    pgn = open(args.pgn, 'w') if args.pgn else None
+    try:
+        with open(args.output, 'wb') as output:
+            output.write(MAGIC + bytes((VERSION,)))
+            for number, (data, reason) in enumerate(runner.run(args.games), 1):
+                output.write(data)
+                total_bytes += len(data)
+                result, plies = GAME_HEADER.unpack_from(data)
+                results[result] += 1
+                if pgn is not None:
+                    moves = [decode_move(code) for code in struct.unpack_from(f'<{plies}H', data, GAME_HEADER.size)]
+                    pgn.write(game_to_pgn(result, moves, number))
+                elapsed = time.perf_counter() - start_time
+                print(f'Game {number}: {PGN_RESULTS[result]} ({reason}, {plies} plies), '
+                      f'{number * 3600 / elapsed:.0f} games/hour', file=sys.stderr)
+    finally:
+        if pgn is not None:
+            pgn.close()
+
+    elapsed = time.perf_counter() - start_time
+    print(f'{args.games} games in {elapsed:.1f}s ({args.games * 3600 / elapsed:.0f} games/hour), '
+          f'+{results[WHITE_WINS]} ={results[DRAW]} -{results[BLACK_WINS]}, '
+          f'{total_bytes / max(args.games, 1):.0f} bytes/game', file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
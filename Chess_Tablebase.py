@@ -0,0 +1,379 @@
+'''
+Endgame tablebases for king and one piece against a lone king (KQK, KRK,
+KBK, KNK and KPK), generated locally by retrograde analysis.
+
+Each table holds one byte per position, indexed directly by
+((side to move * 64 + strong king) * 64 + lone king) * 64 + piece square,
+with squares numbered row * 8 + col as on Board. A byte of 0 is a draw (or an
+impossible position); otherwise it is the distance to mate in plies plus one,
+for the side to move. The side to move wins when that distance is odd and is
+mated when it is even, so one byte gives both the result and the distance.
+A table is 512 KB, and Tablebase maps the files with mmap so a probe is one
+index calculation and one byte read.
+
+Generation first marks every checkmate, then works backwards from each
+position whose result is known to the positions that lead to it, taking
+moves back with the same king, knight and sliding moves Board uses: a position
+is won as soon as one move leads to a lost position, and lost once every
+move leads to a won one. KPK looks up its promotions in the KQK and KRK
+tables. The fifty-move rule and castling are not taken into account.
+
+Usage:
+    python Chess_Tablebase.py generate --directory tablebases
+    python Chess_Tablebase.py probe --directory tablebases --fen "8/8/8/4k3/8/8/8/4K2R w - - 0 1"
+'''
+
+import argparse
+import mmap
+import os
+import sys
+import time
+
+from Chess_MCTS import Board, KING_TARGET_INDICES, KNIGHT_TARGET_INDICES, RAY_INDICES
+
+MAGIC = b'CTBL'
+VERSION = 1
+HEADER_SIZE = 8
+TABLE_SIZE = 2 * 64 * 64 * 64
+
+# Piece letters of the tables, and the Board piece types they stand for
+PIECE_TYPES = {'Q': 'Queen', 'R': 'Rook', 'B': 'Bishop', 'N': 'Knight', 'P': 'Pawn'}
+PIECE_LETTERS = {piece_type: letter for letter, piece_type in PIECE_TYPES.items()}
+# The tables a pawn promotes into; KBK and KNK are always drawn
+PROMOTION_TABLES = ('Q', 'R', 'B', 'N')
+
+# Side to move in a table index: the side with the piece, or the lone king
+STRONG, WEAK = 0, 1
+
+
+def table_index(turn, strong_king, weak_king, square):
+    return ((turn * 64 + strong_king) * 64 + weak_king) * 64 + square
+
+
+def table_name(letter):
+    return f'K{letter}K'
+
+
+def _between(start, end):
+    '''
+    Returns the squares strictly between two squares on the same row, column or diagonal.
+    '''
+    for ray in RAY_INDICES[start]:
+        if end in ray:
+            return frozenset(ray[:ray.index(end)])
+    return frozenset()
+
+
+BETWEEN = [[_between(start, end) for end in range(64)] for start in range(64)]
+KING_TARGET_SETS = [frozenset(targets) for targets in KING_TARGET_INDICES]
+# Squares a piece on an empty board attacks, by piece letter and square. Pawns move towards row 0.
+EMPTY_ATTACKS = {
+    'Q': [frozenset(square for ray in rays for square in ray) for rays in RAY_INDICES],
+    'R': [frozenset(square for ray in rays[:4] for square in ray) for rays in RAY_INDICES],
+    'B': [frozenset(square for ray in rays[4:] for square in ray) for rays in RAY_INDICES],
+    'N': [frozenset(targets) for targets in KNIGHT_TARGET_INDICES],
+    'P': [frozenset(square - 8 + delta for delta in (-1, 1) if square >= 8 and 0 <= square % 8 + delta < 8)
+          for square in range(64)],
+}
+
+
+def attacks(letter, square, target, blocker):
+    '''
+    Returns True if the piece on square attacks target, when only blocker can stand in between.
+    '''
+    return target in EMPTY_ATTACKS[letter][square] and blocker not in BETWEEN[square][target]
+
+
+def is_valid(letter, turn, strong_king, weak_king, square):
+    '''
+    Returns True if the position can occur: three different squares, kings apart, no pawn on the first or
+    last row, and the lone king not in check when the strong side is to move.
+    '''
+    if strong_king == weak_king or square in (strong_king, weak_king) or weak_king in KING_TARGET_SETS[strong_king]:
+        return False
+    if letter == 'P' and (square < 8 or square >= 56):
+        return False
+    return turn == WEAK or not attacks(letter, square, weak_king, strong_king)
+
+
+def piece_targets(letter, square, strong_king, weak_king):
+    '''
+    Returns the squares the piece can move to (captures are never possible, the only enemy piece being the king).
+    '''
+    if letter == 'N':
+        return [target for target in KNIGHT_TARGET_INDICES[square] if target != strong_king and target != weak_king]
+    if letter == 'P':
+        targets = []
+        if square - 8 not in (strong_king, weak_king):
+            targets.append(square - 8)
+            # Pawns on their starting row can move two squares
+            if square >= 48 and square - 16 not in (strong_king, weak_king):
+                targets.append(square - 16)
+        return targets
+    rays = RAY_INDICES[square]
+    rays = rays[:4] if letter == 'R' else rays[4:] if letter == 'B' else rays
+    targets = []
+    for ray in rays:
+        for target in ray:
+            if target == strong_king or target == weak_king:
+                break
+            targets.append(target)
+    return targets
+
+
+def piece_origins(letter, square, strong_king, weak_king):
+    '''
+    Returns the squares the piece can have moved to square from, the reverse of piece_targets.
+    '''
+    if letter != 'P':
+        # Knight and sliding moves can be taken back the same way they are made
+        return piece_targets(letter, square, strong_king, weak_king)
+    origins = []
+    if square + 8 < 56 and square + 8 not in (strong_king, weak_king):
+        origins.append(square + 8)
+        if 32 <= square < 40 and square + 16 not in (strong_king, weak_king):
+            origins.append(square + 16)
+    return origins
+
+
+def generate(letter, tables=None):
+    '''
+    Generates the table for king and the piece letter against king and returns it as a bytearray.
+    tables - {letter: table} of tables already generated; KPK needs KQK and KRK, which are generated if missing
+    '''
+    tables = {} if tables is None else tables
+    if letter == 'P':
+        for promotion in ('Q', 'R'):
+            if promotion not in tables:
+                tables[promotion] = generate(promotion, tables)
+
+    values = bytearray(TABLE_SIZE)
+    valid = bytearray(TABLE_SIZE)
+    # Legal moves not yet known to lead to a won position for the opponent
+    remaining = bytearray(TABLE_SIZE)
+    # found[plies] lists the positions whose side to move is mated in (or mates in) that many plies
+    found = [[]]
+    # promoted[plies] lists (position, lost) for promotions into positions decided in that many plies
+    promoted = [[]]
+
+    for turn in (STRONG, WEAK):
+        for strong_king in range(64):
+            for weak_king in range(64):
+                for square in range(64):
+                    if not is_valid(letter, turn, strong_king, weak_king, square):
+                        continue
+                    index = table_index(turn, strong_king, weak_king, square)
+                    valid[index] = 1
+                    moves = 0
+                    if turn == STRONG:
+                        for target in KING_TARGET_INDICES[strong_king]:
+                            if target != square and target not in KING_TARGET_SETS[weak_king] and target != weak_king:
+                                moves += 1
+                        for target in piece_targets(letter, square, strong_king, weak_king):
+                            moves += 1
+                            if letter == 'P' and target < 8:
+                                # Promotions end in another table, whose results are already known
+                                for promotion in PROMOTION_TABLES:
+                                    value = tables[promotion][table_index(WEAK, strong_king, weak_king, target)] \
+                                        if promotion in tables else 0
+                                    if value:
+                                        plies = value - 1
+                                        while len(promoted) <= plies:
+                                            promoted.append([])
+                                        promoted[plies].append((index, plies % 2 == 0))
+                                # A pawn move to the last row is four moves, one per promotion
+                                moves += len(PROMOTION_TABLES) - 1
+                    else:
+                        for target in KING_TARGET_INDICES[weak_king]:
+                            if target in KING_TARGET_SETS[strong_king]:
+                                continue
+                            # Taking the piece is always a draw; any other square must not be attacked
+                            if target == square or not attacks(letter, square, target, strong_king):
+                                moves += 1
+                    remaining[index] = moves
+                    if not moves and turn == WEAK and attacks(letter, square, weak_king, strong_king):
+                        # Checkmate: mated in 0 plies
+                        values[index] = 1
+                        found[0].append(index)
+
+    plies = 0
+    while plies < len(found) or plies < len(promoted):
+        # Positions decided in an even number of plies are lost for the side to move
+        lost_here = plies % 2 == 0
+        decided = found[plies] if plies < len(found) else []
+        next_positions = []
+
+        def reach(index, lost):
+            # A move to a lost position wins; the last move to a won position loses
+            if values[index]:
+                return
+            if not lost:
+                remaining[index] -= 1
+                if remaining[index]:
+                    return
+            values[index] = plies + 2
+            next_positions.append(index)
+
+        for index in decided:
+            lost = lost_here
+            square = index & 63
+            weak_king = (index >> 6) & 63
+            strong_king = (index >> 12) & 63
+            if index >> 18 == WEAK:
+                # The strong side moved last, with the king or the piece
+                for origin in KING_TARGET_INDICES[strong_king]:
+                    if origin != square and origin != weak_king and origin not in KING_TARGET_SETS[weak_king]:
+                        previous = table_index(STRONG, origin, weak_king, square)
+                        if valid[previous]:
+                            reach(previous, lost)
+                for origin in piece_origins(letter, square, strong_king, weak_king):
+                    previous = table_index(STRONG, strong_king, weak_king, origin)
+                    if valid[previous]:
+                        reach(previous, lost)
+            else:
+                # The lone king moved last
+                for origin in KING_TARGET_INDICES[weak_king]:
+                    if origin != square and origin != strong_king and origin not in KING_TARGET_SETS[strong_king]:
+                        previous = table_index(WEAK, strong_king, origin, square)
+                        if valid[previous]:
+                            reach(previous, lost)
+        if plies < len(promoted):
+            for index, lost in promoted[plies]:
+                reach(index, lost)
+
+        if next_positions:
+            while len(found) <= plies + 1:
+                found.append([])
+            found[plies + 1].extend(next_positions)
+        plies += 1
+    return values
+
+
+def write_table(path, values):
+    with open(path, 'wb') as file:
+        file.write(MAGIC + bytes((VERSION, 0, 0, 0)))
+        file.write(values)
+
+
+class Tablebase:
+    def __init__(self, directory='tablebases'):
+        '''
+        Opens every table file (such as KQK.tb) found in directory. Missing tables are simply not probed.
+        '''
+        self.directory = directory
+        self.tables = {}
+        self.files = []
+        for letter in PIECE_TYPES:
+            path = os.path.join(directory, table_name(letter) + '.tb')
+            if not os.path.exists(path):
+                continue
+            file = open(path, 'rb')
+            header = file.read(HEADER_SIZE)
+            if header[:len(MAGIC)] != MAGIC or header[len(MAGIC)] != VERSION \
+                    or os.fstat(file.fileno()).st_size != HEADER_SIZE + TABLE_SIZE:
+                file.close()
+                raise ValueError(f'Not a tablebase file: {path}')
+            self.files.append(file)
+            self.tables[letter] = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def __len__(self):
+        return len(self.tables)
+
+    # Worker processes get the directory and map the files themselves
+    def __getstate__(self):
+        return self.directory
+
+    def __setstate__(self, directory):
+        self.__init__(directory)
+
+    def close(self):
+        for table in self.tables.values():
+            table.close()
+        for file in self.files:
+            file.close()
+
+    def probe(self, board):
+        '''
+        Returns (winner, plies) for the position on board: the winning color (None for a draw) and the number
+        of plies to mate with best play. Returns None if the position is not in an opened table.
+        '''
+        # More material than a queen rules the position out without looking at the squares
+        if board.phase > 4 or not self.tables:
+            return None
+        pieces = []
+        for row in range(8):
+            for col in range(8):
+                piece = board.board[row][col]
+                if piece is not None:
+                    if len(pieces) == 3:
+                        return None
+                    pieces.append((row * 8 + col, piece))
+        if len(pieces) != 3:
+            return None
+        kings = {}
+        extra = None
+        for square, piece in pieces:
+            if piece.piece_type == 'King':
+                kings[piece.color] = square
+            else:
+                extra = (square, piece)
+        if extra is None or len(kings) != 2 or PIECE_LETTERS[extra[1].piece_type] not in self.tables:
+            return None
+
+        square, piece = extra
+        strong = piece.color
+        weak = board.opponent_color(strong)
+        strong_king, weak_king = kings[strong], kings[weak]
+        if strong == 'black':
+            # Tables are stored with the strong side as white, so black's pieces are mirrored top to bottom
+            strong_king, weak_king, square = strong_king ^ 56, weak_king ^ 56, square ^ 56
+        turn = STRONG if board.current_turn == strong else WEAK
+        value = self.tables[PIECE_LETTERS[piece.piece_type]][HEADER_SIZE + table_index(turn, strong_king, weak_king, square)]
+        if not value:
+            return None, 0
+        plies = value - 1
+        # An odd distance is a win for the side to move, an even one a loss
+        winner = board.current_turn if plies % 2 else board.opponent_color(board.current_turn)
+        return winner, plies
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Generate or probe the endgame tablebases.')
+    commands = parser.add_subparsers(dest='command', required=True)
+    generate_parser = commands.add_parser('generate', help='generate tables by retrograde analysis')
+    generate_parser.add_argument('tables', nargs='*', default=['KQK', 'KRK', 'KPK'],
+                                 help='tables to generate (KQK, KRK, KBK, KNK, KPK)')
+    generate_parser.add_argument('--directory', default='tablebases')
+    probe_parser = commands.add_parser('probe', help='look up a position')
+    probe_parser.add_argument('--directory', default='tablebases')
+    probe_parser.add_argument('--fen', required=True)
+    args = parser.parse_args(argv)
+
+    if args.command == 'generate':
+        os.makedirs(args.directory, exist_ok=True)
+        tables = {}
+        for name in args.tables:
+            letter = name.upper()[1:-1]
+            if len(name) != 3 or letter not in PIECE_TYPES:
+                parser.error(f'Unknown table: {name}')
+            start_time = time.perf_counter()
+            tables[letter] = values = generate(letter, tables)
+            write_table(os.path.join(args.directory, table_name(letter) + '.tb'), values)
+            wins = sum(1 for value in values if value % 2 == 0 and value)
+            print(f'{table_name(letter)}: {wins} won positions, longest mate {max(values) - 1} plies, '
+                  f'{time.perf_counter() - start_time:.1f}s', file=sys.stderr)
+        return 0
+
+    tablebase = Tablebase(args.directory)
+    result = tablebase.probe(Board.from_fen(args.fen, compact=True))
+    if result is None:
+        print('Position not in the tablebases.')
+    elif result[0] is None:
+        print('Draw')
+    else:
+        print(f'{result[0].capitalize()} mates in {(result[1] + 1) // 2} moves ({result[1]} plies)')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,135 @@
+'''
+Fixed-size transposition table keyed by Board.hash_key.
+
+Entries live in parallel arrays so the memory used is fixed when the table is
+created. Each slot holds the full 64-bit key, so a different position landing
+on the same slot is detected (and counted as a collision) rather than
+returned as a hit.
+
+The same slots serve both kinds of search:
+  - alpha-beta stores depth, score, bound and best move
+  - MCTS stores visit count (in the depth field) and value sum (in the score field)
+'''
+
+from array import array
+
+from Chess_MCTS import decode_move, encode_move
+
+# Bound types for alpha-beta scores
+EXACT, LOWER_BOUND, UPPER_BOUND = 0, 1, 2
+
+
+class TranspositionTable:
+    # key (8) + depth (4) + score (8) + bound (1) + move (2)
+    ENTRY_BYTES = 23
+
+    def __init__(self, size_mb=16, replacement='depth'):
+        '''
+        size_mb - memory cap in megabytes; the slot count is the largest power of two that fits
+        replacement - 'depth' keeps the deeper (or more visited) entry when two positions share a slot,
+                      'always' lets the newest entry replace the old one
+        '''
+        if replacement not in ('depth', 'always'):
+            raise ValueError(f'Unknown replacement policy: {replacement}')
+        self.replacement = replacement
+
+        slots = max(1, int(size_mb * 1024 * 1024) // self.ENTRY_BYTES)
+        self.size = 1 << (slots.bit_length() - 1)
+        self.mask = self.size - 1
+
+        self.keys = array('Q', bytes(8 * self.size))
+        self.depths = array('i', bytes(4 * self.size))
+        self.scores = array('d', bytes(8 * self.size))
+        self.bounds = array('b', bytes(self.size))
+        self.moves = array('H', bytes(2 * self.size))
+        self.used = 0
+        self.reset_counters()
+
+    def reset_counters(self):
+        self.hits = 0
+        self.misses = 0
+        self.collisions = 0
+        self.stores = 0
+        self.overwrites = 0
+        self.rejected = 0
+
+    def clear(self):
+        '''
+        Empties every slot and resets the counters.
+        '''
+        self.keys = array('Q', bytes(8 * self.size))
+        self.used = 0
+        self.reset_counters()
+
+    def probe(self, key):
+        '''
+        Returns (depth, score, bound, move) stored for key, or None.
+        move is a (start, end, promotion) tuple or None.
+        '''
+        index = key & self.mask
+        stored = self.keys[index]
+        if stored == key:
+            self.hits += 1
+            move = self.moves[index]
+            return self.depths[index], self.scores[index], self.bounds[index], decode_move(move) if move else None
+        self.misses += 1
+        if stored:
+            # The slot holds a different position
+            self.collisions += 1
+        return None
+
+    def store(self, key, depth, score, bound=EXACT, move=None):
+        '''
+        Saves an entry for key, subject to the replacement policy. Returns True if it was written.
+        '''
+        index = key & self.mask
+        stored = self.keys[index]
+        if stored and stored != key:
+            if self.replacement == 'depth' and depth < self.depths[index]:
+                self.rejected += 1
+                return False
+            self.overwrites += 1
+        elif not stored:
+            self.used += 1
+
+        self.keys[index] = key
+        self.depths[index] = depth
+        self.scores[index] = score
+        self.bounds[index] = bound
+        self.moves[index] = encode_move(move) if move is not None else 0
+        self.stores += 1
+        return True
+
+    def probe_mcts(self, key):
+        '''
+        Returns (visits, value_sum) stored by an MCTS search for key, or None.
+        '''
+        entry = self.probe(key)
+        return None if entry is None else (entry[0], entry[1])
+
+    def store_mcts(self, key, visits, value):
+        return self.store(key, visits, value)
+
+    def hashfull(self):
+        '''
+        Returns how full the table is in permille, as reported by UCI engines.
+        '''
+        return self.used * 1000 // self.size
+
+    def stats(self):
+        '''
+        Returns the table size and the hit/miss/collision counters.
+        '''
+        probes = self.hits + self.misses
+        return {
+            'size_mb': self.size * self.ENTRY_BYTES / (1024 * 1024),
+            'entries': self.size,
+            'used': self.used,
+            'hits': self.hits,
+            'misses': self.misses,
+            'collisions': self.collisions,
+            'stores': self.stores,
+            'overwrites': self.overwrites,
+            'rejected': self.rejected,
+            'hit_rate': self.hits / probes if probes else 0.0,
+        }
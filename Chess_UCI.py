@@ -0,0 +1,292 @@
+'''
+UCI (Universal Chess Interface) front end, so the engines can be run by chess
+GUIs and tournament managers such as cutechess-cli.
+
+Commands are read from standard input by an asyncio loop and every search runs
+on a worker thread, so stop, isready and ponderhit are answered while the
+engine thinks. The search reports its progress as info lines with the nodes
+(MCTS playouts) per second.
+
+Usage:
+    python Chess_UCI.py
+    cutechess-cli -engine cmd="python Chess_UCI.py" ...
+'''
+
+import asyncio
+import math
+import sys
+import threading
+
+from Chess_AlphaBeta import MATE, MATE_BOUND, AlphaBeta
+from Chess_Book import OpeningBook
+from Chess_Engine import MCTS, SearchLimits
+from Chess_MCTS import Board, move_from_uci, move_to_uci
+from Chess_Tablebase import Tablebase
+from Chess_Transposition import TranspositionTable
+
+ENGINE_NAME = 'Chess-Game-MCTS'
+
+# go parameters that take a number
+GO_PARAMETERS = ('wtime', 'btime', 'winc', 'binc', 'movestogo', 'depth', 'nodes', 'movetime')
+
+
+def score_text(result):
+    '''
+    Formats the score of a SearchResult for an info line: 'cp <centipawns>' or 'mate <moves>'.
+    MCTS results have no centipawn score, so their expected result is converted back into one.
+    '''
+    if result.score is not None:
+        if abs(result.score) >= MATE_BOUND:
+            moves = (MATE - abs(result.score) + 1) // 2
+            return f'mate {moves if result.score > 0 else -moves}'
+        return f'cp {result.score}'
+    value = min(max(result.value, 0.001), 0.999)
+    return f'cp {round(400 * math.log10(value / (1 - value)))}'
+
+
+class UCIServer:
+    def __init__(self, output=None):
+        '''
+        output - file the replies are written to (defaults to standard output)
+        '''
+        self.output = output or sys.stdout
+        # Replies come from both the command loop and the search thread
+        self.lock = threading.Lock()
+        self.board = Board(compact=True)
+        self.options = {'Search': 'mcts', 'Hash': 16, 'Ponder': False, 'BookFile': '', 'TablebasePath': ''}
+        self.engine = None
+        self.search_task = None
+        self.stop = None
+        # Set when an infinite or ponder search may send its bestmove (after stop or ponderhit)
+        self.released = None
+        # Milliseconds to search once ponderhit arrives
+        self.ponder_movetime = None
+
+    def send(self, line):
+        with self.lock:
+            self.output.write(line + '\n')
+            self.output.flush()
+
+    async def run(self, source=None):
+        '''
+        Reads and handles commands until quit or the end of the input.
+        '''
+        source = source or sys.stdin
+        loop = asyncio.get_running_loop()
+        while True:
+            line = await loop.run_in_executor(None, source.readline)
+            if not line or not await self.handle(line):
+                break
+        await self.stop_search()
+
+    async def handle(self, line):
+        '''
+        Handles one command line. Returns False on quit.
+        '''
+        tokens = line.split()
+        if not tokens:
+            return True
+        command, arguments = tokens[0], tokens[1:]
+        if command == 'uci':
+            self.send(f'id name {ENGINE_NAME}')
+            self.send(f'id author {ENGINE_NAME} contributors')
+            self.send('option name Search type combo default mcts var mcts var alphabeta')
+            self.send('option name Hash type spin default 16 min 1 max 1024')
+            self.send('option name Ponder type check default false')
+            self.send('option name BookFile type string default <empty>')
+            self.send('option name TablebasePath type string default <empty>')
+            self.send('uciok')
+        elif command == 'isready':
+            self.send('readyok')
+        elif command == 'ucinewgame':
+            await self.stop_search()
+            # A new engine drops the tree or table kept from the last game
+            self.engine = None
+        elif command == 'setoption':
+            await self.stop_search()
+            self.set_option(arguments)
+        elif command == 'position':
+            await self.stop_search()
+            self.set_position(arguments)
+        elif command == 'go':
+            await self.stop_search()
+            self.go(arguments)
+        elif command == 'stop':
+            await self.stop_search()
+        elif command == 'ponderhit':
+            self.ponderhit()
+        elif command == 'quit':
+            return False
+        return True
+
+    def set_option(self, arguments):
+        '''
+        Handles 'setoption name <name> [value <value>]'.
+        '''
+        if 'value' in arguments:
+            split = arguments.index('value')
+            name, value = ' '.join(arguments[1:split]), ' '.join(arguments[split + 1:])
+        else:
+            name, value = ' '.join(arguments[1:]), ''
+        for option in self.options:
+            if option.lower() == name.lower():
+                name = option
+                break
+        else:
+            self.send(f'info string Unknown option {name}')
+            return
+        if name == 'Search' and value.lower() in ('mcts', 'alphabeta'):
+            self.options[name] = value.lower()
+        elif name == 'Hash' and value.isdigit():
+            self.options[name] = max(1, int(value))
+        elif name == 'Ponder':
+            self.options[name] = value.lower() == 'true'
+        elif name in ('BookFile', 'TablebasePath'):
+            self.options[name] = '' if value == '<empty>' else value
+        else:
+            self.send(f'info string Invalid value {value} for {name}')
+            return
+        # The engine is built again with the new options on the next go
+        if name != 'Ponder':
+            self.engine = None
+
+    def set_position(self, arguments):
+        '''
+        Handles 'position startpos|fen <fen> [moves <move> ...]'.
+        '''
+        moves = []
+        if 'moves' in arguments:
+            split = arguments.index('moves')
+            arguments, moves = arguments[:split], arguments[split + 1:]
+        try:
+            if arguments and arguments[0] == 'fen':
+                board = Board.from_fen(' '.join(arguments[1:]), compact=True)
+            else:
+                board = Board(compact=True)
+            for text in moves:
+                move = move_from_uci(text)
+                if move not in board.legal_moves():
+                    raise ValueError(f'Illegal move {text}')
+                board.make_move(*move)
+        except (ValueError, IndexError, KeyError) as error:
+            self.send(f'info string Invalid position: {error}')
+            return
+        # Moves are made on a fresh board each time, so an MCTS engine can still find its kept tree
+        self.board = board
+
+    def engine_for_search(self):
+        if self.engine is None:
+            book = None
+            if self.options['BookFile']:
+                try:
+                    book = OpeningBook(self.options['BookFile'])
+                except (OSError, ValueError) as error:
+                    self.send(f'info string Book not opened: {error}')
+            tablebase = None
+            if self.options['TablebasePath']:
+                try:
+                    tablebase = Tablebase(self.options['TablebasePath'])
+                except (OSError, ValueError) as error:
+                    self.send(f'info string Tablebases not opened: {error}')
+            if self.options['Search'] == 'alphabeta':
+                self.engine = AlphaBeta(tt=TranspositionTable(size_mb=self.options['Hash']), book=book,
+                                        tablebase=tablebase)
+            else:
+                self.engine = MCTS(reuse_tree=True, book=book, tablebase=tablebase)
+        return self.engine
+
+    def limits(self, arguments):
+        '''
+        Returns the SearchLimits for 'go' arguments, and the movetime to use after ponderhit.
+        '''
+        values = {}
+        flags = set()
+        index = 0
+        while index < len(arguments):
+            name = arguments[index]
+            if name in GO_PARAMETERS and index + 1 < len(arguments):
+                # A parameter with a value that is not a number is left out
+                try:
+                    values[name] = int(arguments[index + 1])
+                except ValueError:
+                    self.send(f'info string Invalid value {arguments[index + 1]} for {name}')
+                index += 2
+                continue
+            flags.add(name)
+            index += 1
+
+        movetime = values.get('movetime')
+        side = 'w' if self.board.current_turn == 'white' else 'b'
+        if movetime is None and f'{side}time' in values:
+            movetime = SearchLimits.from_clock(values[f'{side}time'], values.get(f'{side}inc', 0),
+                                               values.get('movestogo')).movetime
+        if 'infinite' in flags or 'ponder' in flags:
+            # Runs until stop, or until ponderhit starts the clock
+            limits = SearchLimits(depth=values.get('depth'), stop=self.stop, infinite=True)
+            return limits, movetime if 'ponder' in flags else None
+        return SearchLimits(values.get('nodes'), movetime, values.get('depth'), stop=self.stop), None
+
+    def go(self, arguments):
+        self.stop = threading.Event()
+        self.released = asyncio.Event()
+        limits, self.ponder_movetime = self.limits(arguments)
+        if not limits.infinite:
+            self.released.set()
+        self.search_task = asyncio.ensure_future(self.search(limits))
+
+    async def search(self, limits):
+        '''
+        Runs the search on a worker thread and sends its bestmove.
+        '''
+        loop = asyncio.get_running_loop()
+        engine = self.engine_for_search()
+        result = await loop.run_in_executor(None, lambda: engine.search(self.board, limits, info=self.send_info))
+        # An infinite or ponder search only reports its move once it is allowed to
+        await self.released.wait()
+        if result.best_move is None:
+            self.send('bestmove 0000')
+            return
+        self.send_info(result)
+        if len(result.pv) > 1:
+            self.send(f'bestmove {move_to_uci(result.best_move)} ponder {move_to_uci(result.pv[1])}')
+        else:
+            self.send(f'bestmove {move_to_uci(result.best_move)}')
+
+    def send_info(self, result):
+        '''
+        Sends an info line for a SearchResult. Called from the search thread.
+        '''
+        depth = result.depth if result.depth is not None else len(result.pv)
+        pv = ' '.join(move_to_uci(move) for move in result.pv)
+        self.send(f'info depth {depth} score {score_text(result)} nodes {result.playouts} '
+                  f'nps {result.playouts_per_second:.0f} time {int(result.elapsed * 1000)} pv {pv}')
+
+    def ponderhit(self):
+        '''
+        The opponent played the expected move: the ponder search goes on as a normal search on the clock.
+        '''
+        if self.search_task is None or self.search_task.done() or self.released.is_set():
+            return
+        self.released.set()
+        if self.ponder_movetime is not None:
+            asyncio.get_running_loop().call_later(self.ponder_movetime / 1000, self.stop.set)
+
+    async def stop_search(self):
+        '''
+        Stops the running search, if any, and waits for its bestmove to be sent.
+        '''
+        if self.search_task is None:
+            return
+        self.stop.set()
+        self.released.set()
+        await self.search_task
+        self.search_task = None
+
+
+def main():
+    asyncio.run(UCIServer().run())
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,204 @@
+'''
+Vectorized random rollouts with NumPy.
+
+K boards are held as a (K, 64) int8 array of compact piece codes and all of
+them advance one ply per step. Every possible (from, to) move is listed once
+in a table of move slots, and one step checks every slot on every board at
+once: the right piece on the from square, nothing on the squares in between,
+and a target that is empty or an enemy. Each board then plays one of its
+valid slots at random.
+
+The rollouts follow simplified rules so the whole batch stays in array
+operations: moves may leave the king in check, and the game ends when a king
+is captured (a side that can take the king always does). There is no
+castling or en passant and pawns always promote to queens. A stalemated side
+usually still has king moves, into capture, so stalemate mostly ends as a
+loss for it. A side left with no move at all (its king walled in by its own
+pieces) loses if its king is attacked and draws otherwise.
+
+NumPy only pays off when one call holds many boards: MCTS with the 'vector'
+policy selects vector_batch leaves before each call, and a single board per
+call is slower than the plain random rollout.
+
+NumPy is only needed by this module; MCTS imports it when the 'vector'
+rollout policy is used.
+'''
+
+import numpy as np
+
+from Chess_MCTS import BISHOP, KING, KNIGHT, KNIGHT_OFFSETS, PAWN, QUEEN, QUEEN_DIRECTIONS, ROOK
+
+# Square 64 is an extra, always empty square that pads the lists of squares in between
+EMPTY_SQUARE = 64
+MAX_BETWEEN = 6
+
+# Rule for the target square of a move slot
+TARGET_ANY, TARGET_EMPTY, TARGET_ENEMY = 0, 1, 2
+
+# Material values by piece code (KING is not counted), for scoring rollouts that reach the depth limit
+MATERIAL = np.array([0, 100, 320, 330, 500, 900, 0], dtype=np.int32)
+
+
+def _build_slots():
+    '''
+    Lists every move a piece can make on an empty board as (from, to, squares in between, target rule,
+    signed piece codes that can make it).
+    '''
+    slots = {}
+
+    def add(start, end, between, rule, codes):
+        key = (start, end, tuple(between), rule)
+        slots.setdefault(key, set()).update(codes)
+
+    for row in range(8):
+        for col in range(8):
+            start = row * 8 + col
+            for index, (delta_row, delta_col) in enumerate(QUEEN_DIRECTIONS):
+                # QUEEN_DIRECTIONS lists the rook directions first
+                slider = ROOK if index < 4 else BISHOP
+                between = []
+                new_row, new_col = row + delta_row, col + delta_col
+                while 0 <= new_row < 8 and 0 <= new_col < 8:
+                    end = new_row * 8 + new_col
+                    codes = {slider, QUEEN, -slider, -QUEEN}
+                    if not between:
+                        codes |= {KING, -KING}
+                    add(start, end, between, TARGET_ANY, codes)
+                    between = between + [end]
+                    new_row += delta_row
+                    new_col += delta_col
+            for delta_row, delta_col in KNIGHT_OFFSETS:
+                new_row, new_col = row + delta_row, col + delta_col
+                if 0 <= new_row < 8 and 0 <= new_col < 8:
+                    add(start, new_row * 8 + new_col, [], TARGET_ANY, {KNIGHT, -KNIGHT})
+
+            # Pawns: white moves towards row 0, black towards row 7
+            for sign, direction, home_row in ((1, -1, 6), (-1, 1, 1)):
+                if row in (0, 7):
+                    continue
+                forward = row + direction
+                add(start, forward * 8 + col, [], TARGET_EMPTY, {sign * PAWN})
+                if row == home_row:
+                    add(start, (forward + direction) * 8 + col, [forward * 8 + col], TARGET_EMPTY, {sign * PAWN})
+                for delta_col in (-1, 1):
+                    if 0 <= col + delta_col < 8:
+                        add(start, forward * 8 + col + delta_col, [], TARGET_ENEMY, {sign * PAWN})
+
+    count = len(slots)
+    starts = np.empty(count, dtype=np.intp)
+    ends = np.empty(count, dtype=np.intp)
+    between = np.full((count, MAX_BETWEEN), EMPTY_SQUARE, dtype=np.intp)
+    rules = np.empty(count, dtype=np.int8)
+    # allowed[slot, code + 6] is True if the piece with that signed code can use the slot
+    allowed = np.zeros((count, 13), dtype=bool)
+    for slot, ((start, end, squares, rule), codes) in enumerate(sorted(slots.items())):
+        starts[slot] = start
+        ends[slot] = end
+        between[slot, :len(squares)] = squares
+        rules[slot] = rule
+        for code in codes:
+            allowed[slot, code + 6] = True
+    return starts, ends, between, rules, allowed
+
+
+SLOT_STARTS, SLOT_ENDS, SLOT_BETWEEN, SLOT_RULES, SLOT_ALLOWED = _build_slots()
+
+
+def encode_boards(boards):
+    '''
+    Returns ((K, 64) int8 piece codes without the UNMOVED flag, (K,) int8 side to move as +1 or -1)
+    for a list of Boards or of their Board.to_bytes encodings.
+    '''
+    data = [board if isinstance(board, bytes) else board.to_bytes() for board in boards]
+    codes = np.frombuffer(b''.join(item[:64] for item in data), dtype=np.int8).reshape(len(data), 64)
+    # Only the piece type and color are kept: code & 7 on the absolute value, with the sign put back
+    codes = np.sign(codes) * (np.abs(codes) & 7)
+    sides = np.array([-1 if item[64] else 1 for item in data], dtype=np.int8)
+    return codes.astype(np.int8), sides
+
+
+def valid_moves(squares, sides):
+    '''
+    Returns a (K, slots) boolean array of the move slots each board's side to move can play.
+    '''
+    count = len(squares)
+    # The padding column is the always empty EMPTY_SQUARE
+    padded = np.concatenate([squares, np.zeros((count, 1), dtype=np.int8)], axis=1)
+    movers = squares[:, SLOT_STARTS]
+    own = movers * sides[:, None] > 0
+    allowed = SLOT_ALLOWED[np.arange(len(SLOT_STARTS))[None, :], movers + 6]
+    clear = ~padded[:, SLOT_BETWEEN].any(axis=2)
+    targets = squares[:, SLOT_ENDS] * sides[:, None]
+    target_ok = np.where(SLOT_RULES == TARGET_EMPTY, targets == 0,
+                         np.where(SLOT_RULES == TARGET_ENEMY, targets < 0, targets <= 0))
+    return own & allowed & clear & target_ok
+
+
+def batch_rollouts(boards, max_depth=80, rng=None, evaluation_margin=None):
+    '''
+    Plays a random rollout from each board at once and returns the winning color (or None for a draw) of each.
+
+    boards - Boards, or their Board.to_bytes encodings (which skips building Board objects)
+    max_depth - rollouts still running after this many plies are draws, or scored by material
+    rng - numpy Generator (or seed) for repeatable rollouts
+    evaluation_margin - if given, a rollout reaching max_depth is won by a side at least this many centipawns
+                        of material ahead
+    The Board objects themselves are not changed.
+    '''
+    if not boards:
+        return []
+    rng = np.random.default_rng(rng)
+    squares, sides = encode_boards(boards)
+    count = len(boards)
+    # +1 white won, -1 black won, 0 draw or still running
+    results = np.zeros(count, dtype=np.int8)
+    active = np.arange(count)
+
+    for _ in range(max_depth):
+        if not len(active):
+            break
+        board_squares = squares[active]
+        board_sides = sides[active]
+        valid = valid_moves(board_squares, board_sides)
+
+        # A random valid slot per board, with king captures always taken first
+        scores = rng.random(valid.shape)
+        king_captures = np.abs(board_squares[:, SLOT_ENDS]) == KING
+        scores += king_captures
+        scores[~valid] = -1.0
+        chosen = scores.argmax(axis=1)
+        has_move = valid[np.arange(len(active)), chosen]
+
+        # No valid move at all is checkmate if the opponent could take the king, and otherwise a draw
+        stuck = ~has_move
+        if stuck.any():
+            stuck_squares = board_squares[stuck]
+            stuck_sides = board_sides[stuck]
+            replies = valid_moves(stuck_squares, -stuck_sides)
+            checked = (replies & (stuck_squares[:, SLOT_ENDS] * stuck_sides[:, None] == KING)).any(axis=1)
+            results[active[stuck][checked]] = -stuck_sides[checked]
+        active = active[has_move]
+        chosen = chosen[has_move]
+        board_sides = board_sides[has_move]
+
+        starts = SLOT_STARTS[chosen]
+        ends = SLOT_ENDS[chosen]
+        pieces = squares[active, starts]
+        captured = squares[active, ends]
+        # Pawns reaching the first or last row become queens
+        promote = (np.abs(pieces) == PAWN) & ((ends < 8) | (ends >= 56))
+        pieces = np.where(promote, np.sign(pieces) * QUEEN, pieces).astype(np.int8)
+        squares[active, ends] = pieces
+        squares[active, starts] = 0
+        sides[active] = -board_sides
+
+        won = np.abs(captured) == KING
+        results[active[won]] = board_sides[won]
+        active = active[~won]
+
+    if evaluation_margin is not None and len(active):
+        pieces = squares[active]
+        material = (np.sign(pieces) * MATERIAL[np.abs(pieces)]).sum(axis=1)
+        results[active] = np.where(material >= evaluation_margin, 1, np.where(material <= -evaluation_margin, -1, 0))
+
+    return [None if result == 0 else ('white' if result > 0 else 'black') for result in results]
@@ -0,0 +1,42 @@
+'''
+Regression tests for the MCTS engine.
+
+Run with: python -m unittest test_Chess_Engine   (or python -m pytest)
+'''
+
+import importlib.util
+import unittest
+
+from Chess_Engine import MCTS, SearchLimits
+from Chess_MCTS import Board
+
+# White to move; Qd7-c7 stalemates the black king on a8
+STALEMATE_TRAP = 'k7/3Q4/1K6/8/8/8/8/8 w - - 0 1'
+STALEMATING_MOVE = ((1, 3), (1, 2), None)
+
+
+class TerminalLeafTest(unittest.TestCase):
+    def test_leaf_result(self):
+        engine = MCTS()
+        board = Board.from_fen(STALEMATE_TRAP, compact=True)
+        self.assertIsNone(engine.leaf_result(board))
+        board.make_move(*STALEMATING_MOVE[:2])
+        self.assertEqual(engine.leaf_result(board), (None,))
+
+    def check_stalemate_is_draw(self, policy):
+        board = Board.from_fen(STALEMATE_TRAP, compact=True)
+        result = MCTS(rollout_policy=policy, seed=1).search(board, SearchLimits(playouts=400))
+        visits, value = result.move_stats[STALEMATING_MOVE]
+        self.assertGreater(visits, 0)
+        self.assertEqual(value / visits, 0.5)
+
+    def test_random_rollouts_score_stalemate_as_draw(self):
+        self.check_stalemate_is_draw('random')
+
+    @unittest.skipIf(importlib.util.find_spec('numpy') is None, 'NumPy is not installed')
+    def test_vector_rollouts_score_stalemate_as_draw(self):
+        self.check_stalemate_is_draw('vector')
+
+
+if __name__ == '__main__':
+    unittest.main()